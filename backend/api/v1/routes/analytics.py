@@ -0,0 +1,142 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import date, datetime, timedelta
+from uuid import UUID
+
+from core.database import get_db
+from core.utils.response import Response
+from models.analytics import RollupScope
+from services.analytics import SalesReportService, SalesRollupService
+from services.finance import FinanceAnalyticsService
+from api.v1.routes.user import get_current_admin_user
+
+router = APIRouter(prefix="/api/v1/analytics", tags=["Analytics"])
+
+
+def _window(start: Optional[date], end: Optional[date]):
+    # rollup days are UTC dates
+    end = end or datetime.utcnow().date()
+    return start or end - timedelta(days=29), end
+
+
+@router.get("/sales/daily")
+async def get_daily_sales(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    currency: Optional[UUID] = None,
+    scope: RollupScope = RollupScope.Total,
+    key: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(get_current_admin_user),
+):
+    """Revenue, orders and units per day (last 30 days by default) from the rollups."""
+    try:
+        start, end = _window(start, end)
+        rows = await SalesReportService(db).daily(start, end, currency, scope, key)
+        return Response(data=rows)
+    except Exception as e:
+        return Response(success=False, message=str(e), code=500)
+
+
+@router.get("/sales/top-products")
+async def get_top_products(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    currency: Optional[UUID] = None,
+    order_by: str = "revenue",
+    limit: int = 10,
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(get_current_admin_user),
+):
+    try:
+        start, end = _window(start, end)
+        rows = await SalesReportService(db).top(RollupScope.Product, start, end, currency, order_by, limit)
+        return Response(data=rows)
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
+    except Exception as e:
+        return Response(success=False, message=str(e), code=500)
+
+
+@router.get("/sales/top-categories")
+async def get_top_categories(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    currency: Optional[UUID] = None,
+    order_by: str = "revenue",
+    limit: int = 10,
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(get_current_admin_user),
+):
+    try:
+        start, end = _window(start, end)
+        rows = await SalesReportService(db).top(RollupScope.Category, start, end, currency, order_by, limit)
+        return Response(data=rows)
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
+    except Exception as e:
+        return Response(success=False, message=str(e), code=500)
+
+
+@router.post("/sales/rebuild")
+async def rebuild_sales_rollups(
+    start: date, end: date, db: AsyncSession = Depends(get_db), admin_user=Depends(get_current_admin_user)
+):
+    """Recompute the rollups for a date range from the order tables (backfill/repair)."""
+    try:
+        await SalesRollupService(db).rebuild(start, end)
+        return Response(message=f"Sales rollups rebuilt for {start} to {end}")
+    except Exception as e:
+        return Response(success=False, message=str(e), code=500)
+
+
+@router.get("/finance/sums")
+async def get_finance_sums(
+    source: str = "orders",
+    by: str = "day,currency",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(get_current_admin_user),
+):
+    """Grouped sums over orders, order_items or payments, e.g. by=month,method for payments."""
+    try:
+        start, end = _window(start, end)
+        keys = [key.strip() for key in by.split(",") if key.strip()]
+        rows = await FinanceAnalyticsService(db).grouped_sums(source, keys, start, end)
+        return Response(data=rows)
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
+    except Exception as e:
+        return Response(success=False, message=str(e), code=500)
+
+
+@router.get("/finance/cohorts")
+async def get_cohort_retention(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(get_current_admin_user),
+):
+    try:
+        start, end = _window(start, end)
+        rows = await FinanceAnalyticsService(db).cohort_retention(start, end)
+        return Response(data=rows)
+    except Exception as e:
+        return Response(success=False, message=str(e), code=500)
+
+
+@router.get("/finance/aov")
+async def get_aov_percentiles(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(get_current_admin_user),
+):
+    try:
+        start, end = _window(start, end)
+        rows = await FinanceAnalyticsService(db).aov_percentiles(start, end)
+        return Response(data=rows)
+    except Exception as e:
+        return Response(success=False, message=str(e), code=500)
@@ -1,18 +1,22 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from uuid import UUID
 
 from core.database import get_db
 from services.cart import CartService
-from schemas.cart import CartCreate, CartItemCreate
+from schemas.cart import CartCreate, CartItemCreate, CartBatchUpdate
 from core.utils.response import Response
+from core.utils.conditional import check_not_modified, row_version, weak_etag, with_validators
+from models.cart import Cart
+from api.v1.routes.user import get_current_user
 
 router = APIRouter(prefix="/api/v1/cart", tags=["Cart"])
 
 # --- Get cart by user_id or IP address ---
 @router.get("/")
 async def get_cart(
+    request: Request,
     user_id: Optional[UUID] = None,
     ip_address: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
@@ -22,20 +26,46 @@ async def get_cart(
         res = await service.get_by_user_or_ip(user_id=user_id, ip_address=ip_address)
         if res is None:
             return Response(message="Cart not found", code=404)
-        return Response(data=res.to_dict())
+        versions = [(res.id, res.updated_at)] + service.product_versions(res)
+        etag = weak_etag(versions)
+        modified = max(updated_at for _, updated_at in versions if updated_at is not None)
+        cached = check_not_modified(request, etag, modified, private=True)
+        if cached:
+            return cached
+        return with_validators(Response(data=res.to_dict()), etag, modified, private=True)
     except Exception as e:
         return Response(success=False, data=str(e), code=500)
 
 
 # --- Get cart by cart ID ---
 @router.get("/{cart_id}")
-async def get_cart_by_id(cart_id: UUID, db: AsyncSession = Depends(get_db)):
+async def get_cart_by_id(cart_id: UUID, request: Request, db: AsyncSession = Depends(get_db)):
     service = CartService(db)
     try:
+        # Every item write touches the cart's updated_at; the lines also embed
+        # live products and variants, so the newest product versions it too
+        updated_at = await row_version(db, Cart, cart_id, CartService.products_version())
+        etag = weak_etag([(cart_id, updated_at)])
+        cached = check_not_modified(request, etag, updated_at, private=True) if updated_at else None
+        if cached:
+            return cached
         res = await service.get_by_id(cart_id)
         if res is None:
             return Response(message=f"Cart with id '{cart_id}' not found", code=404)
-        return Response(data=res.to_dict())
+        return with_validators(Response(data=res.to_dict()), etag, updated_at, private=True)
+    except Exception as e:
+        return Response(success=False, data=str(e), code=500)
+
+
+# --- Get cart summary (lines, price snapshots and totals) ---
+@router.get("/{cart_id}/summary")
+async def get_cart_summary(cart_id: UUID, db: AsyncSession = Depends(get_db)):
+    service = CartService(db)
+    try:
+        res = await service.get_summary(cart_id)
+        if res is None:
+            return Response(message=f"Cart with id '{cart_id}' not found", code=404)
+        return Response(data=res)
     except Exception as e:
         return Response(success=False, data=str(e), code=500)
 
@@ -51,6 +81,27 @@ async def create_cart(cart_in: CartCreate, db: AsyncSession = Depends(get_db)):
         return Response(success=False, data=str(e), code=500)
 
 
+# --- Merge the caller's guest cart into their user cart ---
+@router.post("/merge")
+async def merge_guest_cart(
+    guest_cart_id: UUID,
+    request: Request,
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    service = CartService(db)
+    try:
+        if request.client is None:
+            return Response(message="Client address unknown", code=400)
+        cart_id = await service.merge_guest_cart(current_user.id, request.client.host, guest_cart_id)
+        if cart_id is None:
+            return Response(message="No cart found for this user or guest cart", code=404)
+        res = await service.get_summary(cart_id)
+        return Response(data=res)
+    except Exception as e:
+        return Response(success=False, data=str(e), code=500)
+
+
 # --- Add item to cart ---
 @router.post("/{cart_id}/items")
 async def add_item_to_cart(cart_id: UUID, item_in: CartItemCreate, db: AsyncSession = Depends(get_db)):
@@ -62,6 +113,19 @@ async def add_item_to_cart(cart_id: UUID, item_in: CartItemCreate, db: AsyncSess
         return Response(success=False, data=str(e), code=500)
 
 
+# --- Apply many add/update/remove operations at once ---
+@router.post("/{cart_id}/items/batch")
+async def batch_update_cart_items(cart_id: UUID, batch: CartBatchUpdate, db: AsyncSession = Depends(get_db)):
+    service = CartService(db)
+    try:
+        res = await service.apply_batch(cart_id, batch)
+        if res is None:
+            return Response(message=f"Cart with id '{cart_id}' not found", code=404)
+        return Response(data=res)
+    except Exception as e:
+        return Response(success=False, data=str(e), code=500)
+
+
 # --- Remove item from cart ---
 @router.delete("/items/{item_id}")
 async def remove_item(item_id: UUID, db: AsyncSession = Depends(get_db)):
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
@@ -6,6 +6,8 @@ from core.database import get_db
 from services.category import CategoryService
 from schemas.category import CategoryCreate
 from core.utils.response import Response
+from core.utils.catalog import category_cache
+from core.utils.conditional import check_not_modified, make_etag, with_validators
 from uuid import UUID
 
 
@@ -14,6 +16,7 @@ router = APIRouter(prefix="/api/v1/categories", tags=["Categories"])
 
 @router.get("/")
 async def get_all_categories(
+    request: Request,
     name: Optional[str] = None,
     description_contains: Optional[str] = None,
     limit: int = 10,
@@ -23,19 +26,27 @@ async def get_all_categories(
     service = CategoryService(db)
     try:
         res = await service.get_all(name, description_contains, limit, offset)
-        return Response(data=[c.to_dict() for c in res])
+        etag = make_etag(category_cache.digest, name, description_contains, limit, offset)
+        cached = check_not_modified(request, etag)
+        if cached:
+            return cached
+        return with_validators(Response(data=res), etag)
     except Exception as e:
         return Response(success=False, data=str(e), code=500)
 
 
 @router.get("/{category_id}")
-async def get_category_by_id(category_id: UUID, db: AsyncSession = Depends(get_db)):
+async def get_category_by_id(category_id: UUID, request: Request, db: AsyncSession = Depends(get_db)):
     service = CategoryService(db)
     try:
         res = await service.get_by_id(category_id)
         if res  is None:
             return Response(message=f"Category with id '{category_id}' not found.",code=404)
-        return Response(data=res.to_dict())
+        etag = make_etag(category_cache.digest, category_id)
+        cached = check_not_modified(request, etag)
+        if cached:
+            return cached
+        return with_validators(Response(data=res), etag)
     except Exception as e:
         return Response(success=False, data=str(e), code=500)
 
@@ -1,33 +1,74 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
 from core.database import get_db
 from services.currency import CurrencyService
-from schemas.currency import CurrencyCreate, CurrencyUpdate
+from schemas.currency import CurrencyCreate, CurrencyUpdate, ExchangeRatesUpdate, CurrencyConversion
 from core.utils.response import Response
+from core.utils.currency import currency_registry
+from core.utils.conditional import check_not_modified, make_etag, with_validators
+from api.v1.routes.user import get_current_admin_user
 
 router = APIRouter(prefix="/api/v1/currencies", tags=["Currencies"])
 
 
 @router.get("/")
-async def get_all_currencies(db: AsyncSession = Depends(get_db)):
+async def get_all_currencies(request: Request, db: AsyncSession = Depends(get_db)):
     service = CurrencyService(db)
     try:
         currencies = await service.get_all()
-        return Response(data=[c.to_dict() for c in currencies])
+        etag = make_etag(currency_registry.digest)
+        cached = check_not_modified(request, etag)
+        if cached:
+            return cached
+        return with_validators(Response(data=currencies), etag)
+    except Exception as e:
+        return Response(success=False, data=str(e), code=500)
+
+
+@router.put("/rates")
+async def set_exchange_rates(
+    rates_in: ExchangeRatesUpdate,
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(get_current_admin_user),
+):
+    """Set FX rates as units of each currency per one base currency (FX_BASE_CURRENCY)."""
+    service = CurrencyService(db)
+    try:
+        currencies = await service.set_rates(rates_in.rates)
+        return Response(data=currencies)
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
+    except Exception as e:
+        return Response(success=False, data=str(e), code=500)
+
+
+@router.post("/convert")
+async def convert_amounts(conversion: CurrencyConversion, db: AsyncSession = Depends(get_db)):
+    """Convert a list of amounts between two currencies (ISO codes or ids) with the cached rates."""
+    service = CurrencyService(db)
+    try:
+        amounts = await service.convert(conversion.amounts, conversion.from_currency, conversion.to_currency)
+        return Response(data=amounts)
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
     except Exception as e:
         return Response(success=False, data=str(e), code=500)
 
 
 @router.get("/{currency_id}")
-async def get_currency_by_id(currency_id: UUID, db: AsyncSession = Depends(get_db)):
+async def get_currency_by_id(currency_id: UUID, request: Request, db: AsyncSession = Depends(get_db)):
     service = CurrencyService(db)
     try:
         currency = await service.get_by_id(currency_id)
         if currency is None:
             return Response(message=f"Currency with id '{currency_id}' not found.", code=404)
-        return Response(data=currency.to_dict())
+        etag = make_etag(currency_registry.digest, currency_id)
+        cached = check_not_modified(request, etag)
+        if cached:
+            return cached
+        return with_validators(Response(data=currency), etag)
     except Exception as e:
         return Response(success=False, data=str(e), code=500)
 
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import date
+
+from core.utils.response import Response
+from services.exports import ExportEntity, ExportService
+from api.v1.routes.user import get_current_admin_user
+
+router = APIRouter(prefix="/api/v1/exports", tags=["Exports"])
+
+
+@router.get("/{entity}")
+async def export_entity(
+    entity: ExportEntity,
+    format: str = "ndjson",
+    gzip: bool = True,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    admin_user=Depends(get_current_admin_user),
+):
+    """
+    Stream a full export of orders, order_items, payments, products,
+    product_variants or users as NDJSON or CSV, optionally gzipped.
+    start/end filter on the creation date. Admins only.
+    """
+    try:
+        export = ExportService(entity.value, format, gzip)
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
+    return StreamingResponse(
+        export.stream(start, end),
+        media_type=export.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export.filename}"'},
+    )
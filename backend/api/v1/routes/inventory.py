@@ -90,6 +90,20 @@ async def get_all_inventory_products(
         return Response(success=False, data=str(e), code=500)
 
 
+@router.get("/products/snapshot")
+async def get_inventory_snapshot(
+    inventory_id: Optional[UUID] = None,
+    product_id: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Resync point for the inventory websocket: stock levels plus the last batch `seq`."""
+    svc = InventoryProductService(db)
+    try:
+        snapshot = await svc.snapshot(inventory_id, product_id)
+        return Response(data=snapshot)
+    except Exception as e:
+        return Response(success=False, data=str(e), code=500)
+
 
 @router.post("/products/", status_code=status.HTTP_201_CREATED)
 async def create_inventory_product(
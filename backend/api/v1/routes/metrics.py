@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+
+from core.utils.response import Response
+from core.utils.query_stats import query_stats
+from api.v1.routes.user import get_current_admin_user
+
+router = APIRouter(prefix="/api/v1/metrics", tags=["Metrics"])
+
+
+@router.get("/queries")
+async def get_query_stats(admin_user=Depends(get_current_admin_user)):
+    """
+    Per-route statement counts and DB time, suspected N+1 statement shapes
+    and the most recent slow queries for this worker process. Admins only:
+    slow-query entries carry raw SQL.
+    """
+    try:
+        return Response(data=query_stats.snapshot())
+    except Exception as e:
+        return Response(success=False, message=str(e), code=500)
+
+
+@router.delete("/queries")
+async def reset_query_stats(admin_user=Depends(get_current_admin_user)):
+    query_stats.reset()
+    return Response(message="Query stats reset")
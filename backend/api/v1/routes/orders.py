@@ -1,35 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime
 from schemas.orders import OrderSchema, OrderItemSchema,UpdateOrderSchema
-from models.orders import OrderStatus
+from models.orders import Order, OrderStatus
 from services.orders import OrderService, OrderItemService,UUID
+from services.promocode import TooManyAttempts
 from core.database import get_db  # Make sure this returns AsyncSession
 from core.utils.response import Response
+from core.utils.pagination import encode_cursor
+from core.utils.currency import currency_registry
+from core.utils.conditional import check_not_modified, row_version, weak_etag, with_validators
+from core.utils.fields import parse_fields
 
 router = APIRouter(prefix="/api/v1/orders", tags=["Orders"])
 
 # --- Order Routes --- #
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
-async def create_order(order_in: OrderSchema,db: AsyncSession = Depends(get_db)):
+async def create_order(order_in: OrderSchema, request: Request, db: AsyncSession = Depends(get_db)):
     try:
         service = OrderService(db)
-        order = await service.create_order(order_in)
-        return Response(data=order.to_dict(), code=201)
+        order = await service.create_order(order_in, request.client.host if request.client else None)
+        return Response(data=order, code=201)
+    except TooManyAttempts as e:
+        return Response(success=False, message=str(e), code=429)
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
 
 @router.get("/{order_id}")
-async def get_order(order_id: UUID, db: AsyncSession = Depends(get_db)):
+async def get_order(
+    order_id: UUID, request: Request, fields: Optional[str] = None, db: AsyncSession = Depends(get_db)
+):
     try:
+        # Every item write touches the order's updated_at; the items also embed
+        # live products, so the newest of those versions the response too
+        updated_at = await row_version(db, Order, order_id, OrderService.products_version())
+        etag = weak_etag([(order_id, updated_at)], fields)
+        cached = check_not_modified(request, etag, updated_at, private=True) if updated_at else None
+        if cached:
+            return cached
         service = OrderService(db)
         order = await service.get_order_by_id(order_id)
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
-        return Response(data=order.to_dict())
+        fieldset = parse_fields(fields)
+        await service.load_item_products([order], fieldset)
+        return with_validators(Response(data=order.to_dict(fieldset)), etag, updated_at, private=True)
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -39,7 +61,10 @@ async def update_order(order_id: UUID, update_data: UpdateOrderSchema, db: Async
     try:
         service = OrderService(db)
         order = await service.update_order(order_id, update_data)
+        await service.load_item_products([order])
         return Response(data=order.to_dict())
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -58,12 +83,16 @@ async def delete_order(order_id: UUID, db: AsyncSession = Depends(get_db)):
 
 @router.get("/")
 async def get_all_orders(
+    request: Request,
     user_id: Optional[UUID] = Query(None),
     status: Optional[OrderStatus] = Query(None),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
     limit: int = Query(10, ge=1),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    display_currency: Optional[str] = Query(None, description="Also show totals in this currency (ISO code or id)"),
+    fields: Optional[str] = Query(None, description="Only these fields, e.g. id,status,total_amount,items.product_id"),
     db: AsyncSession = Depends(get_db),
 ):
     try:
@@ -75,8 +104,32 @@ async def get_all_orders(
             end_date=end_date,
             limit=limit,
             offset=offset,
+            cursor=cursor,
+        )
+        fieldset = parse_fields(fields)
+        await service.load_item_products(orders, fieldset)
+        etag = weak_etag(
+            [(order.id, order.updated_at) for order in orders] + service.product_versions(orders),
+            user_id, status, start_date, end_date, limit, offset, cursor, display_currency, fields,
+            currency_registry.digest if display_currency else "",
         )
-        return Response(data=[order.to_dict() for order in orders])
+        cached = check_not_modified(request, etag, private=True)
+        if cached:
+            return cached
+        data = [order.to_dict(fieldset) for order in orders]
+        if display_currency:
+            currency_registry.reprice(
+                data,
+                {"total_amount": [order.total_amount for order in orders]},
+                [order.currency for order in orders],
+                display_currency,
+            )
+        response = with_validators(Response(data=data), etag, private=True)
+        if len(orders) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(orders[-1].created_at, orders[-1].id)
+        return response
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, status
+import io
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Request, UploadFile, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from core.database import get_db
-from services.products import ProductService, ProductVariantService,ProductVariantAttributeService, ProductVariantImageService
+from services.products import ProductService, ProductVariantService,ProductVariantAttributeService, ProductVariantImageService, parse_attribute_filter
+from services.product_import import ProductImportService, backfill_barcodes, read_csv, read_ndjson
 from schemas.products import ProductCreate, ProductVariantCreate, ProductVariantUpdate,ProductVariantAttributeCreate,ProductVariantImageCreate
 from core.utils.response import Response
-from models.products import AvailabilityStatus
+from core.utils.catalog import category_cache
+from core.utils.currency import currency_registry
+from core.utils.conditional import check_not_modified, row_version, weak_etag, with_validators
+from core.utils.fields import parse_fields
+from core.config import settings
+from api.v1.routes.user import get_current_admin_user
+from models.products import AvailabilityStatus, Product
 
 router = APIRouter(prefix="/api/v1/products", tags=["Products"])
 
@@ -35,6 +43,7 @@ router = APIRouter(prefix="/api/v1/products", tags=["Products"])
 
 @router.get("/")
 async def get_all_products(
+    request: Request,
     name: Optional[str] = None,
     category_id: Optional[str] = None,
     tag_id: Optional[str] = None,
@@ -44,30 +53,84 @@ async def get_all_products(
     min_rating: Optional[float] = None,
     limit: int = 10,
     offset: int = 0,
+    attributes: Optional[str] = None,
+    sort: Optional[str] = None,
+    display_currency: Optional[str] = None,
+    fields: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
 ):
+    """
+    `attributes` filters by variant attributes, e.g. "color=Red|Blue,size=M".
+    min_price/max_price and sort=price_asc|price_desc use the product's
+    effective (lowest payable) price. display_currency (ISO code or id) adds
+    the product prices converted from the base currency.
+    `fields` limits the response, e.g. "id,name,effective_price,variants.sku";
+    relationships left out are not loaded at all.
+    """
     esclient = None #None #await get_elastic_db()
     service = ProductService(db, esclient)
     try:
+        fieldset = parse_fields(fields)
         products = await service.get_all(
             name, category_id, tag_id, availability,
-            min_price, max_price, min_rating, limit, offset
+            min_price, max_price, min_rating, limit, offset,
+            attributes=parse_attribute_filter(attributes),
+            sort=sort,
+            fields=fieldset,
         )
-        return Response(data=[p.to_dict() for p in products])
+        etag = weak_etag(
+            [(p.id, p.updated_at) for p in products],
+            name, category_id, tag_id, availability, min_price, max_price, min_rating,
+            limit, offset, attributes, sort, display_currency, fields,
+            currency_registry.digest if display_currency else "",
+            category_cache.digest,
+        )
+        cached = check_not_modified(request, etag)
+        if cached:
+            return cached
+        data = [p.to_dict(fieldset) for p in products]
+        if display_currency:
+            currency_registry.reprice(
+                data,
+                {
+                    field: [row[field] for row in data]
+                    for field in ("min_price", "max_price", "effective_price")
+                    if fieldset is None or field in fieldset
+                },
+                settings.FX_BASE_CURRENCY,
+                display_currency,
+            )
+        return with_validators(Response(data=data), etag)
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
 
 @router.get("/{product_id}")
-async def get_product_by_id(product_id: str, db: AsyncSession = Depends(get_db)):
+async def get_product_by_id(
+    product_id: str, request: Request, fields: Optional[str] = None, db: AsyncSession = Depends(get_db)
+):
     
     esclient = None #await get_elastic_db()
     service = ProductService(db, esclient)
     try:
-        product = await service.get_by_id(product_id)
+        # Writes to anything the payload embeds (variants and their attributes and
+        # images, inventories, category and tag names) bump the product's
+        # updated_at, so it versions the whole detail view; the category name
+        # comes from the category cache
+        updated_at = await row_version(db, Product, product_id)
+        etag = weak_etag([(product_id, updated_at)], fields, category_cache.digest)
+        cached = check_not_modified(request, etag, updated_at) if updated_at else None
+        if cached:
+            return cached
+        fieldset = parse_fields(fields)
+        product = await service.get_by_id(product_id, fields=fieldset)
         if not product:
             return Response(success=False, message=f"Product with id '{product_id}' not found.", code=404)
-        return Response(data=product.to_dict())
+        return with_validators(Response(data=product.to_dict(fieldset)), etag, updated_at)
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -84,6 +147,34 @@ async def create_product(product_in: ProductCreate, db: AsyncSession = Depends(g
         return Response(success=False, message=str(e), code=500)
 
 
+@router.post("/import")
+async def import_products(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(get_current_admin_user),
+):
+    """
+    Bulk-import a catalog from CSV (one variant per row) or NDJSON (one product
+    per line). The format defaults to the file extension. Barcodes are rendered
+    in the background after the import returns.
+    """
+    fmt = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "ndjson")
+    if fmt not in ("csv", "ndjson"):
+        return Response(success=False, message="format must be csv or ndjson", code=400)
+    try:
+        # read off the event loop (UploadFile spools to disk); parsed from memory
+        lines = io.TextIOWrapper(io.BytesIO(await file.read()), encoding="utf-8", newline="")
+        records = read_csv(lines) if fmt == "csv" else read_ndjson(lines)
+        report = await ProductImportService(db).run(records)
+        if report["variants"]:
+            background_tasks.add_task(backfill_barcodes)
+        return Response(data=report, code=201)
+    except Exception as e:
+        return Response(success=False, message=str(e), code=500)
+
+
 @router.put("/{product_id}")
 async def update_product(product_id: str, product_in: ProductCreate, db: AsyncSession = Depends(get_db)):
     esclient = None #await get_elastic_db()
@@ -118,8 +209,14 @@ async def get_all_variants(
     min_stock: Optional[int] = None,
     limit: int = 10,
     offset: int = 0,
+    attributes: Optional[str] = None,
+    fields: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
 ):
+    """
+    `attributes` filters by attribute values, e.g. "color=Red|Blue,size=M".
+    `fields` limits the response, e.g. "id,sku,stock,images.url".
+    """
     service = ProductVariantService(db)
     try:
         variants = await service.get_all(
@@ -130,20 +227,26 @@ async def get_all_variants(
             min_stock=min_stock,
             limit=limit,
             offset=offset,
+            attributes=parse_attribute_filter(attributes),
         )
-        return Response(data=[v.to_dict() for v in variants])
+        fieldset = parse_fields(fields)
+        return Response(data=[v.to_dict(fieldset) for v in variants])
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
 
 @router.get("/variants/{variant_id}")
-async def get_variant_by_id(variant_id: str, db: AsyncSession = Depends(get_db)):
+async def get_variant_by_id(variant_id: str, fields: Optional[str] = None, db: AsyncSession = Depends(get_db)):
     service = ProductVariantService(db)
     try:
         variant = await service.get_by_id(variant_id)
         if not variant:
             return Response(success=False, message=f"Variant with id '{variant_id}' not found.", code=404)
-        return Response(data=variant.to_dict())
+        return Response(data=variant.to_dict(parse_fields(fields)))
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
     except Exception as e:
         return Response(success=False, message=str(e), code=500)
 
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime
 
 from core.database import get_db
-from services.promocode import PromoCodeService
-from schemas.promocode import PromoCodeCreate
+from services.promocode import PromoCodeService, TooManyAttempts
+from services.cart import CartService
+from schemas.promocode import PromoCodeCreate, PromoCodeValidate
 from core.utils.response import Response
 from uuid import UUID
 
@@ -30,6 +31,31 @@ async def get_all_promocodes(
         return Response(success=False, data=str(e), code=500)
 
 
+async def _subtotal(body: PromoCodeValidate, db: AsyncSession):
+    if body.cart_id is None:
+        return body.subtotal or 0
+    summary = await CartService(db).get_summary(body.cart_id)
+    if summary is None:
+        raise ValueError(f"Cart with id '{body.cart_id}' not found.")
+    return summary["subtotal"]
+
+
+@router.post("/validate")
+async def validate_promocode(body: PromoCodeValidate, request: Request, db: AsyncSession = Depends(get_db)):
+    """Check a code against a cart (or a subtotal) and return the discount, without using it up."""
+    service = PromoCodeService(db)
+    try:
+        subtotal = await _subtotal(body, db)
+        res = await service.validate(body.code, subtotal, request.client.host if request.client else None)
+        return Response(data=res)
+    except TooManyAttempts as e:
+        return Response(success=False, message=str(e), code=429)
+    except ValueError as e:
+        return Response(success=False, message=str(e), code=400)
+    except Exception as e:
+        return Response(success=False, data=str(e), code=500)
+
+
 @router.get("/{promo_code_id}")
 async def get_promocode_by_id(promo_code_id: UUID, db: AsyncSession = Depends(get_db)):
     service = PromoCodeService(db)
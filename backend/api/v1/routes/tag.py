@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
@@ -6,6 +6,8 @@ from core.database import get_db
 from services.tag import TagService
 from schemas.tag import TagCreate
 from core.utils.response import Response
+from core.utils.catalog import tag_cache
+from core.utils.conditional import check_not_modified, make_etag, with_validators
 from uuid import UUID
 
 
@@ -14,6 +16,7 @@ router = APIRouter(prefix="/api/v1/tags", tags=["Tags"])
 
 @router.get("/")
 async def get_all_tags(
+    request: Request,
     name: Optional[str] = None,
     limit: int = 10,
     offset: int = 0,
@@ -22,19 +25,27 @@ async def get_all_tags(
     service = TagService(db)
     try:
         tags = await service.get_all(name=name, limit=limit, offset=offset)
-        return Response(data=[tag.to_dict() for tag in tags])
+        etag = make_etag(tag_cache.digest, name, limit, offset)
+        cached = check_not_modified(request, etag)
+        if cached:
+            return cached
+        return with_validators(Response(data=tags), etag)
     except Exception as e:
         return Response(success=False, data=str(e), code=500)
 
 
 @router.get("/{tag_id}")
-async def get_tag_by_id(tag_id: UUID, db: AsyncSession = Depends(get_db)):
+async def get_tag_by_id(tag_id: UUID, request: Request, db: AsyncSession = Depends(get_db)):
     service = TagService(db)
     try:
         tag = await service.get_by_id(tag_id)
         if tag is None:
             return Response(message=f"Tag with id '{tag_id}' not found.",code=404)
-        return Response(data=tag.to_dict())
+        etag = make_etag(tag_cache.digest, tag_id)
+        cached = check_not_modified(request, etag)
+        if cached:
+            return cached
+        return with_validators(Response(data=tag), etag)
     except Exception as e:
         return Response(success=False, data=str(e), code=500)
 
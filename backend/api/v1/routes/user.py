@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException,Query,BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException,Query,BackgroundTasks, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.database import get_db
@@ -47,9 +47,10 @@ async def register(
 @router.post("/login")
 async def login(
     login_data: UserLogin,
+    request: Request,
     auth_service: AuthService = Depends(get_auth_service)
 ):
-    token_data = await auth_service.login_user(login_data)
+    token_data = await auth_service.login_user(login_data, request.client.host if request.client else None)
     return Response(data=token_data, message="User logged in successfully", code=200)
 
 
@@ -45,3 +45,11 @@ async def notify_cart_abandonment(user_id: str, cart_value: float):
         "user_id": user_id,
         "cart_value": cart_value,
     })
+
+# Many carts found abandoned in one scan: one frame instead of one per cart
+async def notify_cart_abandonment_batch(carts: List[dict]):
+    await broadcast_to_admins({
+        "type": "cart_abandoned_batch",
+        "count": len(carts),
+        "carts": carts,
+    })
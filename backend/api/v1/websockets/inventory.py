@@ -1,5 +1,8 @@
+import asyncio
 from fastapi import WebSocket, WebSocketDisconnect, APIRouter
-from typing import List
+from typing import Dict, List, Optional, Tuple
+
+from core.config import settings, logger
 
 router = APIRouter(prefix="/ws/inventory", tags=["Inventory WebSocket"])
 
@@ -13,19 +16,93 @@ async def inventory_ws(websocket: WebSocket):
         while True:
             await websocket.receive_text()  # Optional keep-alive
     except WebSocketDisconnect:
-        inventory_subscribers.remove(websocket)
+        if websocket in inventory_subscribers:
+            inventory_subscribers.remove(websocket)
+
+
+class InventoryUpdateCoalescer:
+    """
+    Merges inventory changes per (product_id, inventory_id) over a short window
+    and broadcasts them as a single batched frame.
+
+    Only the last stock value for each key inside the window is kept, so the
+    message rate seen by dashboards is bounded by the flush interval no matter
+    how many rows a bulk import touches. Every frame carries a monotonically
+    increasing ``seq``; a client that notices a gap re-syncs from the snapshot
+    endpoint and drops frames whose ``seq`` is not newer than the snapshot's.
+    """
+
+    def __init__(self, interval: float, max_batch: int):
+        self.interval = interval
+        self.max_batch = max_batch
+        self.seq = 0
+        self._pending: Dict[Tuple[str, str], int] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def publish(self, product_id: str, inventory_id: str, stock: int) -> None:
+        """Record a change; it is sent on the next flush."""
+        self._pending[(str(product_id), str(inventory_id))] = stock
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        updates, self._pending = self._pending, {}
+        self.seq += 1
+        frame = {
+            "event": "inventory-batch",
+            "seq": self.seq,
+            "updates": [
+                {"product_id": product_id, "inventory_id": inventory_id, "stock": stock}
+                for (product_id, inventory_id), stock in updates.items()
+            ],
+        }
+        for ws in list(inventory_subscribers):
+            try:
+                await ws.send_json(frame)
+            except Exception:
+                if ws in inventory_subscribers:
+                    inventory_subscribers.remove(ws)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Inventory update flush failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+inventory_coalescer = InventoryUpdateCoalescer(
+    interval=settings.INVENTORY_WS_FLUSH_INTERVAL_MS / 1000,
+    max_batch=settings.INVENTORY_WS_MAX_BATCH,
+)
 
-# Broadcast to all connected clients when inventory changes
 
 # Broadcast to all connected clients when inventory changes
-async def broadcast_inventory_update(product_id: str,inventory_id:str, new_stock: int):
-    for ws in inventory_subscribers:
-        try:
-            await ws.send_json({
-                "event": "inventory-update",
-                "product_id": product_id,
-                'inventory_id': inventory_id,
-                "stock": new_stock
-            })
-        except Exception:
-            inventory_subscribers.remove(ws)
\ No newline at end of file
+async def broadcast_inventory_update(product_id: str, inventory_id: str, new_stock: int):
+    inventory_coalescer.publish(product_id, inventory_id, new_stock)
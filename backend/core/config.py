@@ -38,6 +38,81 @@ class Settings:
     REDIS_URL: str = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
     REDIS_CACHE_TTL: int = int(os.getenv('REDIS_CACHE_TTL', '3600'))  # default 3600 seconds (1 hour)
 
+    # Inventory websocket batching
+    INVENTORY_WS_FLUSH_INTERVAL_MS: int = int(os.getenv('INVENTORY_WS_FLUSH_INTERVAL_MS', '250'))
+    INVENTORY_WS_MAX_BATCH: int = int(os.getenv('INVENTORY_WS_MAX_BATCH', '500'))
+
+    # Cart summaries cached in Redis
+    CART_STORE_ENABLED: bool = os.getenv('CART_STORE_ENABLED', 'true').lower() == 'true'
+    CART_STORE_TTL: int = int(os.getenv('CART_STORE_TTL', '900'))
+
+    # Abandoned cart detection
+    CART_ABANDONMENT_ENABLED: bool = os.getenv('CART_ABANDONMENT_ENABLED', 'true').lower() == 'true'
+    CART_ABANDONMENT_IDLE_MINUTES: int = int(os.getenv('CART_ABANDONMENT_IDLE_MINUTES', '60'))
+    CART_ABANDONMENT_SCAN_INTERVAL_SECONDS: int = int(os.getenv('CART_ABANDONMENT_SCAN_INTERVAL_SECONDS', '300'))
+    CART_ABANDONMENT_BATCH_SIZE: int = int(os.getenv('CART_ABANDONMENT_BATCH_SIZE', '200'))
+    CART_ABANDONMENT_EMAILS_PER_SECOND: float = float(os.getenv('CART_ABANDONMENT_EMAILS_PER_SECOND', '2'))
+
+    # Monthly order partitions
+    ORDER_PARTITION_MONTHS_AHEAD: int = int(os.getenv('ORDER_PARTITION_MONTHS_AHEAD', '3'))
+    ORDER_PARTITION_RETENTION_MONTHS: int = int(os.getenv('ORDER_PARTITION_RETENTION_MONTHS', '0'))  # 0 = keep all
+    ORDER_PARTITION_ARCHIVE: bool = os.getenv('ORDER_PARTITION_ARCHIVE', 'true').lower() == 'true'
+    ORDER_PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = int(os.getenv('ORDER_PARTITION_MAINTENANCE_INTERVAL_SECONDS', '86400'))
+
+    # Finance reports (services/finance.py)
+    FINANCE_CHUNK_SIZE: int = int(os.getenv('FINANCE_CHUNK_SIZE', '10000'))
+    FINANCE_CACHE_TTL: int = int(os.getenv('FINANCE_CACHE_TTL', '300'))
+    FINANCE_CACHE_SIZE: int = int(os.getenv('FINANCE_CACHE_SIZE', '128'))
+
+    # Streaming exports (services/exports.py)
+    EXPORT_BATCH_SIZE: int = int(os.getenv('EXPORT_BATCH_SIZE', '5000'))
+
+    # Bulk product import (services/product_import.py)
+    PRODUCT_IMPORT_CHUNK_SIZE: int = int(os.getenv('PRODUCT_IMPORT_CHUNK_SIZE', '1000'))
+
+    # Currency registry and FX conversion (core/utils/currency.py). Product
+    # prices are stored in the base currency.
+    FX_BASE_CURRENCY: str = os.getenv('FX_BASE_CURRENCY', 'USD')
+    CURRENCY_REFRESH_INTERVAL_SECONDS: int = int(os.getenv('CURRENCY_REFRESH_INTERVAL_SECONDS', '300'))
+
+    # Promo code validation (services/promocode.py)
+    PROMO_INDEX_REFRESH_INTERVAL_SECONDS: int = int(os.getenv('PROMO_INDEX_REFRESH_INTERVAL_SECONDS', '60'))
+    PROMO_MAX_FAILED_ATTEMPTS: int = int(os.getenv('PROMO_MAX_FAILED_ATTEMPTS', '10'))
+    PROMO_FAILED_ATTEMPT_WINDOW_SECONDS: int = int(os.getenv('PROMO_FAILED_ATTEMPT_WINDOW_SECONDS', '900'))
+
+    # Category/tag caches (core/utils/catalog.py) and ETag responses
+    CATALOG_CACHE_REFRESH_INTERVAL_SECONDS: int = int(os.getenv('CATALOG_CACHE_REFRESH_INTERVAL_SECONDS', '300'))
+    CONDITIONAL_MAX_AGE: int = int(os.getenv('CONDITIONAL_MAX_AGE', '0'))  # seconds clients/CDNs may skip revalidation
+
+    # Response compression (core/utils/compression.py); brotli is used when installed
+    COMPRESSION_ENABLED: bool = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MINIMUM_SIZE: int = int(os.getenv('COMPRESSION_MINIMUM_SIZE', '1024'))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4'))
+
+    # Response cache for anonymous catalog GETs (core/utils/response_cache.py)
+    RESPONSE_CACHE_ENABLED: bool = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    # comma-separated "path-prefix=ttl-seconds" rules
+    RESPONSE_CACHE_ROUTES: str = os.getenv(
+        'RESPONSE_CACHE_ROUTES',
+        '/api/v1/products/=30,/api/v1/categories/=300,/api/v1/tags/=300,/api/v1/currencies/=300',
+    )
+    RESPONSE_CACHE_STALE_SECONDS: int = int(os.getenv('RESPONSE_CACHE_STALE_SECONDS', '60'))  # stale-while-revalidate window
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '2000'))
+
+    # SQL instrumentation (core/utils/query_stats.py)
+    DB_ECHO: bool = os.getenv('DB_ECHO', 'false').lower() == 'true'  # log every statement
+    QUERY_STATS_ENABLED: bool = os.getenv('QUERY_STATS_ENABLED', 'true').lower() == 'true'
+    # X-DB-* response headers; on by default only for local development
+    QUERY_STATS_HEADERS: bool = os.getenv('QUERY_STATS_HEADERS', str(ENVIRONMENT == 'local')).lower() == 'true'
+    QUERY_SLOW_MS: float = float(os.getenv('QUERY_SLOW_MS', '200'))
+    # the same statement shape this many times in one request is flagged as N+1
+    QUERY_N_PLUS_ONE_THRESHOLD: int = int(os.getenv('QUERY_N_PLUS_ONE_THRESHOLD', '5'))
+
+    # Prometheus metrics (core/utils/metrics.py); set PROMETHEUS_MULTIPROC_DIR when running several workers
+    METRICS_ENABLED: bool = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_SAMPLE_INTERVAL_SECONDS: int = int(os.getenv('METRICS_SAMPLE_INTERVAL_SECONDS', '5'))
+
     # SMS
     # SMS_API_KEY: Optional[str] = os.getenv('SMS_API_KEY')
     # SMS_API_URL: Optional[str] = os.getenv('SMS_API_URL')
@@ -3,6 +3,7 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 
 from core.config import settings
+from core.utils.metrics import TimedQueuePool
 
 Base = declarative_base()
 CHAR_LENGTH=255
@@ -12,7 +13,9 @@ SQLALCHEMY_DATABASE_URL = str(settings.SQLALCHEMY_DATABASE_URI)
 # print(SQLALCHEMY_DATABASE_URL,'------')
 # print(str(settings.ENVIRONMENT),'environment')
 
-engine_db = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True,pool_pre_ping=True )
+engine_db = create_async_engine(
+    SQLALCHEMY_DATABASE_URL, echo=settings.DB_ECHO, pool_pre_ping=True, poolclass=TimedQueuePool
+)
 
 # Session factory for the first database (Async)
 AsyncSessionDB = sessionmaker(
@@ -0,0 +1,76 @@
+import asyncio
+import sys
+from typing import Dict
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from core.config import logger
+from core.database import engine_db
+
+# carts.user_id is unique and guest carts are unique per ip_address, and
+# cart_items has one line per (cart_id, product_variant_id). Databases created
+# before those constraints can hold duplicates, which would make the
+# autogenerated migration fail; this step folds them together first.
+# (grouping column, rows it applies to)
+CART_GROUPS = (
+    ("user_id", "user_id IS NOT NULL"),
+    ("ip_address", "user_id IS NULL AND ip_address IS NOT NULL"),
+)
+
+
+async def dedupe_carts(conn: AsyncConnection) -> Dict[str, int]:
+    """
+    Keep the most recently updated cart of each user (and of each guest IP),
+    move the other carts' lines into it, then merge lines for the same
+    variant by adding their quantities. Returns the rows removed per table.
+    """
+    await conn.execute(text(
+        "CREATE TEMP TABLE cart_duplicates (id uuid PRIMARY KEY, keeper uuid NOT NULL) ON COMMIT DROP"
+    ))
+    for column, where in CART_GROUPS:
+        await conn.execute(text(
+            "INSERT INTO cart_duplicates (id, keeper) "
+            "SELECT id, keeper FROM ("
+            f"  SELECT id, first_value(id) OVER (PARTITION BY {column} ORDER BY updated_at DESC, id DESC) AS keeper"
+            f"  FROM carts WHERE {where}"
+            ") ranked WHERE id <> keeper"
+        ))
+    await conn.execute(text(
+        "UPDATE cart_items i SET cart_id = d.keeper FROM cart_duplicates d WHERE i.cart_id = d.id"
+    ))
+
+    # One line per variant: the newest line keeps the summed quantity
+    await conn.execute(text(
+        "UPDATE cart_items i SET quantity = t.quantity "
+        "FROM ("
+        "  SELECT (array_agg(id ORDER BY updated_at DESC, id))[1] AS keep_id, sum(quantity) AS quantity"
+        "  FROM cart_items GROUP BY cart_id, product_variant_id HAVING count(*) > 1"
+        ") t WHERE i.id = t.keep_id"
+    ))
+    lines = await conn.execute(text(
+        "DELETE FROM cart_items i USING ("
+        "  SELECT id, row_number() OVER (PARTITION BY cart_id, product_variant_id ORDER BY updated_at DESC, id) AS rn"
+        "  FROM cart_items"
+        ") ranked WHERE i.id = ranked.id AND ranked.rn > 1"
+    ))
+    carts = await conn.execute(text("DELETE FROM carts WHERE id IN (SELECT id FROM cart_duplicates)"))
+    return {"carts": carts.rowcount, "cart_items": lines.rowcount}
+
+
+async def _migrate() -> None:
+    async with engine_db.begin() as conn:
+        exists = await conn.execute(text("SELECT to_regclass('public.carts') IS NOT NULL"))
+        if exists.scalar():
+            removed = await dedupe_carts(conn)
+            if any(removed.values()):
+                logger.info(f"Merged duplicate carts before migrating: removed {removed}")
+    await engine_db.dispose()
+
+
+if __name__ == "__main__":
+    # python -m core.utils.cart_dedupe migrate
+    if sys.argv[1:] == ["migrate"]:
+        asyncio.run(_migrate())
+    else:
+        print("usage: python -m core.utils.cart_dedupe migrate")
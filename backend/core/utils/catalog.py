@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from core.config import settings, logger
+from core.database import AsyncSessionDB
+
+Loader = Callable[[AsyncSession], Awaitable[List[Dict[str, Any]]]]
+
+
+class TableCache:
+    """
+    Process-wide copy of a small, read-mostly table (categories, tags) as a
+    list of dicts sorted by name, with an id index. Every load computes a
+    content digest; `version` only moves when the content actually changed,
+    so the digest doubles as an ETag for anything rendered from the set.
+
+    Services reload the cache after each committed write; a background task
+    refreshes it on an interval to pick up writes made by other workers.
+    """
+
+    def __init__(self, name: str, loader: Loader, interval_seconds: int):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.version = 0
+        self.digest = ""
+        self.loaded_at: Optional[datetime] = None
+        self._loader = loader
+        self._rows: List[Dict[str, Any]] = []
+        self._by_id: Dict[UUID, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def load(self, db: Optional[AsyncSession] = None) -> None:
+        if db is None:
+            async with AsyncSessionDB() as session:
+                return await self.load(session)
+        rows = await self._loader(db)
+        digest = hashlib.sha1(json.dumps(rows, default=str, sort_keys=True).encode()).hexdigest()
+        if digest != self.digest:
+            self._rows, self._by_id = rows, {row["id"]: row for row in rows}
+            self.digest = digest
+            self.version += 1
+        self.loaded_at = datetime.utcnow()
+
+    async def ensure_loaded(self, db: AsyncSession) -> "TableCache":
+        if self.loaded_at is None:
+            await self.load(db)
+        return self
+
+    async def ensure_cached(self, db: AsyncSession, ids: Iterable[Optional[UUID]]) -> "TableCache":
+        """
+        Reload when any of `ids` is missing, i.e. was written by another
+        worker since our last refresh, before rendering rows that refer to it.
+        """
+        await self.ensure_loaded(db)
+        if any(row_id is not None and row_id not in self._by_id for row_id in ids):
+            await self.load(db)
+        return self
+
+    def all(self) -> List[Dict[str, Any]]:
+        return self._rows
+
+    def get(self, row_id: Optional[UUID]) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(row_id)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.name} cache refresh failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Models are imported inside the loaders: Product.to_dict renders category
+# names through this module.
+
+async def _load_categories(db: AsyncSession) -> List[Dict[str, Any]]:
+    from models.category import Category
+
+    result = await db.execute(select(Category.id, Category.name, Category.description).order_by(Category.name))
+    return [{"id": row.id, "name": row.name, "description": row.description} for row in result.all()]
+
+
+async def _load_tags(db: AsyncSession) -> List[Dict[str, Any]]:
+    from models.tag import Tag
+
+    result = await db.execute(select(Tag.id, Tag.name).order_by(Tag.name))
+    return [{"id": row.id, "name": row.name} for row in result.all()]
+
+
+category_cache = TableCache("Category", _load_categories, settings.CATALOG_CACHE_REFRESH_INTERVAL_SECONDS)
+tag_cache = TableCache("Tag", _load_tags, settings.CATALOG_CACHE_REFRESH_INTERVAL_SECONDS)
+
+
+async def touch_products(db: AsyncSession, *criteria) -> None:
+    """
+    Bump updated_at on the products matching `criteria`, in the caller's
+    transaction. A product's ETag and Last-Modified are built from its own
+    updated_at, so every write to a row its payload embeds (variant
+    attributes and images, inventories, category and tag names) calls this.
+    """
+    from models.products import Product
+
+    products = Product.__table__
+    await db.execute(update(products).where(*criteria).values(updated_at=datetime.utcnow()))
@@ -0,0 +1,142 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Iterable, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from starlette.responses import Response as StarletteResponse
+
+from core.config import settings
+
+# Conditional GET helpers. A route computes a validator from data it already
+# has (or from a one-column version lookup) and returns early with a 304
+# before loading relationships, calling to_dict() or encoding the body:
+#
+#     etag = weak_etag([(product_id, updated_at)])
+#     cached = check_not_modified(request, etag, updated_at)
+#     if cached:
+#         return cached
+#     ...
+#     return with_validators(Response(data=...), etag, updated_at)
+
+
+def _digest(parts: Iterable[Any]) -> str:
+    return hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:27]
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag from the values a response is rendered from."""
+    return f'"{_digest(parts)}"'
+
+
+def weak_etag(versions: Iterable[Tuple[Any, Optional[datetime]]], *parts: Any) -> str:
+    """
+    Weak ETag from (id, updated_at) pairs, plus anything else the body
+    depends on (query parameters, a collection version, ...).
+    """
+    return f'W/"{_digest([*(f"{id}@{updated_at}" for id, updated_at in versions), *parts])}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check with the weak comparison RFC 9110 prescribes for GET."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(tag) for tag in header.split(",")}
+
+
+def _utc(value: datetime) -> datetime:
+    # Timestamps are stored as naive UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _not_modified_since(request: Request, modified: Optional[datetime]) -> bool:
+    header = request.headers.get("if-modified-since")
+    if not header or modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have one-second resolution
+    return _utc(modified).replace(microsecond=0) <= since
+
+
+def is_fresh(request: Request, etag: Optional[str], modified: Optional[datetime] = None) -> bool:
+    """
+    Whether the client's copy is current. If-None-Match takes precedence
+    over If-Modified-Since (RFC 9110 13.2.2).
+    """
+    if request.headers.get("if-none-match") is not None:
+        return etag is not None and etag_matches(request, etag)
+    return _not_modified_since(request, modified)
+
+
+def cache_control(max_age: Optional[int] = None, private: bool = False) -> str:
+    max_age = settings.CONDITIONAL_MAX_AGE if max_age is None else max_age
+    return f"{'private' if private else 'public'}, max-age={max_age}, must-revalidate"
+
+
+def _validator_headers(
+    etag: str, modified: Optional[datetime], max_age: Optional[int], private: bool
+) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control(max_age, private)}
+    if modified is not None:
+        headers["Last-Modified"] = format_datetime(_utc(modified), usegmt=True)
+    return headers
+
+
+def not_modified(
+    etag: str, max_age: Optional[int] = None, modified: Optional[datetime] = None, private: bool = False
+) -> StarletteResponse:
+    return StarletteResponse(status_code=304, headers=_validator_headers(etag, modified, max_age, private))
+
+
+def check_not_modified(
+    request: Request,
+    etag: str,
+    modified: Optional[datetime] = None,
+    max_age: Optional[int] = None,
+    private: bool = False,
+) -> Optional[StarletteResponse]:
+    """A 304 response when the client's copy is current, else None."""
+    return not_modified(etag, max_age, modified, private) if is_fresh(request, etag, modified) else None
+
+
+def with_validators(
+    response: StarletteResponse,
+    etag: str,
+    modified: Optional[datetime] = None,
+    max_age: Optional[int] = None,
+    private: bool = False,
+) -> StarletteResponse:
+    response.headers.update(_validator_headers(etag, modified, max_age, private))
+    return response
+
+
+async def row_version(db: AsyncSession, model, row_id: Any, *embedded) -> Optional[datetime]:
+    """
+    updated_at of one row by id, a single index lookup. Routes use it to
+    answer 304 before loading the full object graph. Returns None when the
+    row doesn't exist.
+
+    `embedded` are scalar subqueries (correlated to `model`) giving the
+    updated_at of other rows the response renders, e.g. the newest product
+    in an order; the latest of all of them is returned.
+    """
+    version = func.greatest(model.updated_at, *embedded) if embedded else model.updated_at
+    result = await db.execute(select(version).where(model.id == row_id).limit(1))
+    row = result.first()
+    return row[0] if row else None
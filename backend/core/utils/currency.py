@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Union
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from core.config import settings, logger
+from core.database import AsyncSessionDB
+
+CurrencyRef = Union[UUID, str]
+
+
+class _Snapshot(NamedTuple):
+    by_id: Dict[UUID, Dict[str, Any]]
+    by_code: Dict[str, UUID]
+    index: Dict[UUID, int]
+    # Units of each currency per one FX_BASE_CURRENCY, by index; NaN when the
+    # rate is unknown. One extra trailing NaN so index -1 means "unknown".
+    rates: np.ndarray
+
+
+_EMPTY = _Snapshot({}, {}, {}, np.array([np.nan]))
+
+
+class CurrencyRegistry:
+    """
+    Process-wide copy of the currencies table and the latest FX rates, so
+    rendering a symbol or converting an amount never costs a query. It is
+    loaded in the app lifespan, reloaded by CurrencyService after each write,
+    and refreshed on an interval to pick up writes made by other workers.
+
+    A load builds a new immutable snapshot and swaps it in with a single
+    assignment, so readers (including worker threads) never see a half-built
+    table.
+    """
+
+    def __init__(self, interval_seconds: int):
+        self.interval_seconds = interval_seconds
+        self.loaded_at: Optional[datetime] = None
+        # Changes whenever a currency or rate changed; used as an ETag part
+        self.digest = ""
+        self._snapshot = _EMPTY
+        self._task: Optional[asyncio.Task] = None
+
+    async def load(self, db: Optional[AsyncSession] = None) -> None:
+        if db is None:
+            async with AsyncSessionDB() as session:
+                return await self.load(session)
+        # Imported here: models render symbols through this module.
+        from models.currency import Currency, ExchangeRate
+
+        result = await db.execute(
+            select(
+                Currency.id, Currency.code, Currency.name, Currency.symbol,
+                Currency.created_at, Currency.updated_at,
+                ExchangeRate.rate, ExchangeRate.updated_at.label("rate_updated_at"),
+            ).outerjoin(ExchangeRate, ExchangeRate.currency_id == Currency.id)
+        )
+        by_id, by_code, index, rates = {}, {}, {}, []
+        base = settings.FX_BASE_CURRENCY.upper()
+        for row in result.all():
+            code = (row.code or "").upper()
+            rate = 1.0 if code == base else (float(row.rate) if row.rate is not None else np.nan)
+            by_id[row.id] = {
+                "id": row.id,
+                "code": row.code,
+                "name": row.name,
+                "symbol": row.symbol,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+                "rate": None if np.isnan(rate) else rate,
+                "rate_updated_at": row.rate_updated_at.isoformat() if row.rate_updated_at else None,
+            }
+            by_code[code] = row.id
+            index[row.id] = len(rates)
+            rates.append(rate)
+        rates.append(np.nan)
+
+        self._snapshot = _Snapshot(by_id, by_code, index, np.array(rates, dtype=np.float64))
+        self.digest = hashlib.sha1(
+            "|".join(sorted(f"{c['id']}@{c['updated_at']}@{c['rate']}" for c in by_id.values())).encode()
+        ).hexdigest()
+        self.loaded_at = datetime.utcnow()
+
+    # --- Lookups --- #
+
+    def all(self) -> List[Dict[str, Any]]:
+        return list(self._snapshot.by_id.values())
+
+    def get(self, currency_id: UUID) -> Optional[Dict[str, Any]]:
+        return self._snapshot.by_id.get(currency_id)
+
+    def symbol(self, currency_id: Optional[UUID]) -> Optional[str]:
+        currency = self._snapshot.by_id.get(currency_id)
+        return currency["symbol"] if currency else None
+
+    def resolve(self, ref: CurrencyRef) -> UUID:
+        """Currency id for an id or an ISO code (case-insensitive)."""
+        snapshot = self._snapshot
+        if isinstance(ref, UUID):
+            currency_id = ref
+        else:
+            currency_id = snapshot.by_code.get(ref.strip().upper())
+            if currency_id is None:
+                try:
+                    currency_id = UUID(ref)
+                except ValueError:
+                    currency_id = None
+        if currency_id not in snapshot.by_id:
+            raise ValueError(f"Unknown currency: {ref}")
+        return currency_id
+
+    # --- Conversion --- #
+
+    def convert(
+        self,
+        amounts: Iterable[Any],
+        from_currencies: Union[CurrencyRef, Sequence[Optional[UUID]]],
+        to_currency: CurrencyRef,
+    ) -> np.ndarray:
+        """
+        Convert many amounts at once. from_currencies is a single currency or
+        one currency id per amount. Amounts in a currency without a known rate
+        (and None amounts) come back as NaN.
+        """
+        snapshot = self._snapshot
+        values = np.fromiter((np.nan if a is None else float(a) for a in amounts), dtype=np.float64)
+        if isinstance(from_currencies, (UUID, str)):
+            source = np.full(values.size, snapshot.index[self.resolve(from_currencies)], dtype=np.intp)
+        else:
+            source = np.fromiter(
+                (snapshot.index.get(c, -1) for c in from_currencies), dtype=np.intp, count=values.size
+            )
+        target = snapshot.rates[snapshot.index[self.resolve(to_currency)]]
+        return values / snapshot.rates[source] * target
+
+    def reprice(
+        self,
+        rows: List[Dict[str, Any]],
+        amounts: Dict[str, Sequence[Any]],
+        from_currencies: Union[CurrencyRef, Sequence[Optional[UUID]]],
+        to_currency: CurrencyRef,
+    ) -> List[Dict[str, Any]]:
+        """
+        Add display_<field> amounts (rounded to 2 places, None when no rate is
+        known) and display_currency to already serialized rows.
+
+        Example: reprice(rows, {"total_amount": totals}, currency_ids, "EUR")
+        """
+        target = self.resolve(to_currency)
+        symbol = self.symbol(target)
+        for field, values in amounts.items():
+            converted = np.round(self.convert(values, from_currencies, target), 2)
+            for row, value in zip(rows, converted.tolist()):
+                row[f"display_{field}"] = None if np.isnan(value) else value
+        for row in rows:
+            row["display_currency"] = symbol
+        return rows
+
+    # --- Background refresh --- #
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Currency registry refresh failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+currency_registry = CurrencyRegistry(settings.CURRENCY_REFRESH_INTERVAL_SECONDS)
@@ -0,0 +1,56 @@
+from typing import Any, Dict, Optional
+
+# Sparse fieldsets: name -> sub-fieldset for nested objects. None means "every
+# field", both for the whole set and for a nested entry.
+FieldSet = Optional[Dict[str, Any]]
+
+
+def parse_fields(value: Optional[str]) -> FieldSet:
+    """
+    Parse a `fields=` query parameter; dots select fields of nested objects.
+
+        parse_fields("id,name,variants.sku,variants.images.url")
+        → {"id": None, "name": None, "variants": {"sku": None, "images": {"url": None}}}
+
+    A bare nested name ("variants") keeps all of its fields. No parameter
+    returns None, i.e. the full representation.
+    """
+    if value is None or not value.strip():
+        return None
+    fields: Dict[str, Any] = {}
+    for path in value.split(","):
+        names = [name.strip() for name in path.split(".") if name.strip()]
+        node = fields
+        for depth, name in enumerate(names):
+            last = depth == len(names) - 1
+            if last:
+                node[name] = None
+            elif name in node and node[name] is None:
+                break  # the whole object was already requested
+            else:
+                node = node.setdefault(name, {})
+    return fields
+
+
+def pick(fields: FieldSet, values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Project a serializer's output onto a fieldset. Callable values render
+    nested objects and receive the sub-fieldset, and they are only called
+    when requested, so unrequested relationships are never touched.
+    Raises ValueError for names the serializer doesn't have.
+    """
+    if fields is None:
+        return {name: value(None) if callable(value) else value for name, value in values.items()}
+    unknown = fields.keys() - values.keys()
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    return {
+        name: value(fields[name]) if callable(value) else value
+        for name, value in values.items()
+        if name in fields
+    }
+
+
+def relationships(fields: FieldSet, *names: str) -> set:
+    """The relationship names a fieldset needs loaded (all of them for None)."""
+    return set(names) if fields is None else set(names) & fields.keys()
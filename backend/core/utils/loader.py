@@ -0,0 +1,147 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from core.utils.catalog import category_cache
+
+# Request-scoped batch loading. Serializers (to_dict) are synchronous, so they
+# can't query; instead the service collects the keys a page of rows refers to,
+# loads them with one IN (...) query per entity, and to_dict() reads the
+# results back with `loaded()`:
+#
+#     carts = ...
+#     await loaders(db).load_many("product", {item.product_id for item in items})
+#     ...
+#     product = loaded("product", self.product_id)
+#
+# `load()` is the DataLoader form: keys requested in the same event loop tick
+# are coalesced into one query.
+
+Fetch = Callable[[AsyncSession, List[Any]], Awaitable[Dict[Any, Any]]]
+
+
+async def _fetch_products(db: AsyncSession, ids: List[Any]) -> Dict[Any, Any]:
+    from models.products import Inventory, Product
+
+    # Everything Product.to_dict(nested=True) renders; variant attributes and
+    # images are selectin relationships and come along with the variants.
+    result = await db.execute(
+        select(Product)
+        .options(
+            selectinload(Product.tags),
+            selectinload(Product.variants),
+            selectinload(Product.inventories).selectinload(Inventory.inventory_products),
+        )
+        .where(Product.id.in_(ids))
+    )
+    products = result.scalars().all()
+    await category_cache.ensure_cached(db, {product.category_id for product in products})
+    return {product.id: product for product in products}
+
+
+async def _fetch_variants(db: AsyncSession, ids: List[Any]) -> Dict[Any, Any]:
+    from models.products import ProductVariant
+
+    result = await db.execute(select(ProductVariant).where(ProductVariant.id.in_(ids)))
+    return {variant.id: variant for variant in result.scalars().all()}
+
+
+FETCHERS: Dict[str, Fetch] = {
+    "product": _fetch_products,
+    "variant": _fetch_variants,
+}
+
+
+class BatchLoader:
+    """
+    Loads one entity type by key, batching and memoizing for the lifetime of
+    a request. Missing keys resolve to None.
+    """
+
+    def __init__(self, owner: "Loaders", fetch: Fetch):
+        self._owner = owner
+        self._fetch = fetch
+        self._values: Dict[Hashable, Any] = {}
+        self._queue: Dict[Hashable, asyncio.Future] = {}
+
+    async def load(self, key: Hashable) -> Any:
+        if key in self._values:
+            return self._values[key]
+        future = self._queue.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._queue:
+                # dispatch once the current tick has queued all its keys
+                loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+            future = self._queue[key] = loop.create_future()
+        return await future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Any]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys if key is not None)))
+
+    def get(self, key: Hashable) -> Any:
+        """A value loaded earlier in this request, else None."""
+        return self._values.get(key)
+
+    def prime(self, key: Hashable, value: Any) -> None:
+        self._values.setdefault(key, value)
+
+    async def _dispatch(self) -> None:
+        queue, self._queue = self._queue, {}
+        try:
+            # one statement at a time on the request's session
+            async with self._owner.lock:
+                values = await self._fetch(self._owner.db, list(queue))
+        except Exception as e:
+            for future in queue.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in queue.items():
+            self._values[key] = values.get(key)
+            if not future.done():
+                future.set_result(self._values[key])
+
+
+class Loaders:
+    """The current request's loaders, one per entity in FETCHERS, sharing its session."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.lock = asyncio.Lock()
+        self._loaders: Dict[str, BatchLoader] = {}
+
+    def __getitem__(self, name: str) -> BatchLoader:
+        loader = self._loaders.get(name)
+        if loader is None:
+            loader = self._loaders[name] = BatchLoader(self, FETCHERS[name])
+        return loader
+
+    async def load_many(self, name: str, keys: Iterable[Hashable]) -> List[Any]:
+        return await self[name].load_many(set(keys))
+
+
+_current: ContextVar[Optional[Loaders]] = ContextVar("batch_loaders", default=None)
+
+
+def loaders(db: AsyncSession) -> Loaders:
+    """
+    The loaders for this request (each request runs in its own task, so its
+    own context). A different session, e.g. a background job's, starts a
+    fresh set so results never leak across sessions.
+    """
+    current = _current.get()
+    if current is None or current.db is not db:
+        current = Loaders(db)
+        _current.set(current)
+    return current
+
+
+def loaded(name: str, key: Hashable) -> Any:
+    """Synchronous lookup for serializers; None when nothing was batch-loaded."""
+    current = _current.get()
+    return current[name].get(key) if current is not None else None
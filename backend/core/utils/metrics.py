@@ -0,0 +1,156 @@
+import asyncio
+import os
+import time
+from typing import Callable, List, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.responses import Response as StarletteResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import settings, logger
+
+# With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR (an empty
+# directory, wiped before start) in the environment. Each worker then writes
+# its samples to memory-mapped files there, and /metrics, whichever worker
+# serves it, reports counters and histograms summed across all of them.
+# Gauges say how to combine workers: "livesum" adds up the workers that are
+# still alive.
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+HTTP_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being served", ["method"], multiprocess_mode="livesum"
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time to get a connection from the pool, including opening a new one",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0),
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_connections_checked_out", "Connections currently in use", multiprocess_mode="livesum"
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit, miss, stale)", ["cache", "result"]
+)
+QUEUE_DEPTH = Gauge(
+    "background_queue_depth", "Items waiting in in-process background queues", ["queue"], multiprocess_mode="livesum"
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "websocket_connections", "Open websocket connections by channel", ["channel"], multiprocess_mode="livesum"
+)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """The async engine's default pool, timing each checkout into DB_POOL_WAIT."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+
+class MetricsSampler:
+    """
+    Copies values that live on in-process objects (queue sizes, websocket
+    lists, pool usage) into gauges on an interval. Under the multiprocess
+    collector, gauges can't be read back from a callback at scrape time.
+    """
+
+    def __init__(self, interval_seconds: int):
+        self.interval_seconds = interval_seconds
+        self._watches: List[Tuple[Gauge, Callable[[], float]]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(self, gauge: Gauge, read: Callable[[], float]) -> None:
+        self._watches.append((gauge, read))
+
+    def sample(self) -> None:
+        for gauge, read in self._watches:
+            try:
+                gauge.set(read())
+            except Exception as e:
+                logger.warning(f"Metrics sample failed: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            self.sample()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if MULTIPROCESS:
+            # drop this worker's live gauges from the aggregate
+            multiprocess.mark_process_dead(os.getpid())
+
+
+metrics_sampler = MetricsSampler(settings.METRICS_SAMPLE_INTERVAL_SECONDS)
+
+
+def metrics_response() -> StarletteResponse:
+    """The Prometheus text exposition, aggregated across workers when running multiprocess."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        metrics_sampler.sample()
+        registry = REGISTRY
+    return StarletteResponse(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    """
+    Records every HTTP request's latency and status under its route
+    template (never the raw path, so cardinality stays bounded). Register
+    it outermost so the time spent in the other middleware is included.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = HTTP_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            route = scope.get("route")
+            template = route.path if route is not None else "(unmatched)"
+            HTTP_LATENCY.labels(method, template).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, template, str(status)).inc()
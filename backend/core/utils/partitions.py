@@ -0,0 +1,304 @@
+import asyncio
+import re
+import sys
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from core.config import settings, logger
+from core.database import engine_db
+
+# Parent table -> partition key column. order_items is partitioned on its
+# parent order's created_at, so both tables share the same monthly bounds.
+PARTITIONED_TABLES = {
+    "orders": "created_at",
+    "order_items": "order_created_at",
+}
+
+# Serializes partition DDL across workers (and the migration step)
+LOCK_NAME = "order_partitions"
+
+PARTITION_NAME = re.compile(r"^(?P<table>orders|order_items)_(y(?P<year>\d{4})m(?P<month>\d{2})|default)$")
+
+
+def is_partition(name: str) -> bool:
+    """
+    True for child tables managed here (orders_y2025m01, order_items_default, ...).
+    Alembic's include_object uses this so autogenerate doesn't try to drop them.
+    """
+    return bool(PARTITION_NAME.match(name))
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, start: datetime) -> str:
+    """
+    Example: partition_name("orders", datetime(2025, 1, 1)) → "orders_y2025m01"
+    """
+    return f"{table}_y{start.year:04d}m{start.month:02d}"
+
+
+async def _existing_partitions(conn: AsyncConnection, table: str) -> List[str]:
+    result = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table"
+        ),
+        {"table": table},
+    )
+    return [row[0] for row in result]
+
+
+async def _stash_default_rows(conn: AsyncConnection, month: datetime) -> List[str]:
+    """
+    Move rows of `month` out of the DEFAULT partitions into temp tables: a
+    partition can't be created for a range the DEFAULT partition holds rows
+    of. order_items goes first since its rows reference the orders. Returns
+    the tables rows were stashed for.
+    """
+    stashed = []
+    for table in ("order_items", "orders"):
+        default, key = f"{table}_default", PARTITIONED_TABLES[table]
+        if await _relkind(conn, default) is None:
+            continue
+        stash = f"{table}_stash"
+        await conn.execute(text(f'CREATE TEMP TABLE "{stash}" (LIKE "{default}") ON COMMIT DROP'))
+        result = await conn.execute(
+            text(
+                f'WITH moved AS (DELETE FROM "{default}" WHERE "{key}" >= :start AND "{key}" < :end RETURNING *) '
+                f'INSERT INTO "{stash}" SELECT * FROM moved'
+            ),
+            {"start": month, "end": add_months(month, 1)},
+        )
+        if result.rowcount:
+            logger.warning(f"Moving {result.rowcount} rows of {month:%Y-%m} from {default} to their own partition")
+            stashed.append(table)
+        else:
+            await conn.execute(text(f'DROP TABLE "{stash}"'))
+    return stashed
+
+
+async def _restore_stashed_rows(conn: AsyncConnection, stashed: List[str]) -> None:
+    # orders before order_items, for the foreign key
+    for table in ("orders", "order_items"):
+        if table in stashed:
+            await conn.execute(text(f'INSERT INTO "{table}" SELECT * FROM "{table}_stash"'))
+            await conn.execute(text(f'DROP TABLE "{table}_stash"'))
+
+
+async def ensure_partitions(
+    conn: AsyncConnection,
+    start: Optional[datetime] = None,
+    months_ahead: Optional[int] = None,
+) -> List[str]:
+    """
+    Create the monthly partitions from `start` (default: current month) up to
+    `months_ahead` months in the future, plus a DEFAULT partition per table so
+    an insert outside the covered range never fails. Rows that landed in the
+    DEFAULT partition before their month existed are moved into it. Idempotent.
+    """
+    months_ahead = settings.ORDER_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    first = month_start(start or datetime.utcnow())
+    last = add_months(month_start(datetime.utcnow()), months_ahead)
+
+    existing = {table: set(await _existing_partitions(conn, table)) for table in PARTITIONED_TABLES}
+    created = []
+    month = first
+    while month <= last:
+        missing = [table for table in PARTITIONED_TABLES if partition_name(table, month) not in existing[table]]
+        if missing:
+            stashed = await _stash_default_rows(conn, month)
+            for table in missing:
+                name = partition_name(table, month)
+                await conn.execute(text(
+                    f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+                ))
+                created.append(name)
+            await _restore_stashed_rows(conn, stashed)
+        month = add_months(month, 1)
+    for table in PARTITIONED_TABLES:
+        if f"{table}_default" not in existing[table]:
+            await conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{table}_default" PARTITION OF "{table}" DEFAULT'))
+            created.append(f"{table}_default")
+    return created
+
+
+async def expire_partitions(
+    conn: AsyncConnection,
+    retention_months: Optional[int] = None,
+    archive: Optional[bool] = None,
+) -> List[str]:
+    """
+    Detach monthly partitions older than `retention_months` (0 keeps everything).
+    With `archive` the detached tables are kept as plain tables for export;
+    otherwise they are dropped. order_items goes first because its foreign key
+    references the orders partition being detached.
+    """
+    retention_months = settings.ORDER_PARTITION_RETENTION_MONTHS if retention_months is None else retention_months
+    archive = settings.ORDER_PARTITION_ARCHIVE if archive is None else archive
+    if retention_months <= 0:
+        return []
+
+    cutoff = add_months(month_start(datetime.utcnow()), -retention_months)
+    expired = []
+    for table in ("order_items", "orders"):
+        for name in sorted(await _existing_partitions(conn, table)):
+            match = PARTITION_NAME.match(name)
+            if not match or not match.group("year"):
+                continue
+            if datetime(int(match.group("year")), int(match.group("month")), 1) >= cutoff:
+                continue
+            await conn.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+            if table == "order_items":
+                await conn.execute(text(f'ALTER TABLE "{name}" DROP CONSTRAINT IF EXISTS fk_order_items_order'))
+            if not archive:
+                await conn.execute(text(f'DROP TABLE "{name}"'))
+            expired.append(name)
+    return expired
+
+
+async def _lock(conn: AsyncConnection) -> None:
+    """Transaction-scoped advisory lock; released on commit or rollback."""
+    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": LOCK_NAME})
+
+
+async def _relkind(conn: AsyncConnection, table: str) -> Optional[str]:
+    result = await conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :table AND relnamespace = 'public'::regnamespace"),
+        {"table": table},
+    )
+    return result.scalar_one_or_none()
+
+
+async def convert_to_partitioned(conn: AsyncConnection) -> bool:
+    """
+    One-off migration of existing heap `orders`/`order_items` tables into the
+    partitioned layout declared on the models. Runs before Alembic's
+    autogenerate (see run_migrations.sh) because autogenerate can't change a
+    table into a partitioned one. Returns False when there is nothing to do.
+    """
+    from models.orders import Order, OrderItem
+
+    if await _relkind(conn, "orders") != "r":
+        return False
+
+    logger.info("Converting orders/order_items to monthly range partitions...")
+    await conn.execute(text("ALTER TABLE payments DROP CONSTRAINT IF EXISTS payments_order_id_fkey"))
+    await conn.execute(text("ALTER TABLE order_items DROP CONSTRAINT IF EXISTS order_items_order_id_fkey"))
+    for table in ("orders", "order_items"):
+        # The new tables reuse the index and constraint names, and the old
+        # secondary indexes aren't needed for a single sequential copy.
+        result = await conn.execute(
+            text(
+                "SELECT indexname FROM pg_indexes WHERE schemaname = 'public' "
+                "AND tablename = :table AND indexname <> :pkey"
+            ),
+            {"table": table, "pkey": f"{table}_pkey"},
+        )
+        for (index,) in result.all():
+            await conn.execute(text(f'DROP INDEX "{index}"'))
+        await conn.execute(text(f'ALTER TABLE "{table}" RENAME CONSTRAINT "{table}_pkey" TO "{table}_heap_pkey"'))
+        await conn.execute(text(f'ALTER TABLE "{table}" RENAME TO "{table}_heap"'))
+
+    await conn.run_sync(
+        lambda sync_conn: Order.metadata.create_all(sync_conn, tables=[Order.__table__, OrderItem.__table__])
+    )
+
+    oldest = (await conn.execute(text("SELECT min(created_at) FROM orders_heap"))).scalar()
+    await ensure_partitions(conn, start=oldest)
+
+    await conn.execute(text(
+        "INSERT INTO orders (id, user_id, status, total_amount, currency, created_at, updated_at) "
+        "SELECT id, user_id, status, total_amount, currency, "
+        "COALESCE(created_at, updated_at, now() AT TIME ZONE 'utc'), updated_at FROM orders_heap"
+    ))
+    await conn.execute(text(
+        "INSERT INTO order_items (id, order_id, order_created_at, product_id, quantity, price_per_unit, total_price) "
+        "SELECT i.id, i.order_id, o.created_at, i.product_id, i.quantity, i.price_per_unit, i.total_price "
+        "FROM order_items_heap i JOIN orders o ON o.id = i.order_id"
+    ))
+    await conn.execute(text("DROP TABLE order_items_heap"))
+    await conn.execute(text("DROP TABLE orders_heap"))
+    return True
+
+
+async def maintain_partitions() -> Tuple[List[str], List[str]]:
+    async with engine_db.begin() as conn:
+        # every worker runs this; one at a time, each seeing the last one's work
+        await _lock(conn)
+        if await _relkind(conn, "orders") != "p":
+            return [], []
+        created = await ensure_partitions(conn)
+        expired = await expire_partitions(conn)
+    if created or expired:
+        logger.info(f"Order partitions created={created} expired={expired}")
+    return created, expired
+
+
+class PartitionMaintainer:
+    """
+    Keeps the next few months of order partitions created ahead of time and
+    applies the retention policy on an interval. The first pass is awaited in
+    the app lifespan so inserts never race partition creation at startup.
+    """
+
+    def __init__(self, interval_seconds: int):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await maintain_partitions()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Order partition maintenance failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+partition_maintainer = PartitionMaintainer(settings.ORDER_PARTITION_MAINTENANCE_INTERVAL_SECONDS)
+
+
+async def _migrate() -> None:
+    import models  # noqa: F401  (register every table on Base.metadata)
+
+    async with engine_db.begin() as conn:
+        await _lock(conn)
+        if await _relkind(conn, "orders") is None:
+            return
+        await convert_to_partitioned(conn)
+    await engine_db.dispose()
+
+
+if __name__ == "__main__":
+    # python -m core.utils.partitions migrate
+    if sys.argv[1:] == ["migrate"]:
+        asyncio.run(_migrate())
+    else:
+        print("usage: python -m core.utils.partitions migrate")
@@ -0,0 +1,171 @@
+import hashlib
+import re
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional
+
+from cachetools import LRUCache
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import settings, logger
+
+# Statement fingerprints: the SQL with bind parameters, literals and IN lists
+# collapsed, so the same query issued for different rows counts as one shape.
+_IN_LIST = re.compile(r"\bIN \((?:\s*(?:\$\d+|\?|%\(\w+\)s|:\w+)(?:::[\w\[\]]+)?\s*,?)+\)", re.IGNORECASE)
+_PARAM = re.compile(r"\$\d+(?:::[\w\[\]]+)?|%\(\w+\)s")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    sql = _SPACE.sub(" ", statement).strip()
+    sql = _IN_LIST.sub("IN (...)", sql)
+    sql = _STRING.sub("?", sql)
+    sql = _PARAM.sub("?", sql)
+    return _NUMBER.sub("?", sql)
+
+
+@dataclass
+class RequestStats:
+    route: str
+    queries: int = 0
+    db_ms: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+
+    def n_plus_one(self) -> Dict[str, int]:
+        """Statement shapes repeated at least QUERY_N_PLUS_ONE_THRESHOLD times."""
+        return {sql: n for sql, n in self.shapes.items() if n >= settings.QUERY_N_PLUS_ONE_THRESHOLD}
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("query_stats", default=None)
+
+
+class QueryStats:
+    """
+    Process-wide aggregates behind the metrics endpoint: per-route request,
+    statement and DB time totals, the N+1 shapes seen per route, and the
+    most recent slow statements.
+    """
+
+    def __init__(self, slow_ms: float, keep_slow: int = 100, keep_shapes: int = 500):
+        self.slow_ms = slow_ms
+        self.n_plus_one: LRUCache = LRUCache(maxsize=keep_shapes)
+        self.slow: Deque[Dict[str, Any]] = deque(maxlen=keep_slow)
+        self.routes: Dict[str, Dict[str, float]] = {}
+        self.started_at = datetime.utcnow()
+
+    def record_statement(self, statement: str, elapsed_ms: float) -> None:
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_ms += elapsed_ms
+            stats.shapes[fingerprint(statement)] += 1
+        if elapsed_ms >= self.slow_ms:
+            route = stats.route if stats is not None else "background"
+            sql = _SPACE.sub(" ", statement).strip()[:1000]
+            self.slow.append({"route": route, "ms": round(elapsed_ms, 1), "sql": sql, "at": datetime.utcnow()})
+            logger.warning(f"Slow query ({elapsed_ms:.0f} ms) on {route}: {sql[:300]}")
+
+    def record_request(self, stats: RequestStats) -> None:
+        route = self.routes.setdefault(
+            stats.route, {"requests": 0, "queries": 0, "db_ms": 0.0, "max_queries": 0, "n_plus_one_requests": 0}
+        )
+        route["requests"] += 1
+        route["queries"] += stats.queries
+        route["db_ms"] += stats.db_ms
+        route["max_queries"] = max(route["max_queries"], stats.queries)
+
+        repeated = stats.n_plus_one()
+        if repeated:
+            route["n_plus_one_requests"] += 1
+        for sql, count in repeated.items():
+            key = hashlib.sha1(f"{stats.route}|{sql}".encode()).hexdigest()[:16]
+            entry = self.n_plus_one.get(key) or {"route": stats.route, "sql": sql[:1000], "requests": 0, "max_repeats": 0}
+            entry["requests"] += 1
+            entry["max_repeats"] = max(entry["max_repeats"], count)
+            self.n_plus_one[key] = entry
+            logger.warning(f"Possible N+1 on {stats.route}: {count}x {sql[:300]}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        routes = {
+            name: {**totals, "avg_queries": round(totals["queries"] / totals["requests"], 2),
+                   "avg_db_ms": round(totals["db_ms"] / totals["requests"], 2)}
+            for name, totals in self.routes.items()
+        }
+        return {
+            "since": self.started_at,
+            "slow_query_ms": self.slow_ms,
+            "n_plus_one_threshold": settings.QUERY_N_PLUS_ONE_THRESHOLD,
+            "routes": dict(sorted(routes.items(), key=lambda item: -item[1]["avg_queries"])),
+            "n_plus_one": sorted(self.n_plus_one.values(), key=lambda entry: -entry["requests"]),
+            "slow_queries": list(reversed(self.slow)),
+        }
+
+    def reset(self) -> None:
+        self.n_plus_one.clear()
+        self.slow.clear()
+        self.routes = {}
+        self.started_at = datetime.utcnow()
+
+
+query_stats = QueryStats(settings.QUERY_SLOW_MS)
+
+
+def instrument(engine: Engine) -> None:
+    """Time every statement on `engine` (the sync_engine of an AsyncEngine)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        query_stats.record_statement(statement, (time.perf_counter() - started) * 1000)
+
+
+class QueryStatsMiddleware:
+    """
+    Collects the statements each HTTP request runs (SQLAlchemy runs the
+    event hooks in the request's context) and folds them into `query_stats`
+    under the route template. With QUERY_STATS_HEADERS on, responses carry
+    X-DB-Queries, X-DB-Time-Ms and X-DB-N-Plus-One. Register it outside the
+    response cache so those headers are never cached.
+    """
+
+    def __init__(self, app: ASGIApp, headers: bool = False):
+        self.app = app
+        self.headers = headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # the raw path until routing resolves the template (slow-query log)
+        stats = RequestStats(route=f"{scope['method']} {scope['path']}")
+        token = _current.set(stats)
+
+        async def send_with_stats(message: Message) -> None:
+            if message["type"] == "http.response.start" and self.headers:
+                headers = MutableHeaders(raw=message["headers"])
+                headers["X-DB-Queries"] = str(stats.queries)
+                headers["X-DB-Time-Ms"] = f"{stats.db_ms:.1f}"
+                headers["X-DB-N-Plus-One"] = str(len(stats.n_plus_one()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current.reset(token)
+            # FastAPI sets the matched route on the scope; group by its template
+            route = scope.get("route")
+            stats.route = f"{scope['method']} {route.path if route is not None else '(unmatched)'}"
+            query_stats.record_request(stats)
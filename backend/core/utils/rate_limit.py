@@ -0,0 +1,31 @@
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """
+    Token bucket for pacing outbound calls (emails, webhooks, ...).
+
+    Usage:
+        limiter = AsyncRateLimiter(rate=5, burst=5)  # 5 calls per second
+        await limiter.acquire()
+        send(...)
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
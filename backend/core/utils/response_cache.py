@@ -0,0 +1,300 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Coroutine, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from cachetools import LRUCache
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import settings, logger
+from core.utils.conditional import is_fresh
+from core.utils.metrics import CACHE_REQUESTS
+
+# Table written -> cached path prefixes it can change. Product payloads embed
+# category names, tags, variants and inventories; display_currency prices
+# depend on exchange rates.
+PRODUCTS = "/api/v1/products/"
+TABLE_PREFIXES: Dict[str, Tuple[str, ...]] = {
+    "products": (PRODUCTS,),
+    "product_variants": (PRODUCTS,),
+    "product_variant_attributes": (PRODUCTS,),
+    "product_variant_images": (PRODUCTS,),
+    "product_tags": (PRODUCTS,),
+    "inventory_products": (PRODUCTS,),
+    "inventories": (PRODUCTS,),
+    "categories": ("/api/v1/categories/", PRODUCTS),
+    "tags": ("/api/v1/tags/", PRODUCTS),
+    "currencies": ("/api/v1/currencies/",),
+    "exchange_rates": ("/api/v1/currencies/", PRODUCTS),
+}
+
+# Request headers that make the app answer for one client (a 304 or a
+# forced revalidation). Shared renders drop them, and _send answers
+# conditional requests from the stored entry instead.
+CLIENT_HEADERS = (b"if-none-match", b"if-modified-since", b"cache-control")
+
+
+def parse_routes(value: str) -> Dict[str, int]:
+    """"/api/v1/products/=30,/api/v1/tags/=300" -> {"/api/v1/products/": 30, ...}"""
+    routes = {}
+    for part in value.split(","):
+        prefix, _, ttl = part.strip().partition("=")
+        if prefix and ttl:
+            routes[prefix.strip()] = int(ttl)
+    return routes
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    cacheable: bool
+    fresh_until: float = 0.0
+    stale_until: float = 0.0
+    # the route the render matched, copied onto the scopes it answers so the
+    # metrics and query stats middleware label hits by their template
+    route: Optional[BaseRoute] = None
+
+
+class ResponseCache:
+    """
+    In-process cache of whole GET responses for anonymous catalog traffic,
+    keyed on the path plus the sorted query string.
+
+    - Each route prefix has its own TTL; after it lapses an entry is served
+      stale for up to `stale_seconds` while one background render refreshes it.
+    - Concurrent misses for the same key share a single render (single-flight),
+      so a stampede on a popular listing costs one trip to the database.
+    - Committed writes invalidate the affected prefixes through the session
+      hooks below; `invalidate()` can also be called directly.
+
+    The cache is per process: other workers converge within the TTL.
+    """
+
+    def __init__(self, routes: Dict[str, int], stale_seconds: int, max_entries: int):
+        # longest prefix first so the most specific rule wins
+        self.routes = dict(sorted(routes.items(), key=lambda item: -len(item[0])))
+        self.stale_seconds = stale_seconds
+        self._entries: LRUCache = LRUCache(maxsize=max_entries)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._invalidations = 0
+
+    def ttl_for(self, path: str) -> Optional[int]:
+        for prefix, ttl in self.routes.items():
+            if path.startswith(prefix):
+                return ttl
+        return None
+
+    @staticmethod
+    def key(scope: Scope) -> str:
+        query = sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+        return f"{scope['path']}?{urlencode(query)}"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        return self._entries.get(key)
+
+    @property
+    def rendering(self) -> int:
+        """Renders in flight, background refreshes included."""
+        return len(self._inflight)
+
+    def invalidate(self, prefixes: Iterable[str]) -> None:
+        prefixes = tuple(prefixes)
+        if not prefixes:
+            return
+        self._invalidations += 1
+        for key in [key for key in self._entries.keys() if key.startswith(prefixes)]:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._invalidations += 1
+        self._entries.clear()
+
+    def fill(self, key: str, ttl: int, render: Coroutine) -> "asyncio.Task[CachedResponse]":
+        """Start (or join) the single render for `key`; stores the result if cacheable."""
+        task = self._inflight.get(key)
+        if task is not None:
+            render.close()
+            return task
+
+        async def run() -> CachedResponse:
+            generation = self._invalidations
+            try:
+                response = await render
+                # a write committed while rendering may not be reflected; don't keep it
+                if response.cacheable and generation == self._invalidations:
+                    now = time.monotonic()
+                    response.fresh_until = now + ttl
+                    response.stale_until = response.fresh_until + self.stale_seconds
+                    self._entries[key] = response
+                return response
+            finally:
+                self._inflight.pop(key, None)
+
+        task = asyncio.create_task(run())
+        # background refreshes are never awaited; keep their failures out of the loop's handler
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return task
+
+
+response_cache = ResponseCache(
+    parse_routes(settings.RESPONSE_CACHE_ROUTES),
+    settings.RESPONSE_CACHE_STALE_SECONDS,
+    settings.RESPONSE_CACHE_MAX_ENTRIES,
+)
+
+
+class ResponseCacheMiddleware:
+    """
+    Serves GETs under the configured prefixes from `response_cache`.
+    Requests carrying credentials bypass the cache, and so do responses that
+    are not 200, set cookies, or are marked private/no-store. Cached
+    responses answer If-None-Match and If-Modified-Since with 304 directly
+    (renders never see those headers). Register it inside
+    the compression middleware so entries are stored uncompressed.
+    """
+
+    def __init__(self, app: ASGIApp, cache: ResponseCache = response_cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        ttl = self.cache.ttl_for(scope["path"])
+        headers = Headers(scope=scope)
+        if ttl is None or "authorization" in headers or "no-cache" in headers.get("cache-control", ""):
+            await self.app(scope, receive, send)
+            return
+
+        key = self.cache.key(scope)
+        entry = self.cache.get(key)
+        now = time.monotonic()
+        if entry is not None and now < entry.fresh_until:
+            await self._send(scope, send, entry, "HIT")
+            return
+        if entry is not None and now < entry.stale_until:
+            self.cache.fill(key, ttl, self._render(scope))
+            await self._send(scope, send, entry, "STALE")
+            return
+
+        # Shielded: a client going away must not cancel the render others wait on
+        entry = await asyncio.shield(self.cache.fill(key, ttl, self._render(scope)))
+        await self._send(scope, send, entry, "MISS")
+
+    async def _render(self, scope: Scope) -> CachedResponse:
+        start: Dict[str, Message] = {}
+        chunks: List[bytes] = []
+        requested = False
+
+        async def receive() -> Message:
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            return {"type": "http.disconnect"}
+
+        async def capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                start["message"] = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        # The render is shared by every request joining it, so it must not
+        # carry the first requester's validators
+        shared = {**scope, "headers": [(k, v) for k, v in scope["headers"] if k not in CLIENT_HEADERS]}
+        try:
+            await self.app(shared, receive, capture)
+        except Exception as e:
+            logger.error(f"Response cache render failed for {scope['path']}: {e}")
+            raise
+        message = start["message"]
+        headers = Headers(raw=message["headers"])
+        cache_control = headers.get("cache-control", "")
+        cacheable = (
+            message["status"] == 200
+            and "set-cookie" not in headers
+            and "private" not in cache_control
+            and "no-store" not in cache_control
+        )
+        return CachedResponse(
+            message["status"], list(message["headers"]), b"".join(chunks), cacheable, route=shared.get("route")
+        )
+
+    @staticmethod
+    def _last_modified(headers: Headers) -> Optional[datetime]:
+        try:
+            return parsedate_to_datetime(headers["last-modified"]) if "last-modified" in headers else None
+        except (TypeError, ValueError):
+            return None
+
+    async def _send(self, scope: Scope, send: Send, entry: CachedResponse, status: str) -> None:
+        CACHE_REQUESTS.labels("response", status.lower()).inc()
+        # the app ran on another scope (or not at all); outer middleware reads the route from this one
+        if entry.route is not None:
+            scope["route"] = entry.route
+        headers = Headers(raw=entry.headers)
+        if entry.cacheable and is_fresh(Request(scope), headers.get("etag"), self._last_modified(headers)):
+            not_modified = [(k, v) for k, v in entry.headers if k in (b"etag", b"cache-control", b"last-modified")]
+            await send({"type": "http.response.start", "status": 304, "headers": [*not_modified, (b"x-cache", status.encode())]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({
+            "type": "http.response.start",
+            "status": entry.status,
+            "headers": [*entry.headers, (b"x-cache", status.encode())],
+        })
+        await send({"type": "http.response.body", "body": entry.body})
+
+
+# --- Invalidation hooks --- #
+# Every session records the tables it writes, through the unit of work
+# (after_flush) and bulk/Core statements (do_orm_execute). The affected
+# prefixes are invalidated once the transaction commits, and the list is
+# dropped on rollback.
+
+_WRITTEN = "response_cache_tables"
+
+
+def _record(session: Session, tables: Iterable[str]) -> None:
+    session.info.setdefault(_WRITTEN, set()).update(t for t in tables if t in TABLE_PREFIXES)
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session: Session, flush_context) -> None:
+    _record(session, (
+        obj.__table__.name
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if hasattr(obj, "__table__")
+    ))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_execute(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            _record(orm_execute_state.session, [table.name])
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    tables: Set[str] = session.info.pop(_WRITTEN, set())
+    if tables:
+        response_cache.invalidate({prefix for table in tables for prefix in TABLE_PREFIXES[table]})
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_WRITTEN, None)
@@ -0,0 +1,26 @@
+import asyncio
+import sys
+
+from sqlalchemy.schema import CreateSequence
+
+from core.database import engine_db
+
+# Alembic autogenerate doesn't emit standalone sequences (those not attached
+# to a column), so the migration step creates them before the app starts.
+
+
+async def _migrate() -> None:
+    from models.products import sku_sequence
+
+    async with engine_db.begin() as conn:
+        for sequence in (sku_sequence,):
+            await conn.execute(CreateSequence(sequence, if_not_exists=True))
+    await engine_db.dispose()
+
+
+if __name__ == "__main__":
+    # python -m core.utils.sequences migrate
+    if sys.argv[1:] == ["migrate"]:
+        asyncio.run(_migrate())
+    else:
+        print("usage: python -m core.utils.sequences migrate")
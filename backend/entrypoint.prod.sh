@@ -23,7 +23,15 @@ chmod +x ./run_migrations.sh && success "Migration script made executable"
 info "Running migration script..."
 ./run_migrations.sh
 
+# Per-worker metric files for the Prometheus multiprocess collector; stale
+# files from a previous run would be summed in, so start from an empty dir
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 info "Starting server..."
+# X-Forwarded-For is only trusted from FORWARDED_ALLOW_IPS; set it to the
+# reverse proxy's address so clients can't spoof the address guest carts,
+# promo throttling and rate limits are keyed on.
 # Start app with production optimizations
 exec uvicorn main:app \
     --host 0.0.0.0 \
@@ -31,6 +39,6 @@ exec uvicorn main:app \
     --workers 1 \
     --worker-class uvicorn.workers.UvicornWorker \
     --proxy-headers \
-    --forwarded-allow-ips="*" \
+    --forwarded-allow-ips="${FORWARDED_ALLOW_IPS:-*}" \
     --access-log \
     --log-level info
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""
+Bulk-import a product catalog from the command line.
+
+    python3 -m import_products catalog.csv
+    python3 -m import_products catalog.ndjson --chunk-size 2000 --skip-barcodes
+
+See services/product_import.py for the CSV/NDJSON layouts.
+"""
+import argparse
+import asyncio
+import json
+
+import models  # noqa: F401  (register every table on Base.metadata)
+from core.database import AsyncSessionDB, engine_db
+from services.product_import import ProductImportService, backfill_barcodes, read_csv, read_ndjson
+
+
+async def main(path: str, fmt: str, chunk_size: int, skip_barcodes: bool) -> None:
+    with open(path, encoding="utf-8", newline="") as lines:
+        records = read_csv(lines) if fmt == "csv" else read_ndjson(lines)
+        async with AsyncSessionDB() as session:
+            report = await ProductImportService(session, chunk_size).run(records)
+    print(json.dumps(report, indent=2, default=str))
+
+    if report["variants"] and not skip_barcodes:
+        print(f"Rendered {await backfill_barcodes()} barcodes")
+    await engine_db.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-import products from CSV or NDJSON.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--skip-barcodes", action="store_true", help="leave barcodes for a later run")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    asyncio.run(main(args.path, fmt, args.chunk_size, args.skip_barcodes))
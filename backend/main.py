@@ -14,8 +14,24 @@ from api.v1.routes.promocode import router as promocode_router
 from api.v1.routes.tag import router as tag_router
 from api.v1.routes.cart import router as cart_router
 from api.v1.routes.orders import router as orders_router
+from api.v1.routes.analytics import router as analytics_router
+from api.v1.routes.exports import router as exports_router
+from api.v1.routes.metrics import router as metrics_router
 # from api.v1.websockets.orders import router as ws_router
-# from api.v1.websockets.inventory import router as ws_inventory
+from api.v1.websockets.inventory import router as ws_inventory, inventory_coalescer, inventory_subscribers
+from services.cart import abandoned_cart_detector
+from services.promocode import promo_index
+from core.utils.partitions import maintain_partitions, partition_maintainer
+from core.utils.currency import currency_registry
+from core.utils.catalog import category_cache, tag_cache
+from core.utils.compression import CompressionMiddleware
+from core.utils.response_cache import ResponseCacheMiddleware, response_cache
+from core.utils.query_stats import QueryStatsMiddleware, instrument
+from core.utils.metrics import (
+    DB_POOL_CHECKED_OUT, QUEUE_DEPTH, WEBSOCKET_CONNECTIONS, MetricsMiddleware, metrics_response, metrics_sampler,
+)
+from core.database import AsyncSessionDB, engine_db
+from services.products import refresh_attribute_maps, refresh_product_prices
 
 from contextlib import asynccontextmanager
 from core.config import settings,logger
@@ -62,12 +78,65 @@ async def lifespan(app: FastAPI):
 
     await redis_client.connect()
     logger.info("redis is connected...")
+
+    try:
+        await maintain_partitions()
+    except Exception as e:
+        logger.error(f"Order partition maintenance failed: {e}")
+    partition_maintainer.start()
+
+    # Backfill attribute maps and prices of products written before those
+    # denormalized columns existed
+    try:
+        async with AsyncSessionDB() as session:
+            await refresh_attribute_maps(session)
+            await refresh_product_prices(session)
+            await session.commit()
+    except Exception as e:
+        logger.error(f"Product denormalization backfill failed: {e}")
+
+    try:
+        await currency_registry.load()
+    except Exception as e:
+        logger.error(f"Currency registry load failed: {e}")
+    currency_registry.start()
+
+    try:
+        await promo_index.load()
+    except Exception as e:
+        logger.error(f"Promo code index load failed: {e}")
+    promo_index.start()
+
+    for cache in (category_cache, tag_cache):
+        try:
+            await cache.load()
+        except Exception as e:
+            logger.error(f"{cache.name} cache load failed: {e}")
+        cache.start()
+
+    inventory_coalescer.start()
+    if settings.METRICS_ENABLED:
+        metrics_sampler.watch(DB_POOL_CHECKED_OUT, engine_db.pool.checkedout)
+        metrics_sampler.watch(QUEUE_DEPTH.labels("inventory_ws"), lambda: inventory_coalescer.pending)
+        metrics_sampler.watch(QUEUE_DEPTH.labels("response_cache_renders"), lambda: response_cache.rendering)
+        metrics_sampler.watch(WEBSOCKET_CONNECTIONS.labels("inventory"), lambda: len(inventory_subscribers))
+        metrics_sampler.start()
+    if settings.CART_ABANDONMENT_ENABLED:
+        abandoned_cart_detector.start()
     
     yield
     
     # Shutdown
     # await telegram.telegram_app.stop()
     # logger.error("Bot stopped.")
+    await abandoned_cart_detector.stop()
+    await partition_maintainer.stop()
+    await currency_registry.stop()
+    await promo_index.stop()
+    await category_cache.stop()
+    await tag_cache.stop()
+    await inventory_coalescer.stop()
+    await metrics_sampler.stop()
     await redis_client.disconnect()
     logger.critical("redis is disconnected...")
     # Stop Kafka consumer gracefully
@@ -85,6 +154,23 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Added first so it sits inside compression and caches uncompressed bodies
+if settings.RESPONSE_CACHE_ENABLED:
+    app.add_middleware(ResponseCacheMiddleware)
+
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+
+# Outside the response cache so the X-DB-* headers are never stored with an entry
+if settings.QUERY_STATS_ENABLED:
+    instrument(engine_db.sync_engine)
+    app.add_middleware(QueryStatsMiddleware, headers=settings.QUERY_STATS_HEADERS)
+
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
         CORSMiddleware,
@@ -92,6 +178,7 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag", "Last-Modified", "X-Cache", "X-DB-Queries", "X-DB-Time-Ms", "X-DB-N-Plus-One"],
     )
 
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
@@ -100,6 +187,10 @@ app.add_middleware(
     allowed_hosts=["localhost", "127.0.0.1", "*.banwee.com",'https://banwee.netlify.app/']
 )
 
+# Outermost, so latency includes every other middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Include all routers
 app.include_router(user_router)
 app.include_router(address_router)
@@ -113,8 +204,11 @@ app.include_router(promocode_router)
 app.include_router(tag_router)
 app.include_router(orders_router)
 app.include_router(cart_router)
+app.include_router(analytics_router)
+app.include_router(exports_router)
+app.include_router(metrics_router)
 # app.include_router(ws_router)
-# app.include_router(ws_inventory)
+app.include_router(ws_inventory)
 
 @app.get("/")
 async def read_root():
@@ -133,7 +227,8 @@ async def read_root():
             "products": "/products",
             "promocodes": "/promocodes",
             "tags": "/tags",
-            "orders": "/orders"
+            "orders": "/orders",
+            "analytics": "/analytics"
         },
         "docs": {
             "Swagger": "/docs",
@@ -162,6 +257,11 @@ async def health_check():
             "error": str(e)
         }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return metrics_response()
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     errors = []
@@ -6,8 +6,9 @@ from .payments import Payment
 from .products import Product,ProductVariant,ProductVariantAttribute,ProductVariantImage
 from .promocode import PromoCode
 from .tag import Tag
-from .currency import Currency
+from .currency import Currency, ExchangeRate
 from .cart import Cart, CartItem
+from .analytics import SalesDailyRollup
 # import other models too...
 
-__all__ = ['User', 'Address','EmailChangeRequestModel',"Category","Cart","CartItem", "Currency", 'Order','OrderItem','Payment','Product','ProductVariant','ProductVariantAttribute','ProductVariantImage','PromoCode','Tag']
+__all__ = ['User', 'Address','EmailChangeRequestModel',"Category","Cart","CartItem", "Currency", "ExchangeRate", 'Order','OrderItem','Payment','Product','ProductVariant','ProductVariantAttribute','ProductVariantImage','PromoCode','Tag','SalesDailyRollup']
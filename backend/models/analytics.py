@@ -0,0 +1,62 @@
+from sqlalchemy.orm import mapped_column, Mapped
+from sqlalchemy import Enum, Integer, Date, DateTime, DECIMAL, Index
+from sqlalchemy.dialects.postgresql import UUID
+from core.database import Base
+
+from datetime import date, datetime
+from enum import Enum as PyEnum
+from typing import Dict, Any
+
+import uuid
+
+
+class RollupScope(PyEnum):
+    Total = "total"
+    Product = "product"
+    Category = "category"
+
+
+# key used for RollupScope.Total rows
+TOTAL_KEY = uuid.UUID(int=0)
+
+
+class SalesDailyRollup(Base):
+    """
+    Sales per UTC day and currency, kept at three grains: the whole store
+    (scope=total), per product and per category. `key` is the product or
+    category id (TOTAL_KEY for totals). Rows are maintained incrementally by
+    services.analytics.SalesRollupService; never written by hand.
+    """
+    __tablename__ = "sales_daily_rollups"
+    __table_args__ = (
+        Index("ix_sales_daily_rollups_scope_currency_day", "scope", "currency", "day"),
+    )
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    currency: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    scope: Mapped[RollupScope] = mapped_column(Enum(RollupScope), primary_key=True)
+    key: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+
+    revenue: Mapped[DECIMAL] = mapped_column(DECIMAL(18, 8), nullable=False, default=0)
+    order_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    units: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    refunded_revenue: Mapped[DECIMAL] = mapped_column(DECIMAL(18, 8), nullable=False, default=0)
+    refunded_units: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "day": self.day.isoformat(),
+            "currency": self.currency,
+            "scope": self.scope.value,
+            "key": self.key,
+            "revenue": self.revenue,
+            "order_count": self.order_count,
+            "units": self.units,
+            "refunded_revenue": self.refunded_revenue,
+            "refunded_units": self.refunded_units,
+        }
+
+    def __repr__(self):
+        return f"<SalesDailyRollup(day={self.day}, scope={self.scope}, key={self.key}, revenue={self.revenue})>"
@@ -2,19 +2,32 @@ import uuid
 from datetime import datetime
 from typing import Optional, List
 
-from sqlalchemy import ForeignKey, DateTime, Integer, String
+from sqlalchemy import ForeignKey, DateTime, Index, Integer, String, UniqueConstraint, inspect, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from core.database import Base, CHAR_LENGTH  # Assuming this is your declarative base
+from core.utils.loader import loaded
 from models.products import Product, ProductVariant
 
 
 class Cart(Base):
     __tablename__ = "carts"
+    # One guest cart per IP; together with the unique user_id this lets a guest
+    # cart be merged into the user's cart with a single set-based upsert.
+    __table_args__ = (
+        Index(
+            "uq_carts_guest_ip_address",
+            "ip_address",
+            unique=True,
+            postgresql_where=text("user_id IS NULL"),
+        ),
+        # Keyset scans for idle carts (abandoned cart detection)
+        Index("ix_carts_updated_at_id", "updated_at", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True, index=True)
+    user_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True, unique=True, index=True)
     ip_address: Mapped[Optional[str]] = mapped_column(String(CHAR_LENGTH), nullable=True, index=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
@@ -38,6 +51,10 @@ class Cart(Base):
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    # One line per variant per cart; also the conflict target for batch upserts.
+    __table_args__ = (
+        UniqueConstraint("cart_id", "product_variant_id", name="uq_cart_items_cart_variant"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     cart_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("carts.id"), index=True)
@@ -52,7 +69,16 @@ class CartItem(Base):
     product: Mapped["Product"] = relationship("Product")
     product_variant: Mapped["ProductVariant"] = relationship("ProductVariant")
 
+    def _related(self, name: str, loader: str, key):
+        # batch-loaded by the service, else the relationship if it was eagerly loaded
+        value = loaded(loader, key)
+        if value is None and name not in inspect(self).unloaded:
+            value = getattr(self, name)
+        return value
+
     def to_dict(self) -> dict:
+        product = self._related("product", "product", self.product_id)
+        variant = self._related("product_variant", "variant", self.product_variant_id)
         return {
             "id": str(self.id),
             "cart_id": str(self.cart_id),
@@ -61,8 +87,8 @@ class CartItem(Base):
             "quantity": self.quantity,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
-            "product": self.product.to_dict() if self.product else None,
-            "variant": self.product_variant.to_dict() if self.product_variant else None,
+            "product": product.to_dict(nested=True) if product else None,
+            "variant": variant.to_dict() if variant else None,
         }
 
     def __repr__(self):
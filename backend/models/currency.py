@@ -1,5 +1,5 @@
 from sqlalchemy.orm import mapped_column, Mapped
-from sqlalchemy import String, DateTime
+from sqlalchemy import String, DateTime, DECIMAL, ForeignKey
 from core.database import Base, CHAR_LENGTH
 from datetime import datetime
 from typing import Dict, Any
@@ -26,4 +26,23 @@ class Currency(Base):
             "updated_at": self.updated_at.isoformat()
         }
     def __repr__(self):
-        return f"<Currency(code='{self.code}', name='{self.name}', symbol='{self.symbol}')>"
\ No newline at end of file
+        return f"<Currency(code='{self.code}', name='{self.name}', symbol='{self.symbol}')>"
+
+
+class ExchangeRate(Base):
+    """
+    Latest FX rate per currency, quoted as units of the currency per one unit
+    of settings.FX_BASE_CURRENCY. Any cross rate is derived from two of these.
+    """
+    __tablename__ = "exchange_rates"
+
+    currency_id: Mapped[UUID] = mapped_column(ForeignKey("currencies.id", ondelete="CASCADE"), primary_key=True)
+    rate: Mapped[DECIMAL] = mapped_column(DECIMAL(18, 8), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "currency_id": self.currency_id,
+            "rate": float(self.rate),
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
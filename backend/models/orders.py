@@ -1,13 +1,15 @@
 from sqlalchemy.orm import mapped_column, Mapped, relationship
-from sqlalchemy import Enum, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Enum, Integer, String, DateTime, ForeignKey, ForeignKeyConstraint, DECIMAL, Index
 from sqlalchemy.dialects.postgresql import UUID
 
 from datetime import datetime
 from enum import Enum as PyEnum
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from core.database import Base, CHAR_LENGTH
-from models.currency import Currency
+from core.utils.currency import currency_registry
+from core.utils.fields import FieldSet, pick
+from core.utils.loader import loaded
 
 import uuid
 
@@ -22,55 +24,88 @@ class OrderStatus(PyEnum):
 
 class Order(Base):
     __tablename__ = "orders"
+    # Range-partitioned by month on created_at (see core.utils.partitions), so
+    # the partition key is part of the primary key. The indexes match the
+    # keyset order (created_at, id) behind the common filters: "my orders",
+    # admin queues by status, and the unfiltered listing.
+    __table_args__ = (
+        Index("ix_orders_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
-    status: Mapped[OrderStatus] = mapped_column(Enum(OrderStatus), default=OrderStatus.Pending, nullable=False, index=True)
+    user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), nullable=False)
+    status: Mapped[OrderStatus] = mapped_column(Enum(OrderStatus), default=OrderStatus.Pending, nullable=False)
 
     total_amount: Mapped[DECIMAL] = mapped_column(DECIMAL(18, 8), nullable=False)
     currency: Mapped[UUID] = mapped_column(ForeignKey("currencies.id"), nullable=False, index=True)
-    currency_rel: Mapped["Currency"] = relationship("Currency", lazy="joined")
+    # the code redeemed when the order was placed; its use is released on cancel
+    promo_code: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
+    # what the promo code took off; total_amount is the subtotal minus this
+    discount_amount: Mapped[DECIMAL] = mapped_column(DECIMAL(18, 8), nullable=False, default=0, server_default="0")
 
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     items: Mapped[List["OrderItem"]] = relationship(
         "OrderItem", back_populates="order", cascade="all, delete-orphan", lazy="joined"
     )
-    def to_dict(self) -> Dict[str, Any]:
-        return {
+    def to_dict(self, fields: FieldSet = None) -> Dict[str, Any]:
+        return pick(fields, {
             "id": self.id,
             "user_id": self.user_id,
             "status": self.status.value,
             "total_amount": self.total_amount,
-            "currency": self.currency_rel.symbol if self.currency_rel else None,
+            "currency": currency_registry.symbol(self.currency),
+            "promo_code": self.promo_code,
+            "discount_amount": self.discount_amount,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-            "items": [item.to_dict() for item in self.items],
-        }
+            "items": lambda f: [item.to_dict(f) for item in self.items],
+        })
     def __repr__(self):
         return f"<Order(id={self.id}, user_id={self.user_id}, status={self.status}, total={self.currency}{self.total_amount})>"
 
 class OrderItem(Base):
     __tablename__ = "order_items"
+    # Partitioned on the parent order's created_at so an order and its items
+    # always live in the same month and are archived together.
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["order_id", "order_created_at"],
+            ["orders.id", "orders.created_at"],
+            name="fk_order_items_order",
+        ),
+        Index("ix_order_items_order_id_order_created_at", "order_id", "order_created_at"),
+        {"postgresql_partition_by": "RANGE (order_created_at)"},
+    )
 
     id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    order_id: Mapped[UUID] = mapped_column(ForeignKey("orders.id"), nullable=False)
+    order_id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    order_created_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
     order: Mapped["Order"] = relationship("Order", back_populates="items")
     product_id: Mapped[UUID] = mapped_column(ForeignKey("products.id"), nullable=False, index=True)
     quantity: Mapped[int] = mapped_column(Integer, nullable=False)
-    price_per_unit: Mapped[DECIMAL] = mapped_column(DECIMAL(18, 8), nullable=False, index=True)
+    price_per_unit: Mapped[DECIMAL] = mapped_column(DECIMAL(18, 8), nullable=False)
     total_price: Mapped[DECIMAL] = mapped_column(DECIMAL(18, 8), nullable=False)
 
-    def to_dict(self) -> Dict[str, Any]:
-        return {
+    def to_dict(self, fields: FieldSet = None) -> Dict[str, Any]:
+        return pick(fields, {
             "id": self.id,
             "order_id": self.order_id,
             "product_id": self.product_id,
             "quantity": self.quantity,
             "price_per_unit": self.price_per_unit,
             "total_price": self.total_price,
-        }
+            "product": self._product,
+        })
+
+    def _product(self, fields: FieldSet) -> Optional[Dict[str, Any]]:
+        # batch-loaded by OrderService.load_item_products; None when it wasn't
+        product = loaded("product", self.product_id)
+        return product.to_dict(fields, nested=True) if product is not None else None
     def __repr__(self):
         return f"<OrderItem(id={self.id}, product_id={self.product_id}, quantity={self.quantity})>"
 
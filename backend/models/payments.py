@@ -1,11 +1,11 @@
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy import String, ForeignKey, DateTime, Enum, DECIMAL, Text
 from enum import Enum as PyEnum
 from datetime import datetime
 from typing import Optional
 from sqlalchemy.dialects.postgresql import UUID
 from core.database import Base, CHAR_LENGTH
-from models.currency import Currency
+from core.utils.currency import currency_registry
 
 import uuid
 
@@ -43,7 +43,8 @@ class Payment(Base):
     __tablename__ = "payments"
 
     id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    order_id: Mapped[UUID] = mapped_column(ForeignKey("orders.id"), nullable=False, index=True)
+    # No foreign key: orders is partitioned and its primary key is (id, created_at).
+    order_id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), nullable=False, index=True)
     
     user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
 
@@ -52,7 +53,6 @@ class Payment(Base):
 
     amount: Mapped[DECIMAL] = mapped_column(DECIMAL(18, 8), nullable=False, index=True)  # high precision for currency
     currency: Mapped[UUID] = mapped_column(ForeignKey("currencies.id"), nullable=False, index=True)  # ISO 4217 e.g. USD, EUR, JPY
-    currency_rel: Mapped["Currency"] = relationship("Currency", lazy="joined")
 
     transaction_id: Mapped[Optional[str]] = mapped_column(String(CHAR_LENGTH), nullable=True, index=True)  # from payment gateway
 
@@ -79,7 +79,7 @@ class Payment(Base):
             "method": self.method.value if self.method else None,
             "status": self.status.value if self.status else None,
             "amount": float(self.amount) if self.amount is not None else None,
-            "currency": self.currency_rel.symbol if self.currency_rel else None,
+            "currency": currency_registry.symbol(self.currency),
             "transaction_id": self.transaction_id,
             "gateway_response": self.gateway_response,
             "created_at": self.created_at.isoformat() if self.created_at else None,
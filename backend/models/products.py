@@ -1,6 +1,10 @@
 from sqlalchemy.orm import mapped_column, Mapped, relationship
-from sqlalchemy import Enum, Integer, String, DateTime, ForeignKey, Text, DECIMAL, Table, Column
+from sqlalchemy import Enum, Integer, String, DateTime, ForeignKey, Text, DECIMAL, Table, Column, Sequence, Index, inspect
+from sqlalchemy.dialects.postgresql import JSONB
 from core.database import Base, CHAR_LENGTH
+from core.utils.catalog import category_cache
+from core.utils.fields import FieldSet, pick
+from core.utils.loader import loaded
 from sqlalchemy.dialects.postgresql import UUID
 
 import uuid
@@ -18,6 +22,9 @@ product_tags = Table(
     Column("tag_id", ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True, index=True),
 )
 
+# Suffix numbers for variant SKUs (see services.products.SkuAllocator)
+sku_sequence = Sequence("product_variant_sku_seq", metadata=Base.metadata)
+
 # --- Enum for product availability ---
 class AvailabilityStatus(PyEnum):
     IN_STOCK = "In Stock"
@@ -27,6 +34,10 @@ class AvailabilityStatus(PyEnum):
 # --- Product Model ---
 class Product(Base):
     __tablename__ = "products"
+    # Price filters and price sorting read only this index (see services.products.refresh_product_prices)
+    __table_args__ = (
+        Index("ix_products_effective_price_id", "effective_price", "id"),
+    )
 
     id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column(String(CHAR_LENGTH), index=True)
@@ -40,6 +51,13 @@ class Product(Base):
     availability: Mapped[AvailabilityStatus] = mapped_column(Enum(AvailabilityStatus), default=AvailabilityStatus.IN_STOCK, index=True)
 
     rating: Mapped[Optional[float]] = mapped_column(DECIMAL(2, 1), default=0.0)
+
+    # Denormalized from the variants: list price range and the lowest price
+    # actually charged (sale price when set, else base price).
+    min_price: Mapped[Optional[float]] = mapped_column(DECIMAL(10, 2), nullable=True)
+    max_price: Mapped[Optional[float]] = mapped_column(DECIMAL(10, 2), nullable=True)
+    effective_price: Mapped[Optional[float]] = mapped_column(DECIMAL(10, 2), nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -55,28 +73,63 @@ class Product(Base):
     
     variants: Mapped[List["ProductVariant"]] = relationship("ProductVariant", back_populates="product", cascade="all, delete-orphan")
     
-    def to_dict(self) -> Dict[str, Any]:
-        return {
+    def _category_name(self) -> Optional[str]:
+        cached = category_cache.get(self.category_id)
+        if cached is not None:
+            return cached["name"]
+        # not cached yet; only use the relationship if it was eagerly loaded
+        if "category" not in inspect(self).unloaded and self.category:
+            return self.category.name
+        return None
+
+    def to_dict(self, fields: FieldSet = None, nested: bool = False) -> Dict[str, Any]:
+        """
+        nested=True is the form embedded in inventories, carts and orders: its
+        inventories are rendered without their products, which would recurse.
+        """
+        values = {
             "id": self.id,
             "name": self.name,
             "description": self.description,
             "category_id": self.category_id,
-            "category": self.category.name if self.category else None,
-            "tags": [tag.to_dict() for tag in self.tags],
+            "category": self._category_name(),
+            "tags": lambda f: [pick(f, tag.to_dict()) for tag in self.tags],
             "availability": self.availability.value if self.availability else None,
             "rating": float(self.rating) if self.rating else 0.0,
+            "min_price": float(self.min_price) if self.min_price is not None else None,
+            "max_price": float(self.max_price) if self.max_price is not None else None,
+            "effective_price": float(self.effective_price) if self.effective_price is not None else None,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
-            "variants": [v.to_dict() for v in self.variants],
-            "inventories": [inv.to_dict() for inv in self.inventories],
+            "variants": lambda f: [v.to_dict(f) for v in self.variants],
+            "inventories": lambda f: [pick(f, inv.to_dict(nested=nested)) for inv in self.inventories],
         }
+        return pick(fields, values)
 
     def __repr__(self):
         return f"<Product(id={self.id!r}, name={self.name!r}, category={self.category!r})>"
 
+# price_desc sorts by (effective_price DESC NULLS LAST, id DESC). A backward
+# scan of ix_products_effective_price_id yields NULLS FIRST, so that order
+# needs its own index to avoid a full sort.
+Index(
+    "ix_products_effective_price_desc_id",
+    Product.effective_price.desc().nulls_last(),
+    Product.id.desc(),
+)
+
 # --- ProductVariant Model ---
 class ProductVariant(Base):
     __tablename__ = "product_variants"
+    # Containment (@>) lookups on the normalized attributes, e.g. {"color": "red", "size": "m"}
+    __table_args__ = (
+        Index(
+            "ix_product_variants_attribute_map",
+            "attribute_map",
+            postgresql_using="gin",
+            postgresql_ops={"attribute_map": "jsonb_path_ops"},
+        ),
+    )
 
     id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     product_id: Mapped[UUID] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), index=True)
@@ -89,13 +142,15 @@ class ProductVariant(Base):
 
     stock: Mapped[int] = mapped_column(Integer, default=0)
     barcode: Mapped[Optional[str]] = mapped_column(Text, unique=True)
+    # Normalized copy of `attributes` (see services.products.normalize_attributes)
+    attribute_map: Mapped[Optional[Dict[str, str]]] = mapped_column(JSONB, nullable=True)
 
     attributes: Mapped[List["ProductVariantAttribute"]] = relationship("ProductVariantAttribute", back_populates="variant", cascade="all, delete-orphan", lazy="selectin")
     images: Mapped[List["ProductVariantImage"]] = relationship("ProductVariantImage", back_populates="variant", cascade="all, delete-orphan", lazy="selectin")
 
 
-    def to_dict(self):
-        return {
+    def to_dict(self, fields: FieldSet = None):
+        return pick(fields, {
             "id": self.id,
             'name':self.name,
             "product_id": self.product_id,
@@ -104,18 +159,21 @@ class ProductVariant(Base):
             "sku": self.sku,
             "stock": self.stock,
             "barcode": self.barcode,
-            "attributes": [attr.to_dict() for attr in self.attributes],
-            "images": [img.to_dict() for img in self.images],
-        }
+            "attributes": lambda f: [pick(f, attr.to_dict()) for attr in self.attributes],
+            "images": lambda f: [pick(f, img.to_dict()) for img in self.images],
+        })
 
     def __repr__(self):
         return f"<ProductVariant(id={self.id!r}, name={self.name!r}, sku={self.sku!r})>"
 
 class ProductVariantAttribute(Base):
     __tablename__ = "product_variant_attributes"
+    __table_args__ = (
+        Index("ix_product_variant_attributes_name_value", "name", "value"),
+    )
 
     id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    variant_id: Mapped[UUID] = mapped_column(ForeignKey("product_variants.id", ondelete="CASCADE"))
+    variant_id: Mapped[UUID] = mapped_column(ForeignKey("product_variants.id", ondelete="CASCADE"), index=True)
     variant: Mapped["ProductVariant"] = relationship("ProductVariant", back_populates="attributes")
 
     name: Mapped[str] = mapped_column(String(100))  # e.g., Color
@@ -164,14 +222,22 @@ class Inventory(Base):
         viewonly=True,
     )
 
-    def to_dict(self):
-        return {
+    def to_dict(self, nested: bool = False):
+        """nested=True is the form embedded in a nested product: without the products."""
+        values = {
             "id": self.id,
             "name": self.name,
             "location": self.location,
-            "products": [ip.product.to_dict() for ip in self.inventory_products],
+            "products": [
+                product.to_dict(nested=True)
+                for product in (loaded("product", ip.product_id) for ip in self.inventory_products)
+                if product is not None
+            ],
             "product_counts": {ip.product_id: ip.quantity for ip in self.inventory_products}
         }
+        if nested:
+            del values["products"]
+        return values
 
 class InventoryProduct(Base):
     __tablename__ = "inventory_products"
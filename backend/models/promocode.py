@@ -1,7 +1,8 @@
 from sqlalchemy.orm import mapped_column, Mapped
-from sqlalchemy import String, DateTime, Boolean,DECIMAL
+from sqlalchemy import String, DateTime, Boolean,DECIMAL, Integer
 from core.database import Base
 from datetime import datetime
+from typing import Optional
 from sqlalchemy.dialects.postgresql import UUID
 
 import uuid
@@ -15,6 +16,9 @@ class PromoCode(Base):
     active: Mapped[bool] = mapped_column(Boolean, default=True, index=True)
     valid_from: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
     valid_until: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    max_uses: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # None = unlimited
+    uses: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    min_subtotal: Mapped[Optional[float]] = mapped_column(DECIMAL(10, 2), nullable=True)
 
     def to_dict(self):
         return {
@@ -23,5 +27,8 @@ class PromoCode(Base):
             "discount_percent": float(self.discount_percent),
             "active": self.active,
             "valid_from": self.valid_from.isoformat() if self.valid_from else None,
-            "valid_until": self.valid_until.isoformat() if self.valid_until else None
+            "valid_until": self.valid_until.isoformat() if self.valid_until else None,
+            "max_uses": self.max_uses,
+            "uses": self.uses,
+            "min_subtotal": float(self.min_subtotal) if self.min_subtotal is not None else None,
         }
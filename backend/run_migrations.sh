@@ -18,6 +18,21 @@ alembic init -t async alembic # for asynchronous support
 echo "Step 3.1: Running alembic_env_py_generator to update alembic/env.py..."
 python3 -m alembic_env_py_generator
 
+# Step 3.2: Convert existing heap orders/order_items tables to monthly partitions
+# (autogenerate can't turn a table into a partitioned one; no-op once converted)
+echo "Step 3.2: Converting orders tables to partitioned layout if needed..."
+python3 -m core.utils.partitions migrate
+
+# Step 3.3: Fold duplicate carts/cart lines together so the unique constraints
+# on carts.user_id, guest carts per IP and cart lines per variant can be added
+echo "Step 3.3: Merging duplicate carts if needed..."
+python3 -m core.utils.cart_dedupe migrate
+
+# Step 3.4: Create standalone sequences (variant SKU numbers), which
+# autogenerate doesn't emit
+echo "Step 3.4: Creating sequences if needed..."
+python3 -m core.utils.sequences migrate
+
 # Step 4: Generate a new migration (with an initial migration message)
 echo "Step 4: Generating initial migration..."
 alembic revision --autogenerate -m "Initial tables"
@@ -1,8 +1,9 @@
 from uuid import UUID
 from datetime import datetime
+from enum import Enum
 from typing import Optional, List
 from .products import ProductRead, ProductVariantRead
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
 
 # ----------- CartItem Schemas -----------
@@ -29,6 +30,31 @@ class CartItemRead(CartItemBase):
         from_attributes = True
 
 
+class CartItemOperationType(str, Enum):
+    Add = "add"          # increase quantity (insert the line if missing)
+    Update = "update"    # set quantity; 0 removes the line
+    Remove = "remove"
+
+
+class CartItemOperation(BaseModel):
+    op: CartItemOperationType
+    product_variant_id: UUID
+    product_id: Optional[UUID] = None
+    quantity: int = Field(default=0, ge=0)
+
+    @model_validator(mode="after")
+    def check_fields(self):
+        if self.op != CartItemOperationType.Remove and self.product_id is None:
+            raise ValueError(f"product_id is required for '{self.op.value}' operations")
+        if self.op == CartItemOperationType.Add and self.quantity < 1:
+            raise ValueError("quantity must be at least 1 for 'add' operations")
+        return self
+
+
+class CartBatchUpdate(BaseModel):
+    operations: List[CartItemOperation] = Field(..., min_length=1, max_length=500)
+
+
 # ----------- Cart Schemas -----------
 
 class CartBase(BaseModel):
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 from uuid import UUID
 from datetime import datetime
 
@@ -23,3 +23,12 @@ class CurrencyRead(CurrencyBase):
 
     class Config:
         from_attributes = True
+
+class ExchangeRatesUpdate(BaseModel):
+    # currency id -> units of that currency per one FX_BASE_CURRENCY
+    rates: Dict[UUID, float]
+
+class CurrencyConversion(BaseModel):
+    amounts: List[float] = Field(..., min_length=1)
+    from_currency: str  # ISO code or id
+    to_currency: str
@@ -15,6 +15,7 @@ class OrderStatus(str, Enum):
 
 
 class OrderItemSchema(BaseModel):
+    id: Optional[UUID] = None  # existing item to update; matched by product_id when omitted
     product_id: str
     quantity: int
     price_per_unit: float
@@ -29,6 +30,7 @@ class OrderSchema(BaseModel):
     status: OrderStatus
     total_amount: float
     currency: str = Field(default="£")
+    promo_code: Optional[str] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     items: List[OrderItemSchema] = []
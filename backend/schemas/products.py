@@ -1,7 +1,7 @@
 from datetime import datetime
 from enum import Enum as PyEnum
 from typing import List, Optional
-from pydantic import BaseModel, Field, condecimal
+from pydantic import BaseModel, Field, condecimal, model_validator
 from schemas.category import CategoryRead
 from schemas.tag import TagRead
 from schemas.inventory import InventoryRead
@@ -85,6 +85,28 @@ class ProductBase(BaseModel):
 class ProductCreate(ProductBase):
     variants: List[ProductVariantCreate]
 
+class ProductImport(BaseModel):
+    """
+    One product of a bulk catalog import. Category and tags may be given by id
+    or by name, since supplier files rarely know our ids.
+    """
+    name: str = Field(..., max_length=100)
+    description: Optional[str] = None
+    availability: AvailabilityStatus = AvailabilityStatus.IN_STOCK
+    rating: Optional[condecimal(max_digits=2, decimal_places=1)] = 0.0
+    category_id: Optional[UUID] = None
+    category: Optional[str] = None
+    tag_ids: List[UUID] = []
+    tags: List[str] = []
+    inventory_ids: List[UUID] = []
+    variants: List[ProductVariantCreate] = Field(..., min_length=1)
+
+    @model_validator(mode="after")
+    def check_category(self):
+        if self.category_id is None and not self.category:
+            raise ValueError("category_id or category is required")
+        return self
+
 class ProductRead(ProductBase):
     id: UUID
     created_at: datetime
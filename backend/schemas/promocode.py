@@ -1,4 +1,6 @@
 from datetime import datetime
+from decimal import Decimal
+from typing import Optional
 
 from pydantic import BaseModel, Field, condecimal
 from uuid import UUID
@@ -9,6 +11,8 @@ class PromoCodeBase(BaseModel):
     active: bool = True
     valid_from: datetime
     valid_until: datetime
+    max_uses: Optional[int] = Field(default=None, ge=1)
+    min_subtotal: Optional[condecimal(max_digits=10, decimal_places=2)] = None
 
 class PromoCodeCreate(PromoCodeBase):
     pass
@@ -18,3 +22,9 @@ class PromoCodeRead(PromoCodeBase):
 
     class Config:
         from_attributes = True
+
+class PromoCodeValidate(BaseModel):
+    code: str = Field(..., max_length=50)
+    # Either a cart to read the subtotal from, or the subtotal itself
+    cart_id: Optional[UUID] = None
+    subtotal: Optional[Decimal] = Field(default=None, ge=0)
@@ -116,6 +116,8 @@ class UserUpdate(BaseModel):
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
+    # the anonymous cart built before logging in, merged into the user's cart
+    guest_cart_id: Optional[UUID] = None
 
 class PasswordReset(BaseModel):
     email: EmailStr
@@ -0,0 +1,211 @@
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Dict, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import Date, and_, cast, delete, func, literal, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.analytics import SalesDailyRollup, RollupScope, TOTAL_KEY
+from models.orders import Order, OrderItem, OrderStatus
+from models.products import Product
+from schemas.orders import UUID
+
+# Orders in these states don't count as sales; Returned orders count as sales
+# and additionally as refunds, so gross revenue never moves backwards in time.
+NOT_SALES = {OrderStatus.Cancelled, OrderStatus.Failed}
+REFUNDS = {OrderStatus.Returned}
+
+COUNTERS = ("revenue", "order_count", "units", "refunded_revenue", "refunded_units")
+
+
+def _status(value) -> OrderStatus:
+    return OrderStatus(getattr(value, "value", value))
+
+
+class SalesRollupService:
+    """
+    Maintains sales_daily_rollups incrementally. Every change to an order is
+    applied as a signed delta with one INSERT ... SELECT ... ON CONFLICT DO
+    UPDATE that adds to the product, category and total rows at once, inside
+    the caller's transaction (nothing here commits).
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def _upsert(self, conditions: List[Any], sign: int, refund: bool):
+        orders = Order.__table__
+        items = OrderItem.__table__
+        products = Product.__table__
+        rollups = SalesDailyRollup.__table__
+
+        day = cast(orders.c.created_at, Date)
+        now = literal(datetime.utcnow(), type_=rollups.c.updated_at.type)
+        zero = literal(0)
+
+        def counters(revenue, order_count, units):
+            if refund:
+                return [zero, zero, zero, literal(sign) * revenue, literal(sign) * units]
+            return [literal(sign) * revenue, literal(sign) * order_count, literal(sign) * units, zero, zero]
+
+        order_items = orders.join(
+            items,
+            and_(items.c.order_id == orders.c.id, items.c.order_created_at == orders.c.created_at),
+        )
+        by_product = (
+            select(
+                day,
+                orders.c.currency,
+                literal(RollupScope.Product, type_=rollups.c.scope.type),
+                items.c.product_id,
+                *counters(func.sum(items.c.total_price), func.count(orders.c.id.distinct()), func.sum(items.c.quantity)),
+                now,
+            )
+            .select_from(order_items)
+            .where(*conditions)
+            .group_by(day, orders.c.currency, items.c.product_id)
+        )
+        by_category = (
+            select(
+                day,
+                orders.c.currency,
+                literal(RollupScope.Category, type_=rollups.c.scope.type),
+                products.c.category_id,
+                *counters(func.sum(items.c.total_price), func.count(orders.c.id.distinct()), func.sum(items.c.quantity)),
+                now,
+            )
+            .select_from(order_items.join(products, products.c.id == items.c.product_id))
+            .where(*conditions, products.c.category_id.is_not(None))
+            .group_by(day, orders.c.currency, products.c.category_id)
+        )
+        order_units = (
+            select(func.coalesce(func.sum(items.c.quantity), 0))
+            .where(items.c.order_id == orders.c.id, items.c.order_created_at == orders.c.created_at)
+            .scalar_subquery()
+        )
+        total = (
+            select(
+                day,
+                orders.c.currency,
+                literal(RollupScope.Total, type_=rollups.c.scope.type),
+                literal(TOTAL_KEY, type_=rollups.c.key.type),
+                *counters(func.sum(orders.c.total_amount), func.count(orders.c.id), func.sum(order_units)),
+                now,
+            )
+            .where(*conditions)
+            .group_by(day, orders.c.currency)
+        )
+
+        stmt = pg_insert(rollups).from_select(
+            ["day", "currency", "scope", "key", *COUNTERS, "updated_at"],
+            union_all(by_product, by_category, total),
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=[rollups.c.day, rollups.c.currency, rollups.c.scope, rollups.c.key],
+            set_={
+                **{name: rollups.c[name] + stmt.excluded[name] for name in COUNTERS},
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+
+    async def record(self, order_id: UUID, created_at: datetime, status, sign: int = 1) -> None:
+        """
+        Add (sign=1) or take back (sign=-1) an order's contribution as of `status`,
+        reading its current rows. Call with -1 before changing an order's items,
+        totals or currency and with +1 afterwards.
+        """
+        status = _status(status)
+        conditions = [Order.__table__.c.id == order_id, Order.__table__.c.created_at == created_at]
+        if status not in NOT_SALES:
+            await self.db.execute(self._upsert(conditions, sign, refund=False))
+        if status in REFUNDS:
+            await self.db.execute(self._upsert(conditions, sign, refund=True))
+
+    async def record_status_change(self, order_id: UUID, created_at: datetime, old_status, new_status) -> None:
+        """Only the difference between the two states is applied."""
+        old_status, new_status = _status(old_status), _status(new_status)
+        if old_status == new_status:
+            return
+        conditions = [Order.__table__.c.id == order_id, Order.__table__.c.created_at == created_at]
+        sales = (new_status not in NOT_SALES) - (old_status not in NOT_SALES)
+        if sales:
+            await self.db.execute(self._upsert(conditions, sales, refund=False))
+        refunds = (new_status in REFUNDS) - (old_status in REFUNDS)
+        if refunds:
+            await self.db.execute(self._upsert(conditions, refunds, refund=True))
+
+    async def rebuild(self, start: date, end: date) -> None:
+        """
+        Recompute the rollups for [start, end] from orders/order_items, e.g. to
+        backfill history. Only the partitions in the range are scanned.
+        """
+        orders = Order.__table__
+        window = [
+            orders.c.created_at >= datetime.combine(start, datetime.min.time()),
+            orders.c.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time()),
+        ]
+        try:
+            await self.db.execute(
+                delete(SalesDailyRollup).where(SalesDailyRollup.day >= start, SalesDailyRollup.day <= end)
+            )
+            await self.db.execute(self._upsert([*window, orders.c.status.not_in(NOT_SALES)], 1, refund=False))
+            await self.db.execute(self._upsert([*window, orders.c.status.in_(REFUNDS)], 1, refund=True))
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            raise e
+
+
+class SalesReportService:
+    """Dashboard reads; every query is an index range scan over the rollups."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def _range(self, scope: RollupScope, start: date, end: date, currency: Optional[UUID]):
+        query = select(SalesDailyRollup).where(
+            SalesDailyRollup.scope == scope,
+            SalesDailyRollup.day >= start,
+            SalesDailyRollup.day <= end,
+        )
+        if currency:
+            query = query.where(SalesDailyRollup.currency == currency)
+        return query
+
+    async def daily(
+        self,
+        start: date,
+        end: date,
+        currency: Optional[UUID] = None,
+        scope: RollupScope = RollupScope.Total,
+        key: Optional[UUID] = None,
+    ) -> List[Dict[str, Any]]:
+        query = self._range(scope, start, end, currency)
+        if scope == RollupScope.Total:
+            query = query.where(SalesDailyRollup.key == TOTAL_KEY)
+        elif key:
+            query = query.where(SalesDailyRollup.key == key)
+        query = query.order_by(SalesDailyRollup.day, SalesDailyRollup.currency, SalesDailyRollup.key)
+        result = await self.db.execute(query)
+        return [row.to_dict() for row in result.scalars().all()]
+
+    async def top(
+        self,
+        scope: RollupScope,
+        start: date,
+        end: date,
+        currency: Optional[UUID] = None,
+        order_by: str = "revenue",
+        limit: int = 10,
+    ) -> List[Dict[str, Any]]:
+        """Products or categories ranked by a counter summed over the range."""
+        if order_by not in COUNTERS:
+            raise ValueError(f"order_by must be one of {', '.join(COUNTERS)}")
+        ranged = self._range(scope, start, end, currency).subquery()
+        query = (
+            select(ranged.c.key, ranged.c.currency, *[func.sum(ranged.c[name]).label(name) for name in COUNTERS])
+            .group_by(ranged.c.key, ranged.c.currency)
+            .order_by(func.sum(ranged.c[order_by]).desc())
+            .limit(limit)
+        )
+        result = await self.db.execute(query)
+        return [dict(row._mapping) for row in result.all()]
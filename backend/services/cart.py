@@ -1,12 +1,226 @@
-from typing import Optional
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import and_, delete, func, literal, or_, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 from fastapi import HTTPException
+from core.config import settings, logger
+from core.database import AsyncSessionDB, engine_db
+from core.utils.redis import redis_client
+from core.utils.loader import loaded, loaders
+from core.utils.metrics import CACHE_REQUESTS
+from core.utils.rate_limit import AsyncRateLimiter
+from core.utils.messages.email import send_email
 from models.cart import Cart, CartItem
-from schemas.cart import CartCreate, CartItemCreate
+from models.products import Product, ProductVariant
+from models.user import User
+from api.v1.websockets.analytics import notify_cart_abandonment_batch
+from schemas.cart import CartCreate, CartItemCreate, CartBatchUpdate, CartItemOperationType
 from services.user import AuthService
+from services.email import general_context
+
+CENTS = Decimal("0.01")
+
+
+def _money(value) -> Decimal:
+    return Decimal(str(value or 0)).quantize(CENTS)
+
+
+# Applies line quantity deltas to a stored summary in one atomic step.
+# KEYS: summary, generation. ARGV: version before the write, version after
+# it, new generation, ttl, deltas as JSON [{product_variant_id, quantity,
+# line?}]. `line` carries the snapshot for a line the summary may not have.
+# The summary is patched only when it was built at exactly the version the
+# write started from; otherwise it is dropped and rebuilt on the next read.
+APPLY_DELTAS = """
+local raw = redis.call('GET', KEYS[1])
+redis.call('SETEX', KEYS[2], ARGV[4], ARGV[3])
+if not raw then
+    return 0
+end
+local summary = cjson.decode(raw)
+if summary.version ~= ARGV[2] then
+    if summary.version ~= ARGV[1] then
+        redis.call('DEL', KEYS[1])
+        return 0
+    end
+    local subtotal = math.floor(summary.subtotal * 100 + 0.5)
+    for _, delta in ipairs(cjson.decode(ARGV[5])) do
+        local line = summary.lines[delta.product_variant_id]
+        if line == nil then
+            if delta.line == nil then
+                redis.call('DEL', KEYS[1])
+                return 0
+            end
+            line = delta.line
+            line.quantity = 0
+        end
+        local unit = math.floor(line.unit_price * 100 + 0.5)
+        local quantity = math.max(line.quantity + delta.quantity, 0)
+        subtotal = subtotal + unit * (quantity - line.quantity)
+        summary.item_count = summary.item_count + quantity - line.quantity
+        if quantity == 0 then
+            summary.lines[delta.product_variant_id] = nil
+        else
+            line.quantity = quantity
+            line.line_total = unit * quantity / 100
+            summary.lines[delta.product_variant_id] = line
+        end
+    end
+    summary.subtotal = subtotal / 100
+    summary.version = ARGV[2]
+end
+summary.generation = ARGV[3]
+redis.call('SETEX', KEYS[1], ARGV[4], cjson.encode(summary))
+return 1
+"""
+
+
+class CartStore:
+    """
+    Redis-backed cart summaries: one entry per cart holding its lines with a
+    price snapshot and running totals.
+
+    The database stays the source of truth. CartService commits to Postgres
+    first; line writes (add_item, remove_item, clear_cart) then apply their
+    quantity changes to the cached summary with one Lua script, and other
+    writes invalidate it so the next read rebuilds it with one query. A cart
+    view is therefore two small Redis reads instead of a join that
+    serializes every product and variant. Price snapshots are refreshed
+    whenever the entry expires (CART_STORE_TTL) or is rebuilt.
+
+    Each summary records the cart's version (carts.updated_at, read with its
+    rows) and each cart has a generation token, replaced on every write.
+    Line writes lock the cart row, so versions form a chain, and a delta is
+    only applied to a summary at the version its write started from; one
+    that is behind is dropped. A rebuild records the generation it started
+    from, and get() ignores an entry whose generation is no longer current,
+    so a summary built from rows read before a concurrent write committed is
+    never served.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(cart_id: UUID) -> str:
+        return f"cart_summary:{cart_id}"
+
+    @staticmethod
+    def _generation_key(cart_id: UUID) -> str:
+        return f"cart_summary_gen:{cart_id}"
+
+    async def generation(self, cart_id: UUID) -> Optional[str]:
+        """
+        The current generation; read it before building a summary to put().
+        None when there is none yet (or Redis is unavailable): any later
+        invalidation sets one, so an entry stored under None still goes stale.
+        """
+        if not settings.CART_STORE_ENABLED:
+            return None
+        try:
+            return await self._current_generation(cart_id)
+        except Exception as e:
+            logger.warning(f"Cart store read failed for {cart_id}: {e}")
+            return None
+
+    async def _current_generation(self, cart_id: UUID) -> Optional[str]:
+        raw = await redis_client.get(self._generation_key(cart_id))
+        return raw.decode() if isinstance(raw, bytes) else raw
+
+    async def get(self, cart_id: UUID) -> Optional[dict]:
+        if not settings.CART_STORE_ENABLED:
+            return None
+        try:
+            raw = await redis_client.get(self._key(cart_id))
+            summary = json.loads(raw) if raw else None
+            if summary is not None and summary.get("generation") != await self._current_generation(cart_id):
+                summary = None  # built before the latest write
+        except Exception as e:
+            logger.warning(f"Cart store read failed for {cart_id}: {e}")
+            return None
+        CACHE_REQUESTS.labels("cart_summary", "hit" if summary else "miss").inc()
+        return summary
+
+    async def put(self, cart_id: UUID, summary: dict, generation: Optional[str]) -> None:
+        if not settings.CART_STORE_ENABLED:
+            return
+        try:
+            summary["generation"] = generation
+            await redis_client.setex(self._key(cart_id), self.ttl, json.dumps(summary))
+        except Exception as e:
+            logger.warning(f"Cart store write failed for {cart_id}: {e}")
+
+    async def invalidate(self, cart_id: UUID) -> None:
+        if not settings.CART_STORE_ENABLED:
+            return
+        try:
+            # the new generation first, so a rebuild racing this write can't be served
+            await redis_client.setex(self._generation_key(cart_id), self.ttl, uuid.uuid4().hex)
+            await redis_client.delete(self._key(cart_id))
+        except Exception as e:
+            logger.warning(f"Cart store invalidation failed for {cart_id}: {e}")
+
+    async def apply(self, cart_id: UUID, before: datetime, after: datetime, deltas: List[dict]) -> None:
+        """
+        Apply the line quantity deltas of a write that moved the cart from
+        version `before` to `after`; see APPLY_DELTAS.
+        """
+        if not settings.CART_STORE_ENABLED:
+            return
+        if before is None:
+            # the cart has no row to version it (e.g. it was deleted)
+            return await self.invalidate(cart_id)
+        try:
+            await redis_client.eval(
+                APPLY_DELTAS, 2, self._key(cart_id), self._generation_key(cart_id),
+                self.version(before), self.version(after), uuid.uuid4().hex, self.ttl, json.dumps(deltas),
+            )
+        except Exception as e:
+            logger.error(f"Cart store update failed for {cart_id}, invalidating: {e}")
+            await self.invalidate(cart_id)
+
+    @staticmethod
+    def version(updated_at: Optional[datetime]) -> Optional[str]:
+        return updated_at.isoformat() if updated_at else None
+
+    @staticmethod
+    def set_line(summary: dict, line: dict) -> None:
+        """Add or replace a line in a summary being built, keeping its totals consistent."""
+        lines = summary["lines"]
+        previous = lines.get(line["product_variant_id"])
+        line["line_total"] = float(_money(line["unit_price"]) * line["quantity"])
+        subtotal = _money(summary["subtotal"]) + _money(line["line_total"])
+        item_count = summary["item_count"] + line["quantity"]
+        if previous:
+            subtotal -= _money(previous["line_total"])
+            item_count -= previous["quantity"]
+        lines[line["product_variant_id"]] = line
+        summary["subtotal"] = float(subtotal)
+        summary["item_count"] = item_count
+
+    @staticmethod
+    def clear(summary: dict) -> None:
+        summary["lines"] = {}
+        summary["subtotal"] = 0.0
+        summary["item_count"] = 0
+
+    @staticmethod
+    def to_response(summary: dict) -> dict:
+        data = {k: v for k, v in summary.items() if k not in ("lines", "generation", "version")}
+        data["items"] = list(summary["lines"].values())
+        return data
+
+
+cart_store = CartStore(ttl=settings.CART_STORE_TTL)
 
 class CartService:
     def __init__(self, db: AsyncSession):
@@ -15,15 +229,128 @@ class CartService:
     async def get_by_id(self, cart_id: UUID) -> Optional[Cart]:
         result = await self.db.execute(
             select(Cart)
-            .options(
-                joinedload(Cart.items)
-                .joinedload(CartItem.product_variant),
-                joinedload(Cart.items)
-                .joinedload(CartItem.product)
+            .options(joinedload(Cart.items))
+            .where(Cart.id == cart_id)
+        )
+        cart = result.unique().scalar_one_or_none()
+        if cart:
+            await self.load_item_details(cart.items)
+        return cart
+
+    async def load_item_details(self, items: List[CartItem]) -> None:
+        """
+        Batch-load the products and variants CartItem.to_dict() renders: one
+        query each for the whole cart instead of one per line.
+        """
+        batch = loaders(self.db)
+        await batch.load_many("product", (item.product_id for item in items))
+        await batch.load_many("variant", (item.product_variant_id for item in items))
+
+    @staticmethod
+    def products_version():
+        """
+        updated_at of the newest product the cart's lines embed, correlated to
+        Cart for row_version(). Variant writes bump their product's updated_at,
+        so this also covers the embedded variants.
+        """
+        return (
+            select(func.max(Product.updated_at))
+            .select_from(CartItem)
+            .join(Product, Product.id == CartItem.product_id)
+            .where(CartItem.cart_id == Cart.id)
+            .scalar_subquery()
+        )
+
+    @staticmethod
+    def product_versions(cart: Cart) -> List[Tuple[UUID, datetime]]:
+        """(id, updated_at) of the products load_item_details() loaded for the cart."""
+        products = {item.product_id: loaded("product", item.product_id) for item in cart.items}
+        return [(product_id, product.updated_at) for product_id, product in products.items() if product is not None]
+
+    async def get_summary(self, cart_id: UUID) -> Optional[dict]:
+        """Lightweight cart view: lines with price snapshots and totals."""
+        summary = await cart_store.get(cart_id)
+        if summary is None:
+            generation = await cart_store.generation(cart_id)
+            summary = await self._build_summary(cart_id)
+            if summary is None:
+                return None
+            await cart_store.put(cart_id, summary, generation)
+        return CartStore.to_response(summary)
+
+    async def _build_summary(self, cart_id: UUID) -> Optional[dict]:
+        result = await self.db.execute(
+            select(
+                Cart.id.label("cart_id"),
+                Cart.user_id,
+                Cart.ip_address,
+                Cart.updated_at.label("cart_updated_at"),
+                CartItem.id,
+                CartItem.product_id,
+                CartItem.product_variant_id,
+                CartItem.quantity,
+                Product.name.label("product_name"),
+                ProductVariant.name.label("variant_name"),
+                ProductVariant.sku,
+                ProductVariant.base_price,
+                ProductVariant.sale_price,
             )
+            .outerjoin(CartItem, CartItem.cart_id == Cart.id)
+            .outerjoin(ProductVariant, ProductVariant.id == CartItem.product_variant_id)
+            .outerjoin(Product, Product.id == CartItem.product_id)
             .where(Cart.id == cart_id)
         )
-        return result.scalar_one_or_none()
+        rows = result.all()
+        if not rows:
+            return None
+        first = rows[0]
+        summary = {
+            "id": str(first.cart_id),
+            "user_id": str(first.user_id) if first.user_id else None,
+            "ip_address": first.ip_address,
+            # read with the rows, so it is the version they were at
+            "version": CartStore.version(first.cart_updated_at),
+        }
+        CartStore.clear(summary)
+        for row in rows:
+            if row.id is not None:
+                CartStore.set_line(summary, self._line_from_row(row))
+        return summary
+
+    @staticmethod
+    def _line_from_row(row) -> dict:
+        unit_price = row.sale_price if row.sale_price is not None else row.base_price
+        return {
+            "id": str(row.id),
+            "product_id": str(row.product_id),
+            "product_variant_id": str(row.product_variant_id),
+            "product_name": row.product_name,
+            "variant_name": row.variant_name,
+            "sku": row.sku,
+            "quantity": row.quantity,
+            "unit_price": float(_money(unit_price)),
+        }
+
+    async def _line_snapshot(self, item: CartItem) -> Optional[dict]:
+        """The summary line for `item` (quantity 0), for adding it to a cached summary."""
+        result = await self.db.execute(
+            select(
+                CartItem.id,
+                CartItem.product_id,
+                CartItem.product_variant_id,
+                literal(0).label("quantity"),
+                Product.name.label("product_name"),
+                ProductVariant.name.label("variant_name"),
+                ProductVariant.sku,
+                ProductVariant.base_price,
+                ProductVariant.sale_price,
+            )
+            .join(ProductVariant, ProductVariant.id == CartItem.product_variant_id)
+            .join(Product, Product.id == CartItem.product_id)
+            .where(CartItem.id == item.id)
+        )
+        row = result.one_or_none()
+        return self._line_from_row(row) if row is not None else None
 
     async def get_by_user_or_ip(self, user_id: Optional[UUID], ip_address: Optional[str]) -> Optional[Cart]:
         stmt = select(Cart)
@@ -40,24 +367,61 @@ class CartService:
 
         stmt = stmt.options(joinedload(Cart.items))
         result = await self.db.execute(stmt)
-        return result.scalar_one_or_none()
+        cart = result.unique().scalar_one_or_none()
+        if cart:
+            await self.load_item_details(cart.items)
+        return cart
 
     async def create(self, cart_in: CartCreate) -> Cart:
+        """A new cart, or the existing one when this user (or guest IP) already has a cart."""
         auth_service = AuthService(self.db)
         if cart_in.user_id:
             user = await auth_service._get_user_by_id(cart_in.user_id)
             if not user:
                 raise HTTPException(status_code=404, detail="User with user_id not found")
+        existing = await self._existing_cart_id(cart_in.user_id, cart_in.ip_address)
+        if existing is not None:
+            return await self.get_by_id(existing)
         cart = Cart(user_id=cart_in.user_id, ip_address=cart_in.ip_address)
         self.db.add(cart)
         try:
             await self.db.commit()
             await self.db.refresh(cart)
             return cart
+        except IntegrityError:
+            # created concurrently by another request for the same user or IP
+            await self.db.rollback()
+            existing = await self._existing_cart_id(cart_in.user_id, cart_in.ip_address)
+            if existing is None:
+                raise
+            return await self.get_by_id(existing)
         except Exception as e:
             await self.db.rollback()
             raise e
 
+    async def _existing_cart_id(self, user_id: Optional[UUID], ip_address: Optional[str]) -> Optional[UUID]:
+        """The cart the unique indexes allow for this user, or for this guest IP."""
+        if user_id:
+            condition = Cart.user_id == user_id
+        elif ip_address:
+            condition = and_(Cart.ip_address == ip_address, Cart.user_id.is_(None))
+        else:
+            return None
+        result = await self.db.execute(select(Cart.id).where(condition))
+        return result.scalar_one_or_none()
+
+    async def _touch(self, cart_id: UUID) -> Tuple[Optional[datetime], datetime]:
+        """
+        Lock the cart row and bump its updated_at, before writing its lines.
+        Item writes don't update the parent row on their own; abandonment
+        detection relies on it, and the cart store on the (before, after)
+        versions this returns.
+        """
+        result = await self.db.execute(select(Cart.updated_at).where(Cart.id == cart_id).with_for_update())
+        before, after = result.scalar_one_or_none(), datetime.utcnow()
+        await self.db.execute(update(Cart).where(Cart.id == cart_id).values(updated_at=after))
+        return before, after
+
     async def add_item(self, cart_id: UUID, item_in: CartItemCreate) -> CartItem:
         # Check if item already exists in the cart
         result = await self.db.execute(
@@ -69,51 +433,240 @@ class CartService:
         existing_item = result.scalar_one_or_none()
 
         try:
+            before, after = await self._touch(cart_id)
             if existing_item:
-                existing_item.quantity += item_in.quantity
+                # an increment in SQL, so concurrent adds to the line both count
+                existing_item.quantity = CartItem.quantity + item_in.quantity
+                item = existing_item
+            else:
+                # If item doesn't exist, create a new one
+                item = CartItem(
+                    cart_id=cart_id,
+                    product_id=item_in.product_id,
+                    product_variant_id=item_in.product_variant_id,
+                    quantity=item_in.quantity
+                )
+                self.db.add(item)
+            await self.db.commit()
+            await self.db.refresh(item)
+        except Exception as e:
+            await self.db.rollback()
+            raise e
+
+        delta = {"product_variant_id": str(item.product_variant_id), "quantity": item_in.quantity}
+        line = await self._line_snapshot(item) if existing_item is None else None
+        if line is not None:
+            delta["line"] = line
+        await cart_store.apply(cart_id, before, after, [delta])
+        await self.load_item_details([item])
+        return item
+
+    async def apply_batch(self, cart_id: UUID, batch: CartBatchUpdate) -> Optional[dict]:
+        """
+        Apply many add/update/remove operations in one transaction.
+
+        Operations are first folded per variant (in request order) so that each
+        line is touched at most once, then written with at most one multi-row
+        upsert for increments, one for absolute quantities and one DELETE.
+        Returns the new cart summary, or None if the cart does not exist.
+        """
+        increments, absolutes, removals = self._fold_operations(batch)
+        now = datetime.utcnow()
+        table = CartItem.__table__
+
+        try:
+            touched = await self.db.execute(
+                update(Cart).where(Cart.id == cart_id).values(updated_at=now).returning(Cart.id)
+            )
+            if touched.scalar_one_or_none() is None:
+                await self.db.rollback()
+                return None
+
+            for rows, accumulate in ((increments, True), (absolutes, False)):
+                if not rows:
+                    continue
+                stmt = pg_insert(table).values([
+                    {
+                        "id": uuid.uuid4(),
+                        "cart_id": cart_id,
+                        "product_id": product_id,
+                        "product_variant_id": variant_id,
+                        "quantity": quantity,
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                    for variant_id, (product_id, quantity) in rows.items()
+                ])
+                quantity = table.c.quantity + stmt.excluded.quantity if accumulate else stmt.excluded.quantity
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[table.c.cart_id, table.c.product_variant_id],
+                    set_={"quantity": quantity, "updated_at": stmt.excluded.updated_at},
+                )
+                await self.db.execute(stmt)
+
+            if removals:
+                await self.db.execute(
+                    delete(CartItem).where(
+                        CartItem.cart_id == cart_id,
+                        CartItem.product_variant_id.in_(removals),
+                    )
+                )
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            raise e
+
+        await cart_store.invalidate(cart_id)
+        return await self.get_summary(cart_id)
+
+    @staticmethod
+    def _fold_operations(
+        batch: CartBatchUpdate,
+    ) -> Tuple[Dict[UUID, Tuple[UUID, int]], Dict[UUID, Tuple[UUID, int]], List[UUID]]:
+        # variant_id -> (kind, product_id, quantity); kind is "add", "set" or "remove"
+        folded: Dict[UUID, Tuple[str, Optional[UUID], int]] = {}
+        for op in batch.operations:
+            kind, product_id, quantity = folded.get(op.product_variant_id, (None, None, 0))
+            product_id = op.product_id or product_id
+            if op.op == CartItemOperationType.Remove or (
+                op.op == CartItemOperationType.Update and op.quantity == 0
+            ):
+                folded[op.product_variant_id] = ("remove", product_id, 0)
+            elif op.op == CartItemOperationType.Update:
+                folded[op.product_variant_id] = ("set", product_id, op.quantity)
+            elif kind == "add":
+                folded[op.product_variant_id] = ("add", product_id, quantity + op.quantity)
+            elif kind == "set":
+                folded[op.product_variant_id] = ("set", product_id, quantity + op.quantity)
+            elif kind == "remove":
+                # The line is gone at this point, so adding re-creates it with exactly this quantity.
+                folded[op.product_variant_id] = ("set", product_id, op.quantity)
+            else:
+                folded[op.product_variant_id] = ("add", product_id, op.quantity)
+
+        increments = {v: (p, q) for v, (k, p, q) in folded.items() if k == "add"}
+        absolutes = {v: (p, q) for v, (k, p, q) in folded.items() if k == "set"}
+        removals = [v for v, (k, _, _) in folded.items() if k == "remove"]
+        return increments, absolutes, removals
+
+    async def merge_guest_cart(self, user_id: UUID, ip_address: str, guest_cart_id: UUID) -> Optional[UUID]:
+        """
+        Fold the anonymous cart `guest_cart_id` into the user's cart. The
+        client proves it owns the guest cart by presenting its id, which must
+        also belong to `ip_address`: the address alone can be shared (NAT) or
+        spoofed through forwarded headers.
+
+        Quantities of lines present in both carts are added together with one
+        INSERT ... SELECT ... ON CONFLICT, and the guest cart is deleted in the
+        same transaction. If the user has no cart yet, the guest cart is simply
+        re-assigned. Returns the id of the user's cart (None if neither exists).
+        """
+        now = datetime.utcnow()
+        table = CartItem.__table__
+        try:
+            result = await self.db.execute(
+                select(Cart.id, Cart.user_id)
+                .where(or_(
+                    Cart.user_id == user_id,
+                    and_(Cart.id == guest_cart_id, Cart.ip_address == ip_address, Cart.user_id.is_(None)),
+                ))
+                .with_for_update()
+            )
+            carts = result.all()
+            user_cart_id = next((c.id for c in carts if c.user_id is not None), None)
+            guest_cart_id = next((c.id for c in carts if c.user_id is None), None)
+
+            if guest_cart_id is None:
+                await self.db.rollback()
+                return user_cart_id
+
+            if user_cart_id is None:
+                await self.db.execute(
+                    update(Cart)
+                    .where(Cart.id == guest_cart_id)
+                    .values(user_id=user_id, ip_address=None, updated_at=now)
+                )
                 await self.db.commit()
-                await self.db.refresh(existing_item)
-                return existing_item
-
-            # If item doesn't exist, create a new one
-            new_item = CartItem(
-                cart_id=cart_id,
-                product_id=item_in.product_id,
-                product_variant_id=item_in.product_variant_id,
-                quantity=item_in.quantity
+                await cart_store.invalidate(guest_cart_id)
+                return guest_cart_id
+
+            stmt = pg_insert(table).from_select(
+                ["id", "cart_id", "product_id", "product_variant_id", "quantity", "created_at", "updated_at"],
+                select(
+                    func.gen_random_uuid(),
+                    literal(user_cart_id, type_=table.c.cart_id.type),
+                    table.c.product_id,
+                    table.c.product_variant_id,
+                    table.c.quantity,
+                    literal(now, type_=table.c.created_at.type),
+                    literal(now, type_=table.c.updated_at.type),
+                ).where(table.c.cart_id == guest_cart_id),
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.cart_id, table.c.product_variant_id],
+                set_={
+                    "quantity": table.c.quantity + stmt.excluded.quantity,
+                    "updated_at": stmt.excluded.updated_at,
+                },
             )
-            self.db.add(new_item)
+            await self.db.execute(stmt)
+            await self.db.execute(delete(CartItem).where(CartItem.cart_id == guest_cart_id))
+            await self.db.execute(delete(Cart).where(Cart.id == guest_cart_id))
+            await self.db.execute(update(Cart).where(Cart.id == user_cart_id).values(updated_at=now))
             await self.db.commit()
-            await self.db.refresh(new_item)
-            return new_item
         except Exception as e:
             await self.db.rollback()
             raise e
 
+        await cart_store.invalidate(guest_cart_id)
+        await cart_store.invalidate(user_cart_id)
+        return user_cart_id
+
     async def remove_item(self, item_id: UUID) -> bool:
         result = await self.db.execute(select(CartItem).where(CartItem.id == item_id))
         item = result.scalar_one_or_none()
         if not item:
             return False
 
+        cart_id = item.cart_id
         try:
-            await self.db.delete(item)
+            before, after = await self._touch(cart_id)
+            # the quantity as deleted, not as read above
+            result = await self.db.execute(
+                delete(CartItem)
+                .where(CartItem.id == item_id)
+                .returning(CartItem.product_variant_id, CartItem.quantity)
+                .execution_options(synchronize_session=False)
+            )
+            removed = result.all()
             await self.db.commit()
-            return True
         except Exception as e:
             await self.db.rollback()
             raise e
 
+        await cart_store.apply(cart_id, before, after, self._removal_deltas(removed))
+        return bool(removed)
+
+    @staticmethod
+    def _removal_deltas(rows) -> List[dict]:
+        return [{"product_variant_id": str(variant_id), "quantity": -quantity} for variant_id, quantity in rows]
+
     async def clear_cart(self, cart_id: UUID) -> None:
         try:
-            await self.db.execute(
-                CartItem.__table__.delete().where(CartItem.cart_id == cart_id)
+            before, after = await self._touch(cart_id)
+            result = await self.db.execute(
+                CartItem.__table__.delete()
+                .where(CartItem.cart_id == cart_id)
+                .returning(CartItem.product_variant_id, CartItem.quantity)
             )
+            removed = result.all()
             await self.db.commit()
         except Exception as e:
             await self.db.rollback()
             raise e
 
+        await cart_store.apply(cart_id, before, after, self._removal_deltas(removed))
+
     async def delete_cart(self, cart_id: UUID) -> bool:
         cart = await self.get_by_id(cart_id)
         if not cart:
@@ -121,7 +674,295 @@ class CartService:
         try:
             await self.db.delete(cart)
             await self.db.commit()
+            await cart_store.invalidate(cart_id)
             return True
         except Exception as e:
             await self.db.rollback()
             raise e
+
+
+class AbandonedCartDetector:
+    """
+    Periodically finds carts that went idle and notifies admins and customers.
+
+    Each scan only looks at carts whose last change falls in the window
+    [previous scan cut-off, now - idle threshold), paging through it by
+    (updated_at, id) on ix_carts_updated_at_id. Work therefore grows with the
+    number of carts that changed since the last scan, not with the table
+    size. Cart values come from one aggregate query per page; admins get one
+    batched websocket event per page and reminder emails go out through a
+    rate limiter. The (updated_at, id) position of the last handled cart is
+    saved in Redis after every page, so neither a restart nor a failure
+    partway through a window re-notifies carts. Carts whose notification
+    failed are kept in Redis with their attempt count and retried at
+    the start of the next scans, up to MAX_ATTEMPTS times.
+
+    Every worker runs a detector, but they share the watermark and retry
+    set, so a scan only runs while holding a Postgres advisory lock; the
+    other workers skip that interval.
+    """
+
+    WATERMARK_KEY = "cart_abandonment:watermark"
+    RETRY_KEY = "cart_abandonment:retry"
+    LOCK_NAME = "cart_abandonment_scan"
+    MAX_ATTEMPTS = 5
+
+    def __init__(self, idle_minutes: int, interval: int, batch_size: int, emails_per_second: float):
+        self.idle = timedelta(minutes=idle_minutes)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.limiter = AsyncRateLimiter(rate=emails_per_second, burst=max(int(emails_per_second), 1))
+        self._watermark: Optional[Tuple[datetime, Optional[UUID]]] = None
+        self._retries: Dict[UUID, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _load_watermark(self) -> Optional[Tuple[datetime, Optional[UUID]]]:
+        """
+        (updated_at, id) of the last cart handled; id is None when a whole
+        window was finished, meaning everything before updated_at is done.
+        """
+        try:
+            raw = await redis_client.get(self.WATERMARK_KEY)
+            if isinstance(raw, bytes):
+                raw = raw.decode()
+            if raw:
+                updated_at, _, cart_id = raw.partition("|")
+                return datetime.fromisoformat(updated_at), UUID(cart_id) if cart_id else None
+        except Exception as e:
+            logger.warning(f"Could not read cart abandonment watermark: {e}")
+        return self._watermark
+
+    async def _save_watermark(self, updated_at: datetime, cart_id: Optional[UUID] = None) -> None:
+        self._watermark = (updated_at, cart_id)
+        value = updated_at.isoformat() + (f"|{cart_id}" if cart_id else "")
+        try:
+            await redis_client.setex(self.WATERMARK_KEY, 7 * 24 * 3600, value)
+        except Exception as e:
+            logger.warning(f"Could not store cart abandonment watermark: {e}")
+
+    async def _load_retries(self) -> Dict[UUID, int]:
+        """Attempt count of each cart whose notification failed, by cart id."""
+        try:
+            raw = await redis_client.get(self.RETRY_KEY)
+            if raw is not None:
+                self._retries = {UUID(cart_id): int(n) for cart_id, n in json.loads(raw).items()}
+        except Exception as e:
+            logger.error(f"Could not read cart abandonment retries: {e}")
+        return dict(self._retries)
+
+    async def _save_retries(self, retries: Dict[UUID, int]) -> None:
+        self._retries = retries
+        value = json.dumps({str(cart_id): n for cart_id, n in retries.items()})
+        try:
+            await redis_client.setex(self.RETRY_KEY, 7 * 24 * 3600, value)
+        except Exception as e:
+            logger.error(f"Could not store {len(retries)} carts for abandonment notification retry: {e}")
+
+    async def _remember_failed(self, failed: Dict[UUID, int]) -> None:
+        """Add carts whose notification failed to the retry set."""
+        if not failed:
+            return
+        await self._save_retries({**await self._load_retries(), **failed})
+
+    async def _retry_failed(self, db: AsyncSession, start: datetime, after) -> None:
+        """
+        Notify the carts an earlier scan failed to notify. Only carts still
+        behind the scan position are retried; carts that changed again since
+        (or were emptied) are dropped, as the scan picks them up once they go
+        idle again.
+        """
+        pending = await self._load_retries()
+        ids = list(pending)
+        for i in range(0, len(ids), self.batch_size):
+            batch = ids[i:i + self.batch_size]
+            carts = await self._fetch_carts(db, batch, start, after)
+            failed = set(await self._notify(carts, await self._fetch_lines(db, [c.id for c in carts]))) if carts else set()
+            for cart_id in batch:
+                attempts = pending.pop(cart_id)
+                if cart_id not in failed:
+                    continue
+                if attempts + 1 < self.MAX_ATTEMPTS:
+                    pending[cart_id] = attempts + 1
+                else:
+                    logger.error(f"Giving up abandoned cart notification for cart {cart_id} after {self.MAX_ATTEMPTS} attempts")
+            await self._save_retries(pending)
+
+    async def run_once(self) -> int:
+        """Scan one window; returns the number of abandoned carts found."""
+        window_end = datetime.utcnow() - self.idle
+        watermark = await self._load_watermark()
+        after: Optional[Tuple[datetime, UUID]] = None
+        if watermark is None:
+            window_start = window_end - timedelta(seconds=self.interval)
+        else:
+            window_start, cart_id = watermark
+            if cart_id is not None:
+                # resume after the last cart an interrupted scan notified
+                after = (window_start, cart_id)
+        found = 0
+        async with AsyncSessionDB() as db:
+            await self._retry_failed(db, window_start, after)
+            if window_start >= window_end:
+                return 0
+            while True:
+                carts = await self._fetch_page(db, window_start, window_end, after)
+                if not carts:
+                    break
+                lines = await self._fetch_lines(db, [c.id for c in carts])
+                # failed carts are kept for retry before the watermark moves past them
+                await self._remember_failed({cart_id: 1 for cart_id in await self._notify(carts, lines)})
+                found += len(carts)
+                after = (carts[-1].updated_at, carts[-1].id)
+                await self._save_watermark(*after)
+                if len(carts) < self.batch_size:
+                    break
+
+        await self._save_watermark(window_end)
+        return found
+
+    @staticmethod
+    def _cart_query():
+        line_price = CartItem.quantity * func.coalesce(ProductVariant.sale_price, ProductVariant.base_price)
+        return (
+            select(
+                Cart.id,
+                Cart.user_id,
+                Cart.updated_at,
+                func.sum(line_price).label("cart_value"),
+                func.sum(CartItem.quantity).label("item_count"),
+                User.email,
+                User.firstname,
+                User.lastname,
+            )
+            .join(CartItem, CartItem.cart_id == Cart.id)
+            .join(ProductVariant, ProductVariant.id == CartItem.product_variant_id)
+            .outerjoin(User, User.id == Cart.user_id)
+            .group_by(Cart.id, User.id)
+        )
+
+    async def _fetch_page(self, db: AsyncSession, start: datetime, end: datetime, after):
+        query = (
+            self._cart_query()
+            .where(Cart.updated_at >= start, Cart.updated_at < end)
+            .order_by(Cart.updated_at, Cart.id)
+            .limit(self.batch_size)
+        )
+        if after is not None:
+            query = query.where(tuple_(Cart.updated_at, Cart.id) > tuple_(*after))
+        result = await db.execute(query)
+        return result.all()
+
+    async def _fetch_carts(self, db: AsyncSession, cart_ids: List[UUID], start: datetime, after):
+        """The given carts among those a scan starting at (start, after) has already passed."""
+        if after is None:
+            behind = Cart.updated_at < start
+        else:
+            behind = tuple_(Cart.updated_at, Cart.id) <= tuple_(*after)
+        result = await db.execute(self._cart_query().where(Cart.id.in_(cart_ids), behind))
+        return result.all()
+
+    async def _fetch_lines(self, db: AsyncSession, cart_ids: List[UUID]) -> Dict[UUID, List[dict]]:
+        result = await db.execute(
+            select(
+                CartItem.cart_id,
+                CartItem.quantity,
+                Product.name,
+                func.coalesce(ProductVariant.sale_price, ProductVariant.base_price).label("price"),
+            )
+            .join(ProductVariant, ProductVariant.id == CartItem.product_variant_id)
+            .join(Product, Product.id == CartItem.product_id)
+            .where(CartItem.cart_id.in_(cart_ids))
+        )
+        lines: Dict[UUID, List[dict]] = {}
+        for row in result:
+            lines.setdefault(row.cart_id, []).append(
+                {"name": row.name, "quantity": row.quantity, "price": float(_money(row.price))}
+            )
+        return lines
+
+    async def _notify(self, carts, lines: Dict[UUID, List[dict]]) -> List[UUID]:
+        """Notify admins and customers; returns the ids of the carts that failed."""
+        try:
+            await notify_cart_abandonment_batch([
+                {
+                    "cart_id": str(c.id),
+                    "user_id": str(c.user_id) if c.user_id else None,
+                    "cart_value": float(_money(c.cart_value)),
+                    "item_count": int(c.item_count or 0),
+                    "updated_at": c.updated_at.isoformat(),
+                }
+                for c in carts
+            ])
+        except Exception as e:
+            logger.error(f"Abandoned cart notification failed for a page of {len(carts)} carts: {e}")
+            return [c.id for c in carts]
+        failed = []
+        for c in carts:
+            if not c.email:
+                continue
+            context = general_context.copy()
+            context.update({
+                "customer_name": f"{c.firstname} {c.lastname}",
+                "cart_items": lines.get(c.id, []),
+            })
+            await self.limiter.acquire()
+            try:
+                await asyncio.to_thread(
+                    send_email,
+                    to_email=c.email,
+                    from_email=settings.SMTP_USER,
+                    from_password=settings.SMTP_PASSWORD,
+                    mail_type="cart_abandonment",
+                    context=context,
+                )
+            except Exception as e:
+                logger.error(f"Cart abandonment email to {c.email} failed: {e}")
+                failed.append(c.id)
+        return failed
+
+    async def run_exclusive(self) -> Optional[int]:
+        """run_once() unless another worker is scanning; None when skipped."""
+        async with engine_db.connect() as conn:
+            locked = await conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:name))"), {"name": self.LOCK_NAME})
+            if not locked.scalar():
+                return None
+            try:
+                return await self.run_once()
+            finally:
+                try:
+                    await conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), {"name": self.LOCK_NAME})
+                except BaseException:
+                    # a session lock outlives the transaction; never pool a connection still holding it
+                    await conn.invalidate()
+                    raise
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                found = await self.run_exclusive()
+                if found:
+                    logger.info(f"Abandoned cart scan: {found} carts notified")
+            except Exception as e:
+                logger.error(f"Abandoned cart scan failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+abandoned_cart_detector = AbandonedCartDetector(
+    idle_minutes=settings.CART_ABANDONMENT_IDLE_MINUTES,
+    interval=settings.CART_ABANDONMENT_SCAN_INTERVAL_SECONDS,
+    batch_size=settings.CART_ABANDONMENT_BATCH_SIZE,
+    emails_per_second=settings.CART_ABANDONMENT_EMAILS_PER_SECOND,
+)
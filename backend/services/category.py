@@ -1,13 +1,16 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import and_
 
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+from core.utils.catalog import category_cache, touch_products
 from models.category import (Category)
+from models.products import Product
 from schemas.category import (UUID,CategoryCreate)
 
 
 class CategoryService:
+    """Reads are served from the in-process category cache; writes reload it."""
+
     def __init__(self, db: AsyncSession):
         self.db = db
 
@@ -17,29 +20,25 @@ class CategoryService:
         description_contains: Optional[str] = None,
         limit: int = 10,
         offset: int = 0
-    ) -> List[Category]:
-        query = select(Category)
-        filters = []
-
+    ) -> List[Dict[str, Any]]:
+        categories = (await category_cache.ensure_loaded(self.db)).all()
         if name:
-            filters.append(Category.name.ilike(f"%{name}%"))
+            needle = name.casefold()
+            categories = [c for c in categories if needle in c["name"].casefold()]
         if description_contains:
-            filters.append(Category.description.ilike(f"%{description_contains}%"))
-
-        if filters:
-            query = query.where(and_(*filters))
+            needle = description_contains.casefold()
+            categories = [c for c in categories if needle in (c["description"] or "").casefold()]
+        return categories[offset:offset + limit]
 
-        query = query.limit(limit).offset(offset)
-
-        try:
-            result = await self.db.execute(query)
-            return result.scalars().all()
-        except Exception as e:
-            await self.db.rollback()
-            # Optionally log the error here
-            raise e
+    async def get_by_id(self, category_id: UUID) -> Optional[Dict[str, Any]]:
+        row = (await category_cache.ensure_loaded(self.db)).get(category_id)
+        if row is None and await self._get(category_id) is not None:
+            # written by another worker since our last refresh
+            await category_cache.load(self.db)
+            row = category_cache.get(category_id)
+        return row
 
-    async def get_by_id(self, category_id: UUID) -> Optional[Category]:
+    async def _get(self, category_id: UUID) -> Optional[Category]:
         result = await self.db.execute(select(Category).where(Category.id == category_id))
         category = result.scalar_one_or_none()
         return category
@@ -54,6 +53,7 @@ class CategoryService:
         try:
             await self.db.commit()
             await self.db.refresh(category)
+            await category_cache.load(self.db)
             return category
         except Exception as e:
             await self.db.rollback()
@@ -61,14 +61,17 @@ class CategoryService:
             raise e
 
     async def update(self, category_id: UUID, category_in: CategoryCreate) -> Category:
-        category = await self.get_by_id(category_id)
+        category = await self._get(category_id)
         if not category:
             return None
         try:
             category.name = category_in.name
             category.description = category_in.description
+            # products render the category name
+            await touch_products(self.db, Product.category_id == category_id)
             await self.db.commit()
             await self.db.refresh(category)
+            await category_cache.load(self.db)
             return category
         except Exception as e:
             await self.db.rollback()
@@ -76,15 +79,18 @@ class CategoryService:
             raise e
 
     async def delete(self, category_id: UUID) -> bool:
-        category = await self.get_by_id(category_id)
+        category = await self._get(category_id)
         if not category:
             return None
         try:
+            await touch_products(self.db, Product.category_id == category_id)
             await self.db.delete(category)
             await self.db.commit()
+            await category_cache.load(self.db)
             return True
         except Exception as e:
             await self.db.rollback()
             # Optionally log the error here
             raise e
 
+
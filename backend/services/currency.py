@@ -1,45 +1,94 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List, Optional
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 from uuid import UUID
-from models.currency import Currency
+from core.utils.currency import currency_registry
+from models.currency import Currency, ExchangeRate
 from schemas.currency import CurrencyCreate, CurrencyUpdate
 
 
 class CurrencyService:
+    """
+    Reads are served from the process-wide currency registry; every write
+    reloads it once committed.
+    """
+
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def get_all(self) -> List[Currency]:
-        result = await self.db.execute(select(Currency))
-        return result.scalars().all()
+    async def _registry(self):
+        if currency_registry.loaded_at is None:
+            await currency_registry.load(self.db)
+        return currency_registry
+
+    async def get_all(self) -> List[Dict[str, Any]]:
+        return (await self._registry()).all()
+
+    async def get_by_id(self, currency_id: UUID) -> Optional[Dict[str, Any]]:
+        return (await self._registry()).get(currency_id)
 
-    async def get_by_id(self, currency_id: UUID) -> Optional[Currency]:
+    async def _get(self, currency_id: UUID) -> Optional[Currency]:
         result = await self.db.execute(select(Currency).where(Currency.id == currency_id))
-        currency = result.scalars().first()
-        return currency
+        return result.scalars().first()
 
     async def create(self, currency_in: CurrencyCreate) -> Currency:
         currency = Currency(**currency_in.dict())
         self.db.add(currency)
         await self.db.commit()
         await self.db.refresh(currency)
+        await currency_registry.load(self.db)
         return currency
 
     async def update(self, currency_id: UUID, currency_in: CurrencyUpdate) -> Optional[Currency]:
-        currency = await self.get_by_id(currency_id)
+        currency = await self._get(currency_id)
         if not currency:
             return None
         for field, value in currency_in.dict(exclude_unset=True).items():
             setattr(currency, field, value)
         await self.db.commit()
         await self.db.refresh(currency)
+        await currency_registry.load(self.db)
         return currency
 
     async def delete(self, currency_id: UUID) -> bool:
-        currency = await self.get_by_id(currency_id)
+        currency = await self._get(currency_id)
         if not currency:
             return False
         await self.db.delete(currency)
         await self.db.commit()
+        await currency_registry.load(self.db)
         return True
+
+    async def set_rates(self, rates: Dict[UUID, float]) -> List[Dict[str, Any]]:
+        """
+        Upsert rates (units of each currency per one FX_BASE_CURRENCY) with a
+        single INSERT ... ON CONFLICT, then reload the registry.
+        """
+        registry = await self._registry()
+        unknown = [str(currency_id) for currency_id in rates if registry.get(currency_id) is None]
+        if unknown:
+            raise ValueError(f"Unknown currency: {', '.join(unknown)}")
+        if any(rate <= 0 for rate in rates.values()):
+            raise ValueError("Rates must be positive")
+        if rates:
+            now = datetime.utcnow()
+            stmt = pg_insert(ExchangeRate).values([
+                {"currency_id": currency_id, "rate": rate, "updated_at": now}
+                for currency_id, rate in rates.items()
+            ])
+            await self.db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[ExchangeRate.currency_id],
+                    set_={"rate": stmt.excluded.rate, "updated_at": stmt.excluded.updated_at},
+                )
+            )
+            await self.db.commit()
+            await currency_registry.load(self.db)
+        return currency_registry.all()
+
+    async def convert(self, amounts: List[float], from_currency: str, to_currency: str) -> List[Optional[float]]:
+        registry = await self._registry()
+        converted = registry.convert(amounts, from_currency, to_currency)
+        return [None if value != value else round(value, 2) for value in converted.tolist()]
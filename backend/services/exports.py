@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+from typing import AsyncIterator, Optional, List
+from sqlalchemy.future import select
+from core.config import settings
+from core.database import AsyncSessionDB
+from models.orders import Order, OrderItem
+from models.payments import Payment
+from models.products import Product, ProductVariant
+from models.user import User
+
+# entity -> (table, time column for start/end, exported columns). Columns are
+# listed explicitly so credentials (password_hash, activation tokens), gateway
+# payloads and barcode images never end up in a file.
+EXPORTS = {
+    "orders": (
+        Order.__table__, "created_at",
+        ["id", "user_id", "status", "total_amount", "currency", "created_at", "updated_at"],
+    ),
+    "order_items": (
+        OrderItem.__table__, "order_created_at",
+        ["id", "order_id", "order_created_at", "product_id", "quantity", "price_per_unit", "total_price"],
+    ),
+    "payments": (
+        Payment.__table__, "created_at",
+        ["id", "order_id", "user_id", "method", "status", "amount", "currency", "refunded_amount",
+         "transaction_id", "parent_payment_id", "created_at", "updated_at"],
+    ),
+    "products": (
+        Product.__table__, "created_at",
+        ["id", "name", "category_id", "availability", "rating", "created_at", "updated_at"],
+    ),
+    "product_variants": (
+        ProductVariant.__table__, None,
+        ["id", "product_id", "sku", "name", "base_price", "sale_price", "stock"],
+    ),
+    "users": (
+        User.__table__, "created_at",
+        ["id", "firstname", "lastname", "email", "role", "verified", "active", "phone", "age", "gender",
+         "created_at", "updated_at"],
+    ),
+}
+
+# The allow-list of exportable entities, as a path parameter type
+ExportEntity = Enum("ExportEntity", {name: name for name in EXPORTS}, type=str)
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _plain(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return str(value)
+    return str(value)
+
+
+class ExportService:
+    """
+    Streams a table as NDJSON or CSV, optionally gzip-compressed, in constant
+    memory. Rows come from a server-side cursor (yield_per) as plain column
+    tuples, and each batch is encoded and compressed as it arrives. The
+    export opens its own session because a request-scoped session is closed
+    before a StreamingResponse body runs. The pooled connection is returned
+    as soon as the last batch is read or the client goes away.
+    """
+
+    def __init__(self, entity: str, fmt: str = "ndjson", compress: bool = True, batch_size: Optional[int] = None):
+        if entity not in EXPORTS:
+            raise ValueError(f"entity must be one of {', '.join(EXPORTS)}")
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        self.entity = entity
+        self.fmt = fmt
+        self.compress = compress
+        self.batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+
+    @property
+    def media_type(self) -> str:
+        return "application/gzip" if self.compress else FORMATS[self.fmt]
+
+    @property
+    def filename(self) -> str:
+        name = f"{self.entity}-{datetime.utcnow():%Y%m%d%H%M%S}.{self.fmt}"
+        return f"{name}.gz" if self.compress else name
+
+    def _query(self, start: Optional[date], end: Optional[date]):
+        table, time_column, columns = EXPORTS[self.entity]
+        query = select(*[table.c[name] for name in columns])
+        if time_column and start:
+            query = query.where(table.c[time_column] >= datetime.combine(start, datetime.min.time()))
+        if time_column and end:
+            query = query.where(
+                table.c[time_column] < datetime.combine(end + timedelta(days=1), datetime.min.time())
+            )
+        return query.execution_options(yield_per=self.batch_size)
+
+    def _encode(self, columns: List[str], rows) -> str:
+        if self.fmt == "ndjson":
+            return "".join(
+                json.dumps({name: _plain(value) for name, value in zip(columns, row)}, separators=(",", ":")) + "\n"
+                for row in rows
+            )
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([[_plain(value) for value in row] for row in rows])
+        return buffer.getvalue()
+
+    async def stream(self, start: Optional[date] = None, end: Optional[date] = None) -> AsyncIterator[bytes]:
+        _, _, columns = EXPORTS[self.entity]
+        # wbits=31 → gzip container; one compressor for the whole body
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if self.compress else None
+
+        def emit(text: str) -> bytes:
+            data = text.encode()
+            return compressor.compress(data) if compressor else data
+
+        if self.fmt == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(columns)
+            yield emit(buffer.getvalue())
+
+        async with AsyncSessionDB() as session:
+            result = await session.stream(self._query(start, end))
+            try:
+                async for rows in result.partitions():
+                    chunk = emit(self._encode(columns, rows))
+                    if chunk:
+                        yield chunk
+            finally:
+                await result.close()
+
+        if compressor:
+            yield compressor.flush()
@@ -7,9 +7,11 @@ from typing import List, Optional
 from uuid import UUID
 
 
-from models.products import Inventory, InventoryProduct
+from core.utils.catalog import touch_products
+from core.utils.loader import loaders
+from models.products import Inventory, InventoryProduct, Product
 from schemas.inventory import InventoryCreate, InventoryProductCreate, InventoryProductUpdate
-# from api.v1.websockets.inventory import broadcast_inventory_update  # WebSocket broadcast
+from api.v1.websockets.inventory import broadcast_inventory_update, inventory_coalescer  # WebSocket broadcast
 
 
 class InventoryService:
@@ -25,7 +27,7 @@ class InventoryService:
     ) -> List[Inventory]:
         try:
             query = select(Inventory).options(
-                selectinload(Inventory.inventory_products).selectinload(InventoryProduct.product)
+                selectinload(Inventory.inventory_products)
             )
             filters = []
 
@@ -39,7 +41,9 @@ class InventoryService:
 
             query = query.limit(limit).offset(offset)
             result = await self.db.execute(query)
-            return result.scalars().all()
+            inventories = result.scalars().all()
+            await self._load_products(inventories)
+            return inventories
 
         except SQLAlchemyError as e:
             raise RuntimeError("Failed to fetch inventories") from e
@@ -48,11 +52,25 @@ class InventoryService:
         result = await self.db.execute(
             select(Inventory)
             .options(
-                selectinload(Inventory.inventory_products).selectinload(InventoryProduct.product)
+                selectinload(Inventory.inventory_products)
             )
             .where(Inventory.id == inventory_id)
         )
-        return result.scalar_one_or_none()
+        inventory = result.scalar_one_or_none()
+        if inventory:
+            await self._load_products([inventory])
+        return inventory
+
+    async def _load_products(self, inventories: List[Inventory]) -> None:
+        """The products Inventory.to_dict() renders, in one query for the whole page."""
+        await loaders(self.db).load_many(
+            "product", (ip.product_id for inventory in inventories for ip in inventory.inventory_products)
+        )
+
+    @staticmethod
+    def _stocked_in(inventory_id: UUID):
+        """The products listing this inventory (Product.to_dict renders its inventories)."""
+        return Product.id.in_(select(InventoryProduct.product_id).where(InventoryProduct.inventory_id == inventory_id))
 
     async def create(self, inventory_in: InventoryCreate) -> Inventory:
         inventory = Inventory(
@@ -79,6 +97,7 @@ class InventoryService:
         inventory.location = inventory_in.location
 
         try:
+            await touch_products(self.db, self._stocked_in(inventory_id))
             await self.db.commit()
             await self.db.refresh(inventory)
             return inventory
@@ -92,6 +111,7 @@ class InventoryService:
             return False
 
         try:
+            await touch_products(self.db, self._stocked_in(inventory_id))
             await self.db.delete(inventory)
             await self.db.commit()
             return True
@@ -124,6 +144,35 @@ class InventoryProductService:
         except SQLAlchemyError as e:
             raise RuntimeError("Failed to fetch inventory products") from e
 
+    async def snapshot(
+        self,
+        inventory_id: Optional[UUID] = None,
+        product_id: Optional[UUID] = None,
+    ) -> dict:
+        """Current stock levels plus the websocket sequence they are consistent with."""
+        # Read the sequence first: any batch emitted after this point is newer than the rows below.
+        seq = inventory_coalescer.seq
+        query = select(
+            InventoryProduct.product_id,
+            InventoryProduct.inventory_id,
+            InventoryProduct.quantity,
+        )
+        if inventory_id:
+            query = query.where(InventoryProduct.inventory_id == inventory_id)
+        if product_id:
+            query = query.where(InventoryProduct.product_id == product_id)
+        try:
+            result = await self.db.execute(query)
+        except SQLAlchemyError as e:
+            raise RuntimeError("Failed to fetch inventory snapshot") from e
+        return {
+            "seq": seq,
+            "items": [
+                {"product_id": str(row.product_id), "inventory_id": str(row.inventory_id), "stock": row.quantity}
+                for row in result
+            ],
+        }
+
     async def get_by_id(self, id: UUID) -> Optional[InventoryProduct]:
         result = await self.db.execute(select(InventoryProduct).where(InventoryProduct.id == id))
         return result.scalar_one_or_none()
@@ -137,12 +186,13 @@ class InventoryProductService:
         )
         self.db.add(new_item)
         try:
+            await touch_products(self.db, Product.id == data.product_id)
             await self.db.commit()
             await self.db.refresh(new_item)
             # Broadcast stock update via websocket
-            # await broadcast_inventory_update(
-            #     str(data.product_id), str(data.inventory_id), data.quantity
-            # )  # noqa
+            await broadcast_inventory_update(
+                str(data.product_id), str(data.inventory_id), data.quantity
+            )
             return new_item
         except Exception as e:
             await self.db.rollback()
@@ -159,12 +209,13 @@ class InventoryProductService:
             item.low_stock_threshold = data.low_stock_threshold
 
         try:
+            await touch_products(self.db, Product.id == item.product_id)
             await self.db.commit()
             await self.db.refresh(item)
             # Broadcast stock update via websocket
-            # await broadcast_inventory_update(
-            #     str(item.product_id), str(item.inventory_id), item.quantity
-            # )  # noqa
+            await broadcast_inventory_update(
+                str(item.product_id), str(item.inventory_id), item.quantity
+            )
             return item
         except Exception as e:
             await self.db.rollback()
@@ -176,12 +227,13 @@ class InventoryProductService:
             return False
 
         try:
+            await touch_products(self.db, Product.id == item.product_id)
             await self.db.delete(item)
             await self.db.commit()
             # Broadcast stock update with quantity 0 since deleted
-            # await broadcast_inventory_update(
-            #     str(item.product_id), str(item.inventory_id), 0
-            # )  # noqa
+            await broadcast_inventory_update(
+                str(item.product_id), str(item.inventory_id), 0
+            )
             return True
         except Exception as e:
             await self.db.rollback()
@@ -1,12 +1,19 @@
-from typing import Optional, List
+import uuid
+from typing import Optional, List, Dict, Any, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from sqlalchemy import delete,and_
+from sqlalchemy import delete, func, insert, update, and_, tuple_
 from models.orders import Order, OrderItem, OrderStatus  # adjust import
+from models.products import Product
+from core.utils.fields import FieldSet, relationships
+from core.utils.loader import loaded, loaders
 from schemas.orders import OrderSchema, OrderItemSchema,UpdateOrderSchema,UUID
 # from core.utils.kafka import KafkaProducer, send_kafka_message, is_kafka_available
 from datetime import datetime
+from core.utils.pagination import decode_cursor
+from services.analytics import SalesRollupService
+from services.promocode import PromoCodeService, promo_index
 
 # kafka_producer = KafkaProducer(broker=settings.KAFKA_BOOTSTRAP_SERVERS,
 #                                 topic=str(settings.KAFKA_TOPIC))
@@ -15,121 +22,287 @@ class OrderService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def create_order(self,order_in: OrderSchema) -> Order:
+    @staticmethod
+    def _subtotal(order_in: OrderSchema) -> float:
+        """The sum of the item totals; the client's total_amount for an order without items."""
+        if not order_in.items:
+            return order_in.total_amount
+        return sum(
+            item.total_price if item.total_price is not None else item.quantity * item.price_per_unit
+            for item in order_in.items
+        )
+
+    async def create_order(self, order_in: OrderSchema, client: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Insert the order and all of its items with two bulk INSERT ... RETURNING
+        statements in one transaction and build the response from the returned
+        rows, so the round-trips don't grow with the number of lines. A promo
+        code is redeemed in the same transaction, so a use is only taken for
+        an order that is actually placed; it is priced against the subtotal of
+        the items and the order stores the discounted total. `client` (e.g. an
+        IP) counts failed codes against the same throttle as promo validation.
+        """
+        now = datetime.utcnow()
+        order_id = uuid.uuid4()
+        orders = Order.__table__
+        order_items = OrderItem.__table__
+        promo = None
+        total_amount, discount_amount = order_in.total_amount, 0
         try:
-            order = Order(
-                user_id=order_in.user_id, 
-                total_amount=order_in.total_amount, 
-                currency=order_in.currency,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow(), 
-                status=order_in.status
+            if order_in.promo_code:
+                promo = await PromoCodeService(self.db).redeem(order_in.promo_code, self._subtotal(order_in), client)
+                total_amount, discount_amount = promo["total"], promo["discount"]
+
+            result = await self.db.execute(
+                insert(orders)
+                .values(
+                    id=order_id,
+                    user_id=order_in.user_id,
+                    total_amount=total_amount,
+                    currency=order_in.currency,
+                    status=OrderStatus(order_in.status.value),
+                    promo_code=promo["code"] if promo else None,
+                    discount_amount=discount_amount,
+                    created_at=now,
+                    updated_at=now,
+                )
+                .returning(*orders.c)
             )
-            self.db.add(order)
-            await self.db.flush()  # flush to get order.id
+            order_row = result.one()
 
+            item_rows = []
             if order_in.items:
-                for item_data in order_in.items:
-                    item = OrderItem(
-                        order_id=order.id,
-                        product_id=item_data.product_id,
-                        quantity=item_data.quantity,
-                        price_per_unit=item_data.price_per_unit,
-                        total_price = item_data.total_price if item_data.total_price is not None else item_data.quantity * item_data.price_per_unit
-                    )
-                    self.db.add(item)
+                result = await self.db.execute(
+                    insert(order_items)
+                    .values([
+                        {
+                            "id": uuid.uuid4(),
+                            "order_id": order_id,
+                            "order_created_at": now,
+                            "product_id": item_data.product_id,
+                            "quantity": item_data.quantity,
+                            "price_per_unit": item_data.price_per_unit,
+                            "total_price": (
+                                item_data.total_price
+                                if item_data.total_price is not None
+                                else item_data.quantity * item_data.price_per_unit
+                            ),
+                        }
+                        for item_data in order_in.items
+                    ])
+                    .returning(*order_items.c)
+                )
+                item_rows = result.all()
 
+            await SalesRollupService(self.db).record(order_id, now, order_row.status)
             await self.db.commit()
-
-            
-            # Reload product with relationships eagerly loaded
-            order = await self.get_order_by_id(order.id)
-            
-            # Kafka background task
-            # await kafka_producer.start()
-            # await kafka_producer.send({
-            #         "order": order.to_dict(),
-            #         "action": "create"
-            #     })
-            # await kafka_producer.stop()
-            
-
-            # When a new order is placed
-            # await broadcast_to_admins({
-            #         "type": "new_order",
-            #         "order_id": order.id,
-            #         "total": len(order_in.items),
-            #     })
-            await self.db.refresh(order)
-            return order
         except Exception as e:
             await self.db.rollback()
             raise e
-
-    async def get_order_by_id(self, order_id: UUID) -> Optional[Order]:
-        result = await self.db.execute(select(Order)
-                    .options(
-                        selectinload(Order.items)
-                    ).where(Order.id == order_id))
+        if promo:
+            promo_index.record_uses(promo["code"], promo["uses"])
+
+        # Kafka background task
+        # await kafka_producer.start()
+        # await kafka_producer.send({
+        #         "order": order,
+        #         "action": "create"
+        #     })
+        # await kafka_producer.stop()
+
+        # When a new order is placed
+        # await broadcast_to_admins({
+        #         "type": "new_order",
+        #         "order_id": order_id,
+        #         "total": len(order_in.items),
+        #     })
+        order = self._order_from_rows(order_row, item_rows)
+        await self.load_item_products([order])
+        return order.to_dict()
+
+    @staticmethod
+    def _order_from_rows(order_row, item_rows) -> Order:
+        """A detached Order built from INSERT ... RETURNING rows, so it serializes through Order.to_dict()."""
+        return Order(**order_row._mapping, items=[OrderItem(**row._mapping) for row in item_rows])
+
+    async def get_order_by_id(self, order_id: UUID, populate_existing: bool = False) -> Optional[Order]:
+        query = select(Order).options(selectinload(Order.items)).where(Order.id == order_id)
+        if populate_existing:
+            # Reload rows that bulk statements changed behind the identity map's back.
+            query = query.execution_options(populate_existing=True)
+        result = await self.db.execute(query)
         return result.scalar_one_or_none()
 
+    async def load_item_products(self, orders: List[Order], fields: FieldSet = None) -> None:
+        """
+        Batch-load the products OrderItem.to_dict() embeds, one query for the
+        whole page. Skipped when the fieldset leaves them out.
+        """
+        if not relationships(fields, "items"):
+            return
+        if not relationships(None if fields is None else fields["items"], "product"):
+            return
+        await loaders(self.db).load_many("product", (item.product_id for order in orders for item in order.items))
+
+    @staticmethod
+    def products_version():
+        """
+        updated_at of the newest product an order's items embed, correlated to
+        Order for row_version(). Variant, attribute and image writes bump the
+        product's updated_at, so this covers everything the items render.
+        """
+        return (
+            select(func.max(Product.updated_at))
+            .select_from(OrderItem)
+            .join(Product, Product.id == OrderItem.product_id)
+            .where(OrderItem.order_id == Order.id, OrderItem.order_created_at == Order.created_at)
+            .scalar_subquery()
+        )
+
+    @staticmethod
+    def product_versions(orders: List[Order]) -> List[Tuple[Any, Any]]:
+        """(id, updated_at) of the products load_item_products() loaded, for list ETags."""
+        products = {item.product_id: loaded("product", item.product_id) for order in orders for item in order.items}
+        return [(product_id, product.updated_at) for product_id, product in products.items() if product is not None]
+
+    async def _sync_promo(self, order: Order, old_status, new_status) -> Optional[int]:
+        """
+        Give the order's promo code use back when it leaves the live states
+        (cancelled, or deleted when new_status is None), and redeem it again,
+        under the same usage limits, when a cancelled order is brought back;
+        that raises ValueError if the code is no longer available. Runs in the
+        caller's transaction; returns the new use count for
+        promo_index.record_uses.
+        """
+        if not order.promo_code:
+            return None
+        cancelled = OrderStatus.Cancelled.value
+        was_live = OrderStatus(old_status).value != cancelled
+        is_live = new_status is not None and OrderStatus(new_status).value != cancelled
+        if was_live and not is_live:
+            return await PromoCodeService(self.db).release(order.promo_code)
+        if is_live and not was_live:
+            subtotal = order.total_amount + (order.discount_amount or 0)
+            promo = await PromoCodeService(self.db).redeem(order.promo_code, subtotal)
+            return promo["uses"]
+        return None
+
     async def update_order(self, order_id: UUID, update_data: UpdateOrderSchema) -> Optional[Order]:
         order = await self.get_order_by_id(order_id)
         if not order:
             raise Exception("Order not found")
 
+        rollups = SalesRollupService(self.db)
+        promo_uses = None
         try:
             data = update_data.model_dump(exclude_unset=True)
 
+            # Take the order's old contribution out of the sales rollups and
+            # add the new one back once the items below are written.
+            await rollups.record(order.id, order.created_at, order.status, sign=-1)
+
             # Update allowed fields
-            if "status" in data:
-                order.status = data["status"]
             if "total_amount" in data:
                 order.total_amount = data["total_amount"]
+            if "status" in data:
+                promo_uses = await self._sync_promo(order, order.status, data["status"])
+                order.status = data["status"]
             if "currency" in data:
                 order.currency = data["currency"]
             order.updated_at = data.get("updated_at", datetime.utcnow())
 
             # Handle items
             if "items" in data and data["items"] is not None:
-                # Delete existing items
-                await self.db.execute(
-                    delete(OrderItem).where(OrderItem.order_id == order.id)
-                )
-
-                # Add new items
-                for item_data in data["items"]:
-                    
-                    new_item = OrderItem(
-                        order_id=order.id,
-                        product_id=item_data['product_id'],
-                        quantity=item_data['quantity'],
-                        price_per_unit=item_data['price_per_unit'],
-                        total_price=(
-                            item_data['total_price']
-                            if item_data['total_price'] is not None
-                            else item_data['quantity'] * item_data['price_per_unit']
-                        )
-                    )
-                    self.db.add(new_item)  # ✅ Move this inside the loop
+                await self._apply_item_diff(order, data["items"])
 
             await self.db.flush()
-            await self.db.refresh(order)
+            await rollups.record(order.id, order.created_at, order.status)
             await self.db.commit()
-            return order
-
         except Exception as e:
             await self.db.rollback()
             raise e
+        if promo_uses is not None:
+            promo_index.record_uses(order.promo_code, promo_uses)
+
+        return await self.get_order_by_id(order_id, populate_existing=True)
+
+    async def _apply_item_diff(self, order: Order, items: List[Dict[str, Any]]) -> None:
+        """
+        Reconcile `order.items` with `items` using only the statements needed:
+        incoming items are matched by id, or else by product_id, and produce
+        one DELETE for unmatched rows, one executemany UPDATE for changed rows
+        and one multi-row INSERT for new rows. Unchanged rows are not touched.
+        """
+        by_id = {item.id: item for item in order.items}
+        by_product: Dict[str, List[OrderItem]] = {}
+        for item in order.items:
+            by_product.setdefault(str(item.product_id), []).append(item)
+
+        matched = set()
+        inserts, updates = [], []
+        for item_data in items:
+            quantity = item_data["quantity"]
+            price_per_unit = item_data["price_per_unit"]
+            total_price = item_data.get("total_price")
+            if total_price is None:
+                total_price = quantity * price_per_unit
+
+            existing = by_id.get(item_data.get("id"))
+            if existing is None:
+                candidates = [i for i in by_product.get(str(item_data["product_id"]), []) if i.id not in matched]
+                existing = candidates[0] if candidates else None
+            if existing is None or existing.id in matched:
+                inserts.append({
+                    "id": uuid.uuid4(),
+                    "order_id": order.id,
+                    "order_created_at": order.created_at,
+                    "product_id": item_data["product_id"],
+                    "quantity": quantity,
+                    "price_per_unit": price_per_unit,
+                    "total_price": total_price,
+                })
+                continue
+
+            matched.add(existing.id)
+            changes = {}
+            if str(existing.product_id) != str(item_data["product_id"]):
+                changes["product_id"] = item_data["product_id"]
+            if existing.quantity != quantity:
+                changes["quantity"] = quantity
+            if float(existing.price_per_unit) != float(price_per_unit):
+                changes["price_per_unit"] = price_per_unit
+            if float(existing.total_price) != float(total_price):
+                changes["total_price"] = total_price
+            if changes:
+                updates.append({"id": existing.id, "order_created_at": existing.order_created_at, **changes})
+
+        removed = [item.id for item in order.items if item.id not in matched]
+        if removed:
+            await self.db.execute(
+                delete(OrderItem).where(
+                    OrderItem.id.in_(removed),
+                    OrderItem.order_created_at == order.created_at,
+                ),
+                execution_options={"synchronize_session": False},
+            )
+        if updates:
+            await self.db.execute(update(OrderItem), updates)
+        if inserts:
+            await self.db.execute(insert(OrderItem.__table__).values(inserts))
 
     async def update_order_status(self, order_id: UUID, status: str):
         order = await self.get_order_by_id(order_id)
         if not order:
             raise Exception("Order not found")
         try:
+            old_status = order.status
+            promo_uses = await self._sync_promo(order, old_status, status)
             order.status = status
+            await SalesRollupService(self.db).record_status_change(order.id, order.created_at, old_status, status)
             await self.db.commit()
             await self.db.refresh(order)
+            if promo_uses is not None:
+                promo_index.record_uses(order.promo_code, promo_uses)
             return order
         
         except Exception as e:
@@ -140,8 +313,13 @@ class OrderService:
         if not order:
             raise Exception("Order not found")
         try:
+            promo_code = order.promo_code
+            promo_uses = await self._sync_promo(order, order.status, None)
+            await SalesRollupService(self.db).record(order.id, order.created_at, order.status, sign=-1)
             await self.db.delete(order)
             await self.db.commit()
+            if promo_uses is not None:
+                promo_index.record_uses(promo_code, promo_uses)
             return True
         except Exception as e:
             await self.db.rollback()
@@ -155,7 +333,17 @@ class OrderService:
         end_date: Optional[datetime] = None,
         limit: int = 10,
         offset: int = 0,
+        cursor: Optional[str] = None,
     ) -> List[Order]:
+        """
+        Newest orders first, ordered by (created_at, id). Pass the cursor built
+        from the last row of a page (see core.utils.pagination) to get the next
+        page with an index range scan instead of skipping `offset` rows.
+
+        Every bound is also applied as a plain range on created_at so Postgres
+        prunes the monthly partitions outside it; the items are then loaded by
+        (order_id, order_created_at), which prunes order_items the same way.
+        """
         try:
             query = select(Order).options(
                 selectinload(Order.items)
@@ -170,7 +358,16 @@ class OrderService:
             if end_date:
                 query = query.where(Order.created_at <= end_date)
 
-            query = query.offset(offset).limit(limit)
+            if cursor:
+                cursor_created_at, cursor_id = decode_cursor(cursor)
+                query = query.where(
+                    Order.created_at <= cursor_created_at,
+                    tuple_(Order.created_at, Order.id) < tuple_(cursor_created_at, cursor_id),
+                )
+            elif offset:
+                query = query.offset(offset)
+
+            query = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit)
 
             result = await self.db.execute(query)
             return result.scalars().all()
@@ -184,6 +381,20 @@ class OrderItemService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
+    async def _touch_order(self, order_id: UUID, order_created_at: datetime) -> None:
+        """Bump the order's updated_at, which versions its ETag and Last-Modified."""
+        await self.db.execute(
+            update(Order.__table__)
+            .where(Order.id == order_id, Order.created_at == order_created_at)
+            .values(updated_at=datetime.utcnow())
+        )
+
+    async def _order_status(self, order_id: UUID, order_created_at: datetime) -> OrderStatus:
+        result = await self.db.execute(
+            select(Order.status).where(Order.id == order_id, Order.created_at == order_created_at)
+        )
+        return result.scalar_one()
+
     async def create_order_item(
         self,
         order_id: UUID,
@@ -191,10 +402,23 @@ class OrderItemService:
         quantity: int,
         price_per_unit: float,
     ) -> OrderItem:
+        rollups = SalesRollupService(self.db)
         try:
+            order = (
+                await self.db.execute(select(Order.created_at, Order.status).where(Order.id == order_id))
+            ).one_or_none()
+            if order is None:
+                raise Exception("Order not found")
+            order_created_at = order.created_at
+
+            # Same delta as update_order: take the order's contribution out and
+            # add it back once the item is written
+            await rollups.record(order_id, order_created_at, order.status, sign=-1)
+
             total_price = quantity * price_per_unit
             item = OrderItem(
                 order_id=order_id,
+                order_created_at=order_created_at,
                 product_id=product_id,
                 quantity=quantity,
                 price_per_unit=price_per_unit,
@@ -202,6 +426,8 @@ class OrderItemService:
             )
             self.db.add(item)
             await self.db.flush()
+            await rollups.record(order_id, order_created_at, order.status)
+            await self._touch_order(order_id, order_created_at)
             await self.db.commit() 
             return item
         except Exception as e:
@@ -210,15 +436,22 @@ class OrderItemService:
 
     async def get_order_item(self, item_id: UUID) -> Optional[OrderItem]:
         result = await self.db.execute(select(OrderItem).where(OrderItem.id == item_id))
-        return result.scalar_one_or_none()
+        item = result.scalar_one_or_none()
+        if item:
+            await loaders(self.db).load_many("product", [item.product_id])
+        return item
 
     async def update_order_item(self, item_id: UUID, update_data:OrderItemSchema) -> Optional[OrderItem]:
         item = await self.get_order_item(item_id)
         if not item:
             raise Exception("OrderItem not found")
 
+        rollups = SalesRollupService(self.db)
         try:
             data = update_data.model_dump(exclude_unset=True)
+            status = await self._order_status(item.order_id, item.order_created_at)
+            # before the changes below, which the next query would autoflush
+            await rollups.record(item.order_id, item.order_created_at, status, sign=-1)
 
             # Update allowed fields
             if "product_id" in data:
@@ -237,6 +470,8 @@ class OrderItemService:
 
             await self.db.flush()
             await self.db.refresh(item)
+            await rollups.record(item.order_id, item.order_created_at, status)
+            await self._touch_order(item.order_id, item.order_created_at)
             await self.db.commit()  # ✅ Ensure the update is persisted
 
             return item
@@ -249,8 +484,14 @@ class OrderItemService:
         item = await self.get_order_item(item_id)
         if not item:
             raise Exception("OrderItem not found")
+        rollups = SalesRollupService(self.db)
         try:
+            status = await self._order_status(item.order_id, item.order_created_at)
+            await rollups.record(item.order_id, item.order_created_at, status, sign=-1)
             await self.db.delete(item)
+            await self.db.flush()
+            await rollups.record(item.order_id, item.order_created_at, status)
+            await self._touch_order(item.order_id, item.order_created_at)
             await self.db.commit()
             return True
         except Exception as e:
@@ -290,6 +531,7 @@ class OrderItemService:
 
             result = await self.db.execute(query)
             items = result.scalars().all()
+            await loaders(self.db).load_many("product", (item.product_id for item in items))
 
             return items
 
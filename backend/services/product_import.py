@@ -0,0 +1,307 @@
+import asyncio
+import csv
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import insert, or_, update
+from core.config import settings, logger
+from core.database import AsyncSessionDB
+from core.utils.catalog import touch_products
+from models.category import Category
+from models.products import (
+    Product, ProductVariant, ProductVariantAttribute, ProductVariantImage,
+    Inventory, InventoryProduct, AvailabilityStatus, Tag, product_tags,
+)
+from schemas.products import ProductImport
+from services.products import (
+    SkuAllocator, generate_barcode, generate_variant_name, normalize_attributes, refresh_product_prices,
+)
+
+
+class Unreadable(NamedTuple):
+    """A source line that couldn't be parsed; reported in place of a product."""
+    error: str
+
+
+# (line number in the source file, raw product dict or Unreadable)
+Record = Tuple[int, Union[Dict[str, Any], Unreadable]]
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [part.strip() for part in (value or "").split("|") if part.strip()]
+
+
+def read_ndjson(lines: Iterable[str]) -> Iterator[Record]:
+    """One product per line, shaped like ProductImport. Malformed lines are yielded as Unreadable."""
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, Unreadable(f"Invalid JSON: {e}")
+
+
+def read_csv(lines: Iterable[str]) -> Iterator[Record]:
+    """
+    One variant per row; consecutive rows with the same product name form one
+    product. List columns are pipe-separated:
+
+        name,category,tags,base_price,sale_price,stock,attributes,images
+        T-shirt,Apparel,summer|cotton,20,18,100,color=Red|size=M,https://cdn/a.webp
+        T-shirt,Apparel,summer|cotton,20,18,50,color=Blue|size=L,
+    """
+    current: Optional[Record] = None
+    for line_no, row in enumerate(csv.DictReader(lines), start=2):
+        variant = {
+            "base_price": row.get("base_price"),
+            "sale_price": row.get("sale_price") or None,
+            "stock": row.get("stock") or 0,
+            "attributes": [
+                dict(zip(("name", "value"), (p.strip() for p in pair.split("=", 1))))
+                for pair in _split(row.get("attributes"))
+            ],
+            "images": [{"url": url} for url in _split(row.get("images"))],
+        }
+        if current and current[1]["name"] == row.get("name"):
+            current[1]["variants"].append(variant)
+            continue
+        if current:
+            yield current
+        product = {
+            "name": row.get("name"),
+            "description": row.get("description") or None,
+            "category_id": row.get("category_id") or None,
+            "category": row.get("category") or None,
+            "tag_ids": _split(row.get("tag_ids")),
+            "tags": _split(row.get("tags")),
+            "inventory_ids": _split(row.get("inventory_ids")),
+            "variants": [variant],
+        }
+        if row.get("availability"):
+            product["availability"] = row["availability"]
+        if row.get("rating"):
+            product["rating"] = row["rating"]
+        current = (line_no, product)
+    if current:
+        yield current
+
+
+class ProductImportService:
+    """
+    Bulk catalog import. Records are validated and written a chunk at a time:
+    categories, tags and inventories are resolved with one query each per
+    chunk, so unknown references are reported against their own line, and
+    products, tags, variants, attributes, images and inventory links go in
+    with one batched multi-row INSERT per table. Each chunk is its own
+    transaction, so a bad chunk is reported without losing the others.
+    Barcodes are left empty and rendered afterwards by backfill_barcodes().
+    """
+
+    def __init__(self, db: AsyncSession, chunk_size: Optional[int] = None):
+        self.db = db
+        self.chunk_size = chunk_size or settings.PRODUCT_IMPORT_CHUNK_SIZE
+
+    async def run(self, records: Iterator[Record]) -> Dict[str, Any]:
+        report = {"products": 0, "variants": 0, "errors": []}
+        chunk: List[Record] = []
+        last_line = 0
+        try:
+            for record in records:
+                last_line = record[0]
+                chunk.append(record)
+                if len(chunk) >= self.chunk_size:
+                    await self._add_chunk(report, chunk)
+                    chunk = []
+        except (csv.Error, UnicodeDecodeError) as e:
+            # the rest of the file can't be read; what was parsed so far is still imported
+            report["errors"].append({"line": None, "error": f"Unreadable input after line {last_line}: {e}"})
+        if chunk:
+            await self._add_chunk(report, chunk)
+        return report
+
+    async def _add_chunk(self, report: Dict[str, Any], chunk: List[Record]) -> None:
+        products, variants, errors = await self._import_chunk(chunk)
+        report["products"] += products
+        report["variants"] += variants
+        report["errors"].extend(errors)
+
+    async def _resolve(self, model, ids: set, names: set) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        if not ids and not names:
+            return {}, {}
+        result = await self.db.execute(
+            select(model.id, model.name).where(or_(model.id.in_(ids), model.name.in_(names)))
+        )
+        by_id, by_name = {}, {}
+        for id, name in result.all():
+            by_id[str(id)] = id
+            by_name[name] = id
+        return by_id, by_name
+
+    async def _import_chunk(self, chunk: List[Record]) -> Tuple[int, int, List[Dict[str, Any]]]:
+        errors = []
+        valid: List[Tuple[int, ProductImport]] = []
+        for line_no, raw in chunk:
+            if isinstance(raw, Unreadable):
+                errors.append({"line": line_no, "error": raw.error})
+                continue
+            try:
+                valid.append((line_no, ProductImport.model_validate(raw)))
+            except ValidationError as e:
+                errors.append({"line": line_no, "error": e.errors(include_url=False)})
+
+        categories_by_id, categories_by_name = await self._resolve(
+            Category,
+            {p.category_id for _, p in valid if p.category_id},
+            {p.category for _, p in valid if p.category},
+        )
+        tags_by_id, tags_by_name = await self._resolve(
+            Tag,
+            {tag_id for _, p in valid for tag_id in p.tag_ids},
+            {name for _, p in valid for name in p.tags},
+        )
+        inventories_by_id, _ = await self._resolve(
+            Inventory, {inv_id for _, p in valid for inv_id in p.inventory_ids}, set()
+        )
+
+        now = datetime.utcnow()
+        rows = {"products": [], "tags": [], "variants": [], "attributes": [], "images": [], "inventories": []}
+        for line_no, item in valid:
+            category_id = (
+                categories_by_id.get(str(item.category_id)) if item.category_id
+                else categories_by_name.get(item.category)
+            )
+            if category_id is None:
+                errors.append({"line": line_no, "error": f"Unknown category: {item.category_id or item.category}"})
+                continue
+            tag_ids = [tags_by_id.get(str(t)) for t in item.tag_ids] + [tags_by_name.get(t) for t in item.tags]
+            if None in tag_ids:
+                errors.append({"line": line_no, "error": "Unknown tag in tag_ids/tags"})
+                continue
+            unknown = [str(i) for i in item.inventory_ids if str(i) not in inventories_by_id]
+            if unknown:
+                errors.append({"line": line_no, "error": f"Unknown inventory: {', '.join(unknown)}"})
+                continue
+
+            pid = uuid.uuid4()
+            rows["products"].append({
+                "id": pid,
+                "name": item.name,
+                "description": item.description,
+                "category_id": category_id,
+                "availability": AvailabilityStatus(item.availability.value),
+                "rating": item.rating or 0.0,
+                "created_at": now,
+                "updated_at": now,
+            })
+            rows["tags"].extend({"product_id": pid, "tag_id": tag_id} for tag_id in dict.fromkeys(tag_ids))
+            rows["inventories"].extend(
+                {"id": uuid.uuid4(), "inventory_id": inv_id, "product_id": pid, "quantity": 0, "low_stock_threshold": 0}
+                for inv_id in dict.fromkeys(inventories_by_id[str(i)] for i in item.inventory_ids)
+            )
+            for variant_in in item.variants:
+                vid = uuid.uuid4()
+                variant_name = generate_variant_name(variant_in.attributes)
+                rows["variants"].append({
+                    "id": vid,
+                    "product_id": pid,
+                    "sku": None,  # allocated for the whole chunk below
+                    "name": variant_name,
+                    "base_price": variant_in.base_price,
+                    "sale_price": variant_in.sale_price,
+                    "stock": variant_in.stock,
+                    "barcode": None,
+                    "attribute_map": normalize_attributes(variant_in.attributes),
+                })
+                rows["attributes"].extend(
+                    {"id": uuid.uuid4(), "variant_id": vid, "name": attr.name, "value": attr.value}
+                    for attr in variant_in.attributes
+                )
+                rows["images"].extend(
+                    {"id": uuid.uuid4(), "variant_id": vid, "url": image.url, "alt_text": None}
+                    for image in variant_in.images
+                )
+
+        if not rows["products"]:
+            return 0, 0, errors
+
+        try:
+            names = {p["id"]: p["name"] for p in rows["products"]}
+            skus = await SkuAllocator(self.db).allocate([(names[v["product_id"]], v["name"]) for v in rows["variants"]])
+            alt_text = {}
+            for variant, sku in zip(rows["variants"], skus):
+                variant["sku"] = alt_text[variant["id"]] = sku
+            for image in rows["images"]:
+                image["alt_text"] = alt_text[image["variant_id"]]
+
+            # executemany over a Core insert → batched multi-row INSERT ... VALUES
+            for table, key in (
+                (Product.__table__, "products"),
+                (product_tags, "tags"),
+                (ProductVariant.__table__, "variants"),
+                (ProductVariantAttribute.__table__, "attributes"),
+                (ProductVariantImage.__table__, "images"),
+                (InventoryProduct.__table__, "inventories"),
+            ):
+                if rows[key]:
+                    await self.db.execute(insert(table), rows[key])
+            await refresh_product_prices(self.db, [p["id"] for p in rows["products"]])
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            first, last = chunk[0][0], chunk[-1][0]
+            errors.append({"line": first, "error": f"Chunk (lines {first}-{last}) rolled back: {e}"})
+            return 0, 0, errors
+
+        return len(rows["products"]), len(rows["variants"]), errors
+
+
+def _render_barcode(variant) -> str:
+    return str(generate_barcode(
+        json.dumps({
+            "id": str(variant.id),
+            "product_id": str(variant.product_id),
+            "sku": variant.sku,
+            "base_price": float(variant.base_price),
+            "sale_price": float(variant.sale_price) if variant.sale_price is not None else None,
+            "stock": variant.stock,
+        }),
+        filename=f"{variant.id}.png",
+    ))
+
+
+async def backfill_barcodes(batch_size: Optional[int] = None) -> int:
+    """
+    Render barcodes for variants that don't have one yet (bulk imports defer
+    them). Images are drawn in a worker thread and written back with one
+    executemany UPDATE per batch. Returns the number of variants updated.
+    """
+    batch_size = batch_size or settings.PRODUCT_IMPORT_CHUNK_SIZE
+    done = 0
+    while True:
+        async with AsyncSessionDB() as session:
+            result = await session.execute(
+                select(
+                    ProductVariant.id, ProductVariant.product_id, ProductVariant.sku,
+                    ProductVariant.base_price, ProductVariant.sale_price, ProductVariant.stock,
+                )
+                .where(ProductVariant.barcode.is_(None))
+                .limit(batch_size)
+            )
+            variants = result.all()
+            if not variants:
+                return done
+            barcodes = await asyncio.to_thread(lambda: [_render_barcode(v) for v in variants])
+            await session.execute(
+                update(ProductVariant),
+                [{"id": v.id, "barcode": barcode} for v, barcode in zip(variants, barcodes)],
+            )
+            # the barcode is part of the product payload, so move its version too
+            await touch_products(session, Product.id.in_({v.product_id for v in variants}))
+            await session.commit()
+        done += len(variants)
+        logger.info(f"Rendered {done} deferred barcodes")
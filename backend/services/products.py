@@ -1,12 +1,15 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete, and_
+from sqlalchemy import delete, and_, or_, func, text, update
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
 import json
-from models.products import uuid, Product, ProductVariant, ProductVariantImage, ProductVariantAttribute, AvailabilityStatus, Tag, InventoryProduct
+from models.products import uuid, Product, ProductVariant, ProductVariantImage, ProductVariantAttribute, AvailabilityStatus, Tag, InventoryProduct, sku_sequence
 from schemas.products import UUID, ProductCreate, ProductVariantCreate, ProductVariantUpdate, ProductVariantAttributeCreate, ProductVariantImageCreate
 from services.category import CategoryService
+from core.utils.fields import FieldSet, relationships
+from core.utils.catalog import category_cache, touch_products
 # from core.utils.kafka import KafkaProducer, send_kafka_message, is_kafka_available
 from core.utils.barcode import Barcode
 
@@ -50,13 +53,161 @@ def generate_barcode(data, logo_path=None, filename='barcode.png', save_as_png=F
     barcode = Barcode()
     return barcode.generate_barcode(data=data, logo_path=logo_path, filename=filename, save_as_png=save_as_png)
 
-def generate_sku(product_name: str, variant_name: str, unique_id: UUID) -> str:
+def generate_sku(product_name: str, variant_name: str, number: int) -> str:
+    """
+    Example: generate_sku("T-shirt", "color: Red", 26) → "T-S-COL-00001A"
+
+    `number` comes from SkuAllocator. The suffix is at least six hex digits,
+    so it can't collide with the older random four-digit suffixes.
+    """
     product_code = ''.join(product_name.upper().split())[:3]
     variant_code = ''.join(variant_name.upper().split())[:3]
-    suffix = str(unique_id)[-4:].upper()
-    sku = f"{product_code}-{variant_code}-{suffix}"
+    sku = f"{product_code}-{variant_code}-{number:06X}"
     return sku
 
+
+class SkuAllocator:
+    """
+    Hands out SKUs in bulk. Suffix numbers are reserved from a Postgres
+    sequence with a single nextval() over generate_series per batch, and the
+    whole batch is checked against the unique sku index in one query. Any
+    candidate that is already taken (e.g. set by hand) gets a fresh number,
+    so inserts never fail or retry on SKU conflicts.
+
+    Usage:
+        skus = await SkuAllocator(db).allocate([("T-shirt", "color: Red"), ("T-shirt", "color: Blue")])
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _reserve(self, count: int) -> List[int]:
+        # the sequence is created by the migration step (core.utils.sequences)
+        result = await self.db.execute(
+            select(sku_sequence.next_value()).select_from(func.generate_series(1, count))
+        )
+        return list(result.scalars().all())
+
+    async def allocate(self, names: List[Tuple[str, str]]) -> List[str]:
+        """One SKU per (product name, variant name) pair, in order."""
+        if not names:
+            return []
+        numbers = await self._reserve(len(names))
+        skus = [generate_sku(product, variant, n) for (product, variant), n in zip(names, numbers)]
+        while True:
+            result = await self.db.execute(select(ProductVariant.sku).where(ProductVariant.sku.in_(skus)))
+            taken = set(result.scalars().all())
+            if not taken:
+                return skus
+            clashes = [i for i, sku in enumerate(skus) if sku in taken]
+            for i, n in zip(clashes, await self._reserve(len(clashes))):
+                skus[i] = generate_sku(*names[i], n)
+
+    async def allocate_one(self, product_name: str, variant_name: str) -> str:
+        return (await self.allocate([(product_name, variant_name)]))[0]
+
+def normalize_attributes(attributes) -> Dict[str, str]:
+    """
+    Attribute list → the dict stored in ProductVariant.attribute_map, with names
+    and values trimmed and lower-cased so filters match regardless of case.
+
+    Example: [{"name": "Color", "value": "Red "}] → {"color": "red"}
+    """
+    normalized = {}
+    for attr in attributes or []:
+        name = attr["name"] if isinstance(attr, dict) else attr.name
+        value = attr["value"] if isinstance(attr, dict) else attr.value
+        normalized[str(name).strip().lower()] = str(value).strip().lower()
+    return normalized
+
+
+def parse_attribute_filter(value: Optional[str]) -> Dict[str, List[str]]:
+    """
+    Query-string form of an attribute filter: names are ANDed, pipe-separated
+    values for one name are ORed.
+
+    Example: "color=Red|Blue,size=M" → {"color": ["red", "blue"], "size": ["m"]}
+    """
+    parsed: Dict[str, List[str]] = {}
+    for part in (value or "").split(","):
+        if "=" not in part:
+            continue
+        name, values = part.split("=", 1)
+        options = [v.strip().lower() for v in values.split("|") if v.strip()]
+        if name.strip() and options:
+            parsed.setdefault(name.strip().lower(), []).extend(options)
+    return parsed
+
+
+def attribute_filter_clause(attributes: Dict[str, List[str]]):
+    """
+    WHERE clause over ProductVariant.attribute_map. Every equality becomes a
+    JSONB containment test that the GIN index answers, so the cost follows the
+    number of matching variants rather than the catalog size.
+    """
+    clauses = []
+    for name, values in attributes.items():
+        values = [values] if isinstance(values, str) else values
+        clauses.append(or_(*[ProductVariant.attribute_map.contains({name: v}) for v in values]))
+    return and_(*clauses)
+
+
+async def refresh_attribute_maps(db: AsyncSession, variant_ids: Optional[List[UUID]] = None) -> None:
+    """
+    Rebuild attribute_map from the attribute rows with one UPDATE, for the
+    given variants or, with no ids, for every variant that has no map yet.
+    """
+    attrs = ProductVariantAttribute.__table__
+    rebuilt = (
+        select(func.coalesce(
+            func.jsonb_object_agg(func.lower(func.trim(attrs.c.name)), func.lower(func.trim(attrs.c.value))),
+            text("'{}'::jsonb"),
+        ))
+        .where(attrs.c.variant_id == ProductVariant.__table__.c.id)
+        .scalar_subquery()
+    )
+    stmt = update(ProductVariant.__table__).values(attribute_map=rebuilt)
+    if variant_ids is None:
+        stmt = stmt.where(ProductVariant.__table__.c.attribute_map.is_(None))
+    else:
+        stmt = stmt.where(ProductVariant.__table__.c.id.in_(variant_ids))
+    await db.execute(stmt)
+
+
+async def refresh_product_prices(db: AsyncSession, product_ids: Optional[List[UUID]] = None) -> None:
+    """
+    Recompute products.min_price/max_price/effective_price from their variants
+    with one UPDATE (also bumping updated_at), for the given products or, with
+    no ids, for every product whose prices were never computed. Call it after
+    any variant write, inside the same transaction.
+    """
+    products = Product.__table__
+    variants = ProductVariant.__table__
+
+    def aggregate(expr):
+        return select(expr).where(variants.c.product_id == products.c.id).scalar_subquery()
+
+    stmt = update(products).values(
+        min_price=aggregate(func.min(variants.c.base_price)),
+        max_price=aggregate(func.max(variants.c.base_price)),
+        effective_price=aggregate(func.min(func.coalesce(variants.c.sale_price, variants.c.base_price))),
+        updated_at=datetime.utcnow(),
+    )
+    if product_ids is None:
+        stmt = stmt.where(
+            products.c.effective_price.is_(None),
+            products.c.id.in_(select(variants.c.product_id)),
+        )
+    else:
+        stmt = stmt.where(products.c.id.in_(product_ids))
+    await db.execute(stmt)
+
+
+def of_variant(variant_id: UUID):
+    """touch_products() criterion for the product owning a variant."""
+    return Product.id.in_(select(ProductVariant.product_id).where(ProductVariant.id == variant_id))
+
+
 def generate_variant_name(attributes):
     if not attributes:
         return "VARIANT-UNKNOWN"
@@ -146,14 +297,20 @@ class ProductService:
         min_rating: Optional[float] = None,
         limit: int = 10,
         offset: int = 0,
+        attributes: Optional[Dict[str, List[str]]] = None,
+        sort: Optional[str] = None,
+        fields: FieldSet = None,
     ) -> List[Product]:
+        """
+        Price filters and `sort` ("price_asc"/"price_desc") use the maintained
+        effective_price, i.e. the lowest price a customer pays for the product.
+        Only the relationships named in `fields` (all when None) are loaded.
+        """
         try:
-            query = select(Product).options(
-                selectinload(Product.category),
-                selectinload(Product.tags),
-                selectinload(Product.variants),
-                selectinload(Product.inventories),
-            )
+            query = select(Product).options(*[
+                selectinload(getattr(Product, name))
+                for name in relationships(fields, "tags", "variants", "inventories")
+            ])
             filters = []
 
             if name:
@@ -164,11 +321,16 @@ class ProductService:
             if availability:
                 filters.append(Product.availability == availability)
             if min_price is not None:
-                filters.append(Product.base_price >= min_price)
+                filters.append(Product.effective_price >= min_price)
             if max_price is not None:
-                filters.append(Product.base_price <= max_price)
+                filters.append(Product.effective_price <= max_price)
             if min_rating is not None:
                 filters.append(Product.rating >= min_rating)
+            if attributes:
+                # products with at least one variant matching every attribute
+                filters.append(Product.id.in_(
+                    select(ProductVariant.product_id).where(attribute_filter_clause(attributes))
+                ))
 
             if tag_id:
                 query = query.join(Product.tags)
@@ -178,22 +340,36 @@ class ProductService:
             if filters:
                 query = query.where(and_(*filters))
 
+            if sort == "price_asc":
+                query = query.order_by(Product.effective_price.asc().nulls_last(), Product.id)
+            elif sort == "price_desc":
+                query = query.order_by(Product.effective_price.desc().nulls_last(), Product.id.desc())
+            elif sort:
+                raise ValueError("sort must be price_asc or price_desc")
+
             query = query.limit(limit).offset(offset)
             result = await self.db.execute(query)
-            return result.scalars().all()
+            products = result.scalars().all()
+            # to_dict() renders category names from the cache
+            await category_cache.ensure_cached(self.db, {p.category_id for p in products})
+            return products
         except Exception as e:
             await self.db.rollback()
             raise e
 
-    async def get_by_id(self, product_id: UUID) -> Optional[Product]:
-        result = await self.db.execute(select(Product).options(
-            selectinload(Product.category),
-            selectinload(Product.tags),
-            selectinload(Product.variants).selectinload(ProductVariant.images),
-            selectinload(Product.variants).selectinload(ProductVariant.attributes),
-            selectinload(Product.inventories),
-        ).where(Product.id == product_id))
-        return result.scalar_one_or_none()
+    async def get_by_id(self, product_id: UUID, fields: FieldSet = None) -> Optional[Product]:
+        load = relationships(fields, "tags", "variants", "inventories")
+        options = [selectinload(getattr(Product, name)) for name in load - {"variants"}]
+        if "variants" in load:
+            options += [
+                selectinload(Product.variants).selectinload(ProductVariant.images),
+                selectinload(Product.variants).selectinload(ProductVariant.attributes),
+            ]
+        result = await self.db.execute(select(Product).options(*options).where(Product.id == product_id))
+        product = result.scalar_one_or_none()
+        if product is not None:
+            await category_cache.ensure_cached(self.db, [product.category_id])
+        return product
 
     async def create(self, product_in: ProductCreate) -> Product:
         tags = []
@@ -224,10 +400,10 @@ class ProductService:
         try:
             await self.db.flush()
 
-            for variant_in in product_in.variants or []:
+            variant_names = [generate_variant_name(v.attributes) for v in product_in.variants or []]
+            skus = await SkuAllocator(self.db).allocate([(product_in.name, name) for name in variant_names])
+            for variant_in, variant_name, sku in zip(product_in.variants or [], variant_names, skus):
                 vid = uuid.uuid4()
-                variant_name = generate_variant_name(variant_in.attributes)
-                sku = generate_sku(product_in.name, variant_name, vid)
                 barcode_data = json.dumps({
                     'id': str(vid),
                     'product_id': str(pid),
@@ -248,6 +424,7 @@ class ProductService:
                     stock=variant_in.stock,
                     barcode=str(generate_barcode(barcode_data, filename=f'{vid}.png')),
                     name=variant_name,
+                    attribute_map=normalize_attributes(variant_in.attributes),
                 )
                 self.db.add(variant)
                 # Handle attributes
@@ -275,6 +452,8 @@ class ProductService:
                     )
                     self.db.add(inventory_product)
 
+            await self.db.flush()
+            await refresh_product_prices(self.db, [pid])
             await self.db.commit()
 
             # Reload product with relationships eagerly loaded
@@ -313,8 +492,8 @@ class ProductService:
             for variant_in in product_in.variants or []:
                 if getattr(variant_in, "id", None) in existing_variants:
                     variant = existing_variants[variant_in.id]
-                    variant.base_price=variant_in.base_price,
-                    variant.sale_price=variant_in.sale_price,
+                    variant.base_price = variant_in.base_price
+                    variant.sale_price = variant_in.sale_price
                     variant.stock = variant_in.stock
                     variant.name = generate_variant_name(variant_in.attributes)
 
@@ -330,7 +509,7 @@ class ProductService:
                 else:
                     vid = uuid.uuid4()
                     variant_name=generate_variant_name(variant_in.attributes)
-                    sku = generate_sku(product.name, variant_name, vid)
+                    sku = await SkuAllocator(self.db).allocate_one(product.name, variant_name)
                     barcode_data = json.dumps({
                         'id': str(vid),
                         'product_id': str(product_id),
@@ -350,11 +529,12 @@ class ProductService:
                         stock=variant_in.stock,
                         barcode=barcode_str,
                         name=variant_name,
+                        attribute_map=normalize_attributes(variant_in.attributes),
                     )
                     self.db.add(variant)
                     # Handle attributes
                     for attr in variant_in.attributes:
-                        v_attribute = ProductVariantAttribute(name=attr.name, value=attr.value)
+                        v_attribute = ProductVariantAttribute(variant_id=vid, name=attr.name, value=attr.value)
                         self.db.add(v_attribute)
                         
                     for image in variant_in.images:
@@ -367,6 +547,8 @@ class ProductService:
 
             # Update inventories associations similarly if needed
 
+            await self.db.flush()
+            await refresh_product_prices(self.db, [product_id])
             await self.db.commit()
             product = await self.get_by_id(product_id)
             return product
@@ -397,9 +579,9 @@ class ProductVariantService:
         if not product:
             raise Exception("Product not found")
         
-        vid=uuid.uuid4
+        vid=uuid.uuid4()
         variant_name = generate_variant_name(variant_in.attributes)
-        sku=generate_sku(product_name, variant_name, vid)
+        sku = await SkuAllocator(self.db).allocate_one(product_name, variant_name)
         variant = ProductVariant(
             id=vid,
             product_id=product_id,
@@ -420,7 +602,7 @@ class ProductVariantService:
                 filename=f'{vid}.png', 
                 save_as_png=False)
             ),
-            
+            attribute_map=normalize_attributes(variant_in.attributes),
         )
 
         # Handle attributes
@@ -438,6 +620,8 @@ class ProductVariantService:
 
         try:
             self.db.add(variant)
+            await self.db.flush()
+            await refresh_product_prices(self.db, [product_id])
             await self.db.commit()
             await self.db.refresh(variant)
             return variant
@@ -467,7 +651,9 @@ class ProductVariantService:
         min_stock: Optional[int] = None,
         limit: int = 10,
         offset: int = 0,
+        attributes: Optional[Dict[str, List[str]]] = None,
     ) -> List[ProductVariant]:
+        """`attributes` filters on normalized attributes, e.g. {"color": ["red"], "size": ["m"]}."""
         query = select(ProductVariant)
         filters = []
 
@@ -483,6 +669,8 @@ class ProductVariantService:
             filters.append(ProductVariant.base_price <= max_price)
         if min_stock is not None:
             filters.append(ProductVariant.stock >= min_stock)
+        if attributes:
+            filters.append(attribute_filter_clause(attributes))
 
         if filters:
             query = query.where(and_(*filters))
@@ -499,6 +687,7 @@ class ProductVariantService:
         for field, value in variant_in.dict(exclude_unset=True).items():
             setattr(variant, field, value)
             if field == "attributes":
+                variant.attribute_map = normalize_attributes(value)
                 variant.attributes.clear()
                 for attr in value:
                     variant.attributes.append(
@@ -514,6 +703,8 @@ class ProductVariantService:
                 setattr(variant, field, value)
 
         try:
+            await self.db.flush()
+            await refresh_product_prices(self.db, [variant.product_id])
             await self.db.commit()
             await self.db.refresh(variant)
             return variant
@@ -527,6 +718,8 @@ class ProductVariantService:
             raise Exception("Variant not found")
         try:
             await self.db.delete(variant)
+            await self.db.flush()
+            await refresh_product_prices(self.db, [variant.product_id])
             await self.db.commit()
             return True
         except Exception as e:
@@ -545,6 +738,9 @@ class ProductVariantAttributeService:
             value=attr_in.value
         )
         self.db.add(attribute)
+        await self.db.flush()
+        await refresh_attribute_maps(self.db, [variant_id])
+        await touch_products(self.db, of_variant(variant_id))
         await self.db.commit()
         await self.db.refresh(attribute)
         return attribute
@@ -565,6 +761,9 @@ class ProductVariantAttributeService:
         for field, value in attr_in.dict(exclude_unset=True).items():
             setattr(attribute, field, value)
 
+        await self.db.flush()
+        await refresh_attribute_maps(self.db, [attribute.variant_id])
+        await touch_products(self.db, of_variant(attribute.variant_id))
         await self.db.commit()
         await self.db.refresh(attribute)
         return attribute
@@ -574,6 +773,9 @@ class ProductVariantAttributeService:
         if not attribute:
             raise Exception("Attribute not found")
         await self.db.delete(attribute)
+        await self.db.flush()
+        await refresh_attribute_maps(self.db, [attribute.variant_id])
+        await touch_products(self.db, of_variant(attribute.variant_id))
         await self.db.commit()
         return True
 
@@ -588,6 +790,7 @@ class ProductVariantImageService:
             url=image_in.url
         )
         self.db.add(image)
+        await touch_products(self.db, of_variant(variant_id))
         await self.db.commit()
         await self.db.refresh(image)
         return image
@@ -608,6 +811,7 @@ class ProductVariantImageService:
         for field, value in image_in.dict(exclude_unset=True).items():
             setattr(image, field, value)
 
+        await touch_products(self.db, of_variant(image.variant_id))
         await self.db.commit()
         await self.db.refresh(image)
         return image
@@ -617,5 +821,6 @@ class ProductVariantImageService:
         if not image:
             raise Exception("Image not found")
         await self.db.delete(image)
+        await touch_products(self.db, of_variant(image.variant_id))
         await self.db.commit()
         return True
\ No newline at end of file
@@ -1,12 +1,175 @@
+import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import and_
-from typing import List, Optional
-from datetime import datetime
+from sqlalchemy import and_, func, or_, update
+from typing import Any, Dict, List, NamedTuple, Optional
+from datetime import datetime, timezone
+from decimal import Decimal
+from cachetools import TTLCache
+from core.config import settings, logger
+from core.database import AsyncSessionDB
 from models.promocode import (PromoCode)
 from schemas.promocode import (UUID, PromoCodeCreate)
 
+CENTS = Decimal("0.01")
+
+
+class TooManyAttempts(Exception):
+    """Raised when a client has failed too many promo code attempts."""
+
+
+class PromoCodeEntry(NamedTuple):
+    id: UUID
+    code: str
+    discount_percent: Decimal
+    valid_from: Optional[datetime]
+    valid_until: Optional[datetime]
+    max_uses: Optional[int]
+    uses: int
+    min_subtotal: Optional[Decimal]
+
+
+def _normalize(code: str) -> str:
+    return (code or "").strip().upper()
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class PromoCodeIndex:
+    """
+    In-memory index of the codes that can still be applied (active and not
+    expired), keyed by the normalized code. Checkout validation is a dict
+    lookup plus a few comparisons, and guesses for codes that don't exist
+    never reach Postgres; repeated misses from one client are throttled.
+
+    The index is reloaded after every PromoCodeService write and on an
+    interval for writes made by other workers. Usage counts held here are a
+    fast pre-check only: the limit itself is enforced by the atomic UPDATE in
+    PromoCodeService.redeem.
+    """
+
+    def __init__(self, interval_seconds: int, max_failed_attempts: int, attempt_window: int):
+        self.interval_seconds = interval_seconds
+        self.max_failed_attempts = max_failed_attempts
+        self.loaded_at: Optional[datetime] = None
+        self._entries: Dict[str, PromoCodeEntry] = {}
+        self._failures: TTLCache = TTLCache(maxsize=100_000, ttl=attempt_window)
+        self._task: Optional[asyncio.Task] = None
+
+    async def load(self, db: Optional[AsyncSession] = None) -> None:
+        if db is None:
+            async with AsyncSessionDB() as session:
+                return await self.load(session)
+        result = await db.execute(
+            select(
+                PromoCode.id, PromoCode.code, PromoCode.discount_percent, PromoCode.valid_from,
+                PromoCode.valid_until, PromoCode.max_uses, PromoCode.uses, PromoCode.min_subtotal,
+            ).where(
+                PromoCode.active.is_(True),
+                or_(PromoCode.valid_until.is_(None), PromoCode.valid_until >= datetime.now(timezone.utc)),
+            )
+        )
+        entries = {}
+        for row in result.all():
+            entries[_normalize(row.code)] = PromoCodeEntry(
+                id=row.id,
+                code=row.code,
+                discount_percent=Decimal(row.discount_percent),
+                valid_from=_aware(row.valid_from),
+                valid_until=_aware(row.valid_until),
+                max_uses=row.max_uses,
+                uses=row.uses or 0,
+                min_subtotal=Decimal(row.min_subtotal) if row.min_subtotal is not None else None,
+            )
+        self._entries = entries
+        self.loaded_at = datetime.utcnow()
+
+    def lookup(self, code: str) -> Optional[PromoCodeEntry]:
+        return self._entries.get(_normalize(code))
+
+    def record_uses(self, code: str, uses: int) -> None:
+        key = _normalize(code)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries[key] = entry._replace(uses=uses)
+
+    def _fail(self, client: Optional[str], reason: str):
+        if client is not None:
+            self._failures[client] = self._failures.get(client, 0) + 1
+        raise ValueError(reason)
+
+    def validate(self, code: str, subtotal: Any, client: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Check a code against a cart subtotal and price the discount.
+
+        Raises ValueError with the reason when the code can't be applied, and
+        TooManyAttempts once `client` (e.g. an IP) has failed
+        PROMO_MAX_FAILED_ATTEMPTS times within the attempt window.
+        """
+        if client is not None and self._failures.get(client, 0) >= self.max_failed_attempts:
+            raise TooManyAttempts("Too many invalid promo code attempts, try again later")
+
+        entry = self.lookup(code)
+        if entry is None:
+            self._fail(client, "Invalid promo code")
+        now = datetime.now(timezone.utc)
+        if entry.valid_from and now < entry.valid_from:
+            self._fail(client, "Promo code is not active yet")
+        if entry.valid_until and now > entry.valid_until:
+            self._fail(client, "Promo code has expired")
+        if entry.max_uses is not None and entry.uses >= entry.max_uses:
+            self._fail(client, "Promo code has reached its usage limit")
+
+        subtotal = Decimal(str(subtotal or 0)).quantize(CENTS)
+        if entry.min_subtotal is not None and subtotal < entry.min_subtotal:
+            raise ValueError(f"Promo code requires a subtotal of at least {entry.min_subtotal}")
+
+        discount = (subtotal * entry.discount_percent / 100).quantize(CENTS)
+        return {
+            "id": entry.id,
+            "code": entry.code,
+            "discount_percent": float(entry.discount_percent),
+            "subtotal": float(subtotal),
+            "discount": float(discount),
+            "total": float(subtotal - discount),
+            "remaining_uses": entry.max_uses - entry.uses if entry.max_uses is not None else None,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Promo code index refresh failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+promo_index = PromoCodeIndex(
+    settings.PROMO_INDEX_REFRESH_INTERVAL_SECONDS,
+    settings.PROMO_MAX_FAILED_ATTEMPTS,
+    settings.PROMO_FAILED_ATTEMPT_WINDOW_SECONDS,
+)
+
 
 class PromoCodeService:
     def __init__(self, db: AsyncSession):
@@ -59,13 +222,16 @@ class PromoCodeService:
             discount_percent=promo_in.discount_percent,
             active=promo_in.active,
             valid_from=promo_in.valid_from,
-            valid_until=promo_in.valid_until
+            valid_until=promo_in.valid_until,
+            max_uses=promo_in.max_uses,
+            min_subtotal=promo_in.min_subtotal,
         )
 
         try:
             self.db.add(promo)
             await self.db.commit()
             await self.db.refresh(promo)
+            await promo_index.load(self.db)
             return promo
         except SQLAlchemyError as e:
             await self.db.rollback()
@@ -74,7 +240,7 @@ class PromoCodeService:
     async def update(self, promo_code_id: UUID, promo_in: PromoCodeCreate) -> PromoCode:
         promo = await self.get_by_id(promo_code_id)
         if not promo:
-            raise None
+            return None
 
         try:
             promo.code = promo_in.code
@@ -82,9 +248,12 @@ class PromoCodeService:
             promo.active = promo_in.active
             promo.valid_from = promo_in.valid_from
             promo.valid_until = promo_in.valid_until
+            promo.max_uses = promo_in.max_uses
+            promo.min_subtotal = promo_in.min_subtotal
 
             await self.db.commit()
             await self.db.refresh(promo)
+            await promo_index.load(self.db)
             return promo
         except SQLAlchemyError as e:
             await self.db.rollback()
@@ -93,13 +262,65 @@ class PromoCodeService:
     async def delete(self, promo_code_id: UUID) -> bool:
         promo = await self.get_by_id(promo_code_id)
         if not promo:
-            raise None
+            return None
 
         try:
             await self.db.delete(promo)
             await self.db.commit()
+            await promo_index.load(self.db)
             return True
         except SQLAlchemyError as e:
             await self.db.rollback()
             raise RuntimeError("Failed to delete promo code.") from e
 
+    async def validate(self, code: str, subtotal: Any, client: Optional[str] = None) -> Dict[str, Any]:
+        if promo_index.loaded_at is None:
+            await promo_index.load(self.db)
+        return promo_index.validate(code, subtotal, client)
+
+    async def redeem(self, code: str, subtotal: Any, client: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Validate and consume one use. The counter is bumped with a single
+        conditional UPDATE ... RETURNING, so concurrent checkouts can never
+        push a code past max_uses. Runs in the caller's transaction (the order
+        being placed) and leaves the commit to it; once it commits, pass
+        result["uses"] to promo_index.record_uses.
+        """
+        result = await self.validate(code, subtotal, client)
+        now = datetime.now(timezone.utc)
+        row = await self.db.execute(
+            update(PromoCode)
+            .where(
+                PromoCode.id == result["id"],
+                PromoCode.active.is_(True),
+                PromoCode.valid_from <= now,
+                PromoCode.valid_until >= now,
+                or_(PromoCode.max_uses.is_(None), PromoCode.uses < PromoCode.max_uses),
+            )
+            .values(uses=PromoCode.uses + 1)
+            .returning(PromoCode.uses, PromoCode.max_uses)
+            .execution_options(synchronize_session=False)
+        )
+        counters = row.one_or_none()
+        if counters is None:
+            # the index's pre-check was stale; refresh it before refusing
+            await promo_index.load(self.db)
+            raise ValueError("Promo code is no longer available")
+        result["uses"] = counters.uses
+        result["remaining_uses"] = counters.max_uses - counters.uses if counters.max_uses is not None else None
+        return result
+
+    async def release(self, code: str) -> Optional[int]:
+        """
+        Give back a use taken by redeem (the order was cancelled or deleted),
+        in the caller's transaction. Returns the new count for
+        promo_index.record_uses once that commits.
+        """
+        row = await self.db.execute(
+            update(PromoCode)
+            .where(func.upper(PromoCode.code) == _normalize(code), PromoCode.uses > 0)
+            .values(uses=PromoCode.uses - 1)
+            .returning(PromoCode.uses)
+            .execution_options(synchronize_session=False)
+        )
+        return row.scalar_one_or_none()
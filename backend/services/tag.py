@@ -1,11 +1,14 @@
-
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+from core.utils.catalog import tag_cache, touch_products
 from models.tag import (Tag, UUID)
+from models.products import Product, product_tags
 from schemas.tag import (TagCreate)
 
 class TagService:
+    """Reads are served from the in-process tag cache; writes reload it."""
+
     def __init__(self, db: AsyncSession):
         self.db = db
 
@@ -14,22 +17,22 @@ class TagService:
         name: Optional[str] = None,
         limit: int = 10,
         offset: int = 0
-    ) -> List[Tag]:
-        query = select(Tag)
-
+    ) -> List[Dict[str, Any]]:
+        tags = (await tag_cache.ensure_loaded(self.db)).all()
         if name:
-            query = query.where(Tag.name.ilike(f"%{name}%"))
+            needle = name.casefold()
+            tags = [t for t in tags if needle in t["name"].casefold()]
+        return tags[offset:offset + limit]
 
-        query = query.limit(limit).offset(offset)
+    async def get_by_id(self, tag_id: UUID) -> Optional[Dict[str, Any]]:
+        row = (await tag_cache.ensure_loaded(self.db)).get(tag_id)
+        if row is None and await self._get(tag_id) is not None:
+            # written by another worker since our last refresh
+            await tag_cache.load(self.db)
+            row = tag_cache.get(tag_id)
+        return row
 
-        try:
-            result = await self.db.execute(query)
-            return result.scalars().all()
-        except Exception as e:
-            # Optionally log the error here
-            raise e
-
-    async def get_by_id(self, tag_id: UUID) -> Tag:
+    async def _get(self, tag_id: UUID) -> Optional[Tag]:
         try:
             result = await self.db.execute(select(Tag).where(Tag.id == tag_id))
             tag = result.scalar_one_or_none()
@@ -38,12 +41,17 @@ class TagService:
             # Optionally log the error here
             raise e
 
+    @staticmethod
+    def _tagged(tag_id: UUID):
+        return Product.id.in_(select(product_tags.c.product_id).where(product_tags.c.tag_id == tag_id))
+
     async def create(self, tag_in: TagCreate) -> Tag:
         tag = Tag(name=tag_in.name)
         self.db.add(tag)
         try:
             await self.db.commit()
             await self.db.refresh(tag)
+            await tag_cache.load(self.db)
             return tag
         except Exception as e:
             await self.db.rollback()
@@ -51,27 +59,32 @@ class TagService:
             raise e
 
     async def update(self, tag_id: UUID, tag_in: TagCreate) -> Tag:
-        tag = await self.get_by_id(tag_id)
+        tag = await self._get(tag_id)
         if not tag:
-            raise None
+            return None
         try:
             tag.name = tag_in.name
+            # products render their tag names
+            await touch_products(self.db, self._tagged(tag_id))
             await self.db.commit()
             await self.db.refresh(tag)
+            await tag_cache.load(self.db)
             return tag
         except Exception as e:
             await self.db.rollback()
             # Optional: log the exception here
             raise e
 
-    async def delete(self, inventory_id: UUID) -> bool:
-        inventory = await self.get_by_id(inventory_id)
-        if not inventory:
-            raise None
-        
+    async def delete(self, tag_id: UUID) -> bool:
+        tag = await self._get(tag_id)
+        if not tag:
+            return None
+
         try:
-            await self.db.delete(inventory)
+            await touch_products(self.db, self._tagged(tag_id))
+            await self.db.delete(tag)
             await self.db.commit()
+            await tag_cache.load(self.db)
             return True
         except Exception as e:
             await self.db.rollback()
@@ -29,7 +29,7 @@ from core.security import (
     create_refresh_token,
     verify_token
 )
-from core.config import settings
+from core.config import settings, logger
 from core.utils.redis import redis_client
 
 
@@ -95,8 +95,12 @@ class AuthService:
             await self.db.rollback()
             raise HTTPException(status_code=500, detail=f"Error registering user: {str(e)}")
 
-    async def login_user(self, login_data: UserLogin) -> dict:
-        """Authenticate user and return JWT tokens."""
+    async def login_user(self, login_data: UserLogin, ip_address: Optional[str] = None) -> dict:
+        """
+        Authenticate user and return JWT tokens. `ip_address` is the client's
+        address as seen by the server; the guest cart named by
+        login_data.guest_cart_id is merged into the user's if it belongs to it.
+        """
         user = await self._get_user_by_email(login_data.email)
         if not user or not verify_password(login_data.password, user.password_hash):
             raise HTTPException(status_code=401, detail="Invalid email or password.")
@@ -114,6 +118,14 @@ class AuthService:
             refresh_token
         )
 
+        if ip_address and login_data.guest_cart_id:
+            # Imported here: services.cart depends on this module.
+            from services.cart import CartService
+            try:
+                await CartService(self.db).merge_guest_cart(user.id, ip_address, login_data.guest_cart_id)
+            except Exception as e:
+                logger.warning(f"Guest cart merge failed for user {user.id}: {e}")
+
         return {
             "access_token": access_token,
             "refresh_token": refresh_token,
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the app imports its packages (core, models, services) from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,118 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from services import promocode
+from services.promocode import PromoCodeEntry, PromoCodeIndex, PromoCodeService, TooManyAttempts
+
+
+class FakeResult:
+    def __init__(self, row=None):
+        self.row = row
+
+    def one_or_none(self):
+        return self.row
+
+    def scalar_one_or_none(self):
+        return self.row
+
+
+class FakeSession:
+    """Returns the queued results in order and records the statements."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+
+    async def execute(self, statement, *args, **kwargs):
+        self.statements.append(statement)
+        return FakeResult(self.results.pop(0))
+
+
+def entry(code="SAVE10", percent="10", max_uses=None, uses=0, min_subtotal=None):
+    now = datetime.now(timezone.utc)
+    return PromoCodeEntry(
+        id=uuid.uuid4(),
+        code=code,
+        discount_percent=Decimal(percent),
+        valid_from=now - timedelta(days=1),
+        valid_until=now + timedelta(days=1),
+        max_uses=max_uses,
+        uses=uses,
+        min_subtotal=Decimal(min_subtotal) if min_subtotal is not None else None,
+    )
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = PromoCodeIndex(interval_seconds=60, max_failed_attempts=3, attempt_window=60)
+    index.loaded_at = datetime.utcnow()
+
+    async def load(db=None):
+        index.loaded_at = datetime.utcnow()
+
+    monkeypatch.setattr(index, "load", load)
+    monkeypatch.setattr(promocode, "promo_index", index)
+    return index
+
+
+def test_validate_prices_the_discount(index):
+    index._entries = {"SAVE10": entry()}
+    result = index.validate(" save10 ", 80)
+    assert result["discount"] == 8.0
+    assert result["total"] == 72.0
+
+
+def test_validate_checks_the_minimum_subtotal(index):
+    index._entries = {"SAVE10": entry(min_subtotal="50")}
+    with pytest.raises(ValueError):
+        index.validate("SAVE10", 49.99)
+
+
+def test_validate_refuses_a_code_over_its_limit(index):
+    index._entries = {"SAVE10": entry(max_uses=2, uses=2)}
+    with pytest.raises(ValueError, match="usage limit"):
+        index.validate("SAVE10", 100)
+
+
+def test_failed_attempts_are_throttled_per_client(index):
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            index.validate("NOPE", 100, client="10.0.0.1")
+    with pytest.raises(TooManyAttempts):
+        index.validate("NOPE", 100, client="10.0.0.1")
+    with pytest.raises(ValueError):
+        index.validate("NOPE", 100, client="10.0.0.2")
+
+
+def test_redeem_takes_one_use(index):
+    index._entries = {"SAVE10": entry(max_uses=5, uses=1)}
+    db = FakeSession(SimpleNamespace(uses=2, max_uses=5))
+    result = asyncio.run(PromoCodeService(db).redeem("SAVE10", 100))
+    assert result["uses"] == 2
+    assert result["remaining_uses"] == 3
+    assert result["total"] == 90.0
+    assert len(db.statements) == 1
+
+
+def test_redeem_refuses_when_the_atomic_update_matches_nothing(index):
+    # the index still thinks a use is left, but another checkout took it
+    index._entries = {"SAVE10": entry(max_uses=1, uses=0)}
+    db = FakeSession(None)
+    with pytest.raises(ValueError, match="no longer available"):
+        asyncio.run(PromoCodeService(db).redeem("SAVE10", 100))
+
+
+def test_release_gives_a_use_back(index):
+    db = FakeSession(0)
+    assert asyncio.run(PromoCodeService(db).release("save10")) == 0
+    assert len(db.statements) == 1
+
+
+def test_release_of_an_unused_code_changes_nothing(index):
+    db = FakeSession(None)
+    assert asyncio.run(PromoCodeService(db).release("SAVE10")) is None